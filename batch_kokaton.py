@@ -0,0 +1,150 @@
+"""
+シード付きのゲームを画面なしでまとめて実行し，難易度調整用の結果をCSVに書き出すスクリプト
+例：python batch_kokaton.py --games 1000 --policy random --jobs 8 --out results.csv
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import game_kokaton as gk
+
+
+FIELDS = ["seed", "policy", "ticks", "survival_sec", "rank", "score",
+          "shots", "items", "hp", "over"]  # 結果ファイルの列
+
+
+class RandomPolicy:
+    """
+    移動キーをランダムな長さだけ押し続け，ランダムな位置をクリックする操作
+    """
+    def __init__(self, seed: int):
+        """
+        引数 seed：操作用の乱数シード（ゲームの乱数とは別）
+        """
+        self.rng = random.Random(seed ^ 0x5EED)
+        self.keys = frozenset()
+        self.hold = 0  # 今の移動キーを押し続ける残りフレーム数
+
+    def __call__(self, world: gk.World) -> gk.FrameInput:
+        rng = self.rng
+        if self.hold <= 0:
+            self.keys = frozenset(k for k in gk.Bird.delta if rng.random() < 0.3)
+            self.hold = rng.randint(5, 60)
+        self.hold -= 1
+        mouse = (rng.randint(0, gk.WIDTH), rng.randint(0, gk.HEIGHT))
+        clicks = 1 if rng.random() < 0.05 else 0
+        return gk.FrameInput(self.keys, mouse, clicks, rng.random() < 0.1)
+
+
+class AimPolicy:
+    """
+    一番近いアイテム・爆弾・敵機を狙って撃ち，一番近い爆弾から上下に逃げる操作
+    乱数を使わないのでシードは受け取るだけ
+    """
+    def __init__(self, seed: int):
+        self.seed = seed
+
+    def __call__(self, world: gk.World) -> gk.FrameInput:
+        bird = world.bird.rect
+        dist = lambda c: abs(c[0]-bird.centerx)+abs(c[1]-bird.centery)
+        bombs = world.bombs.centers(world.bombs.indices())
+        targets = [s.rect.center for s in world.items] + bombs + world.emys.centers(world.emys.indices())
+        mouse, clicks = bird.center, 0
+        if targets:
+            mouse, clicks = min(targets, key=dist), 1
+        keys = set()
+        threats = world.minbombs.centers(world.minbombs.indices()) + bombs
+        if threats:
+            near = min(threats, key=dist)
+            if abs(near[0]-bird.centerx) < 150:
+                keys.add(gk.pg.K_w if near[1] >= bird.centery else gk.pg.K_s)
+        return gk.FrameInput(frozenset(keys), mouse, clicks, False)
+
+
+POLICIES = {
+    "idle": lambda seed: (lambda world: gk.IDLE_INPUT),
+    "random": RandomPolicy,
+    "aim": AimPolicy,
+}
+
+
+def play(seed: int, policy: str, max_ticks: int) -> dict:
+    """
+    1ゲームを画面なしで実行して結果を返す（ワーカープロセスで呼ばれる）
+    引数1 seed：ゲームの乱数シード
+    引数2 policy：操作方法の名前
+    引数3 max_ticks：打ち切るフレーム数
+    戻り値：FIELDSをキーとする結果の辞書
+    """
+    world = gk.run_headless(seed, max_ticks, POLICIES[policy](seed))
+    return {
+        "seed": seed,
+        "policy": policy,
+        "ticks": world.tmr,
+        "survival_sec": round(world.tmr/60, 2),
+        "rank": world.rank(),
+        "score": world.score,
+        "shots": world.shots_fired,
+        "items": world.items_used,
+        "hp": world.hp,
+        "over": int(world.over),
+    }
+
+
+def finished_runs(path: str) -> set[tuple[int, str]]:
+    """
+    既存の結果ファイルから実行済みの(シード, 操作方法)を集める
+    引数 path：結果ファイルのパス
+    戻り値：実行済みの(シード, 操作方法)の集合
+    """
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline="") as f:
+        return {(int(row["seed"]), row["policy"]) for row in csv.DictReader(f)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="画面なしでゲームをまとめて実行する")
+    parser.add_argument("--games", type=int, default=100, help="実行するゲーム数")
+    parser.add_argument("--seed-start", type=int, default=0, help="最初のシード")
+    parser.add_argument("--policy", choices=sorted(POLICIES), default="random", help="操作方法")
+    parser.add_argument("--max-ticks", type=int, default=60*60*10, help="1ゲームを打ち切るフレーム数")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="ワーカープロセス数")
+    parser.add_argument("--out", default="results.csv", help="結果を追記するCSVファイル")
+    parser.add_argument("--resume", action="store_true",
+                        help="結果ファイルに残っているシードを飛ばして続きから実行する")
+    args = parser.parse_args()
+
+    done = finished_runs(args.out) if args.resume else set()
+    seeds = [seed for seed in range(args.seed_start, args.seed_start+args.games)
+             if (seed, args.policy) not in done]
+    skipped = args.games - len(seeds)  # この操作方法で実行済みだったシードの数
+    write_header = not (args.resume and os.path.exists(args.out))
+    start = time.perf_counter()
+    ticks = 0
+    with open(args.out, "a" if args.resume else "w", newline="") as f, \
+            ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        if write_header:
+            writer.writeheader()
+        futures = [pool.submit(play, seed, args.policy, args.max_ticks) for seed in seeds]
+        for n, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            writer.writerow(row)
+            f.flush()  # 中断されても終わった分は残す
+            ticks += row["ticks"]
+            print(f"\r{n}/{len(seeds)} games", end="", file=sys.stderr)
+    elapsed = time.perf_counter() - start
+    print(f"\n{len(seeds)} games ({skipped} skipped), {ticks/max(elapsed, 1e-9):.0f} ticks/s",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+EffectPoolの爆発エフェクトの出現・更新・描画にかかる時間を，エフェクト1つを1スプライトにする作り方と比べるベンチマーク
+出現と更新は1要素あたりのマイクロ秒，描画は1フレームあたりのミリ秒（画像の大きさで決まる）を表示する
+画面全体の効果（ScreenFX）も，重なった数ごとに1フレームあたりのミリ秒を，以前の重力場と同じく
+不透明度付きの黒い画面を重なった数だけ転送する作り方と比べる
+例：python bench/bench_effects.py
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pygame as pg
+import game_kokaton as gk
+
+
+class SpriteEffect(pg.sprite.Sprite):
+    """
+    比べる相手：以前のExplosionと同じく，2枚の画像を持ち，update()で表示時間を減らして画像を入れ替える1つ1つのスプライト
+    """
+    def __init__(self, imgs: list[pg.Surface], xy: tuple[int, int], life: int):
+        super().__init__()
+        self.imgs = imgs
+        self.image = imgs[0]
+        self.rect = self.image.get_rect(center=xy)
+        self.life = life
+
+    def update(self):
+        self.life -= 1
+        self.image = self.imgs[self.life//10%2]
+        if self.life < 0:
+            self.kill()
+
+
+def measure(n: int, frames: int = 30) -> dict[str, float]:
+    """
+    n個の爆発を出して数フレーム動かし，それぞれのやり方の時間を返す
+    """
+    screen = pg.display.get_surface()
+    rng = random.Random(0)
+    centers = [(rng.randint(0, gk.WIDTH), rng.randint(0, gk.HEIGHT)) for _ in range(n)]
+    # 以前のExplosionスプライトと同じ，画素ごとの不透明度を持つ共有の画像
+    imgs = [gk.ASSETS.load("fig/explosion.gif"), gk.ASSETS.get("fig/explosion.gif", ("flip", True, True))]
+    result = {}
+
+    group = pg.sprite.Group()
+    start = time.perf_counter()
+    group.add(*(SpriteEffect(imgs, c, 200) for c in centers))
+    result["sprite spawn"] = (time.perf_counter() - start) / n * 1e6
+    start = time.perf_counter()
+    for _ in range(frames):
+        group.update()
+    result["sprite update"] = (time.perf_counter() - start) / frames / n * 1e6
+    start = time.perf_counter()
+    for _ in range(frames):
+        group.draw(screen)
+    result["sprite draw"] = (time.perf_counter() - start) / frames * 1000
+
+    for name, debris in (("blast", False), ("burst", True)):
+        pool = gk.EffectPool()
+        pool.burst(centers[:1], 200, debris)  # 新しいプールで初回だけかかる時間を測らない
+        pool.clear()
+        start = time.perf_counter()
+        pool.burst(centers, 200, debris)
+        elements = len(pool)
+        result[f"{name} spawn"] = (time.perf_counter() - start) / elements * 1e6
+        start = time.perf_counter()
+        for _ in range(frames):
+            pool.update()
+        result[f"{name} update"] = (time.perf_counter() - start) / frames / elements * 1e6
+        start = time.perf_counter()
+        for _ in range(frames):
+            pool.draw(screen, False)
+        result[f"{name} draw"] = (time.perf_counter() - start) / frames * 1000
+    return result
+
+
+def screen_fx_ms(layers: int, frames: int = 60) -> dict[str, float]:
+    """
+    画面全体の効果をlayers個重ねて描くときの1フレームあたりのミリ秒を返す
+    """
+    screen = pg.display.get_surface()
+    fx = gk.ScreenFX()
+    result = {}
+
+    veils = []  # 以前のGravityと同じ，不透明度150の黒い画面（効果1つに1枚）
+    for _ in range(layers):
+        veil = pg.Surface((gk.WIDTH, gk.HEIGHT))
+        veil.set_alpha(150)
+        veils.append(veil)
+    start = time.perf_counter()
+    for _ in range(frames):
+        for veil in veils:
+            screen.blit(veil, (0, 0))
+    result["alpha"] = (time.perf_counter() - start) / frames * 1000
+
+    fx.dim(screen, gk.Gravity.dim, layers)  # 重ねる絵を作る時間は測らない
+    start = time.perf_counter()
+    for _ in range(frames):
+        fx.dim(screen, gk.Gravity.dim, layers)
+    result["dim"] = (time.perf_counter() - start) / frames * 1000
+
+    fx.flash(screen, 0.5)
+    start = time.perf_counter()
+    for i in range(frames):  # フラッシュとフェードは毎フレーム強さが変わるので，重ねる絵も毎回塗り直す
+        fx.dim(screen, gk.Gravity.dim, layers)
+        fx.flash(screen, 1 - i/frames, (255, 40, 40))
+        fx.fade(screen, i/frames)
+    result["dim+flash+fade"] = (time.perf_counter() - start) / frames * 1000
+    return result
+
+
+def main() -> None:
+    pg.init()
+    pg.display.set_mode((gk.WIDTH, gk.HEIGHT))
+    gk.ASSETS.convert_loaded()
+    gk.EFFECT_ATLAS.build()
+    print("spawn/update: us per element, draw: ms per frame "
+          f"(a burst is {gk.EffectPool.PER_BURST} elements: blast, glow, {gk.EffectPool.DEBRIS} debris)")
+    names = None
+    for n in (16, 64, 256, 1024):
+        r = measure(n)
+        if names is None:
+            names = list(r)
+            print(f"{'n':>5} " + " ".join(f"{name:>13}" for name in names))
+        print(f"{n:>5} " + " ".join(f"{r[name]:>13.3f}" for name in names))
+    print()
+    print("screen effects: ms per frame (alpha: one alpha-150 black surface per layer, as Gravity used to draw)")
+    names = None
+    for layers in (1, 2, 4):
+        r = screen_fx_ms(layers)
+        if names is None:
+            names = list(r)
+            print(f"{'layers':>6} " + " ".join(f"{name:>15}" for name in names))
+        print(f"{layers:>6} " + " ".join(f"{r[name]:>15.3f}" for name in names))
+
+
+if __name__ == "__main__":
+    main()
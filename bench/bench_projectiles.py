@@ -0,0 +1,89 @@
+"""
+ProjectilePoolの移動・画面外の削除・当たり判定・描画にかかる1フレームあたりの時間を測るベンチマーク
+当たり判定だけの時間も，爆弾1つを1スプライトにしてpg.sprite.groupcollideで総当たりする作り方と比べる
+例：python bench/bench_projectiles.py
+"""
+import os
+import random
+import sys
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pygame as pg
+import game_kokaton as gk
+
+
+def make_pool(n: int) -> tuple[gk.ProjectilePool, pg.Rect, list[pg.Rect]]:
+    """
+    n個の小さい爆弾を画面内に置いたプールと，こうかとん相当の矩形，照準10個の矩形を作る
+    """
+    rng = random.Random(0)
+    pool = gk.ProjectilePool()
+    for _ in range(n):
+        pool.add(rng.uniform(10, gk.WIDTH-10), rng.uniform(10, gk.HEIGHT-10),
+                 rng.uniform(-0.01, 0.01), rng.uniform(-0.01, 0.01), 1,
+                 gk.Minbomb.rad, 0, gk.Minbomb.color_rgb)
+    bird = pg.Rect(800, 300, 48, 64)
+    shots = [pg.Rect(rng.randint(0, gk.WIDTH), rng.randint(0, gk.HEIGHT), 90, 90) for _ in range(10)]
+    return pool, bird, shots
+
+
+def frame_ms(n: int, frames: int = 60) -> tuple[float, float]:
+    """
+    n個の小さい爆弾を画面内でゆっくり動かし，1フレームあたりのミリ秒と，そのうちの当たり判定のミリ秒を返す
+    """
+    screen = pg.display.get_surface()
+    pool, bird, shots = make_pool(n)
+    collide = 0.0
+    start = time.perf_counter()
+    for _ in range(frames):
+        pool.update()
+        t = time.perf_counter()
+        pool.hit_rect(bird)
+        pool.hit_rects(shots)
+        collide += time.perf_counter() - t
+        pool.draw(screen, False)
+    return (time.perf_counter() - start) / frames * 1000, collide / frames * 1000
+
+
+def sprite_collide_ms(n: int, frames: int = 60) -> float:
+    """
+    同じ配置の爆弾を1つずつスプライトにしてグループに入れ，pg.sprite.spritecollide・groupcollideで
+    総当たりしたときの1フレームあたりの当たり判定のミリ秒を返す（消さずに判定だけ行う）
+    """
+    pool, bird, shots = make_pool(n)
+    bombs = pg.sprite.Group()
+    for x, y, rad in zip(pool.x[:n].tolist(), pool.y[:n].tolist(), pool.rad[:n].tolist()):
+        bomb = pg.sprite.Sprite()
+        bomb.rect = pg.Rect(0, 0, 2*rad, 2*rad)
+        bomb.rect.center = x, y
+        bombs.add(bomb)
+    bird_sprite = pg.sprite.Sprite()
+    bird_sprite.rect = bird
+    shot_group = pg.sprite.Group()
+    for rect in shots:
+        shot = pg.sprite.Sprite()
+        shot.rect = rect
+        shot_group.add(shot)
+    start = time.perf_counter()
+    for _ in range(frames):
+        pg.sprite.spritecollide(bird_sprite, bombs, False)
+        pg.sprite.groupcollide(bombs, shot_group, False, False)
+    return (time.perf_counter() - start) / frames * 1000
+
+
+def main() -> None:
+    pg.init()
+    pg.display.set_mode((gk.WIDTH, gk.HEIGHT))
+    gk.BOMB_ATLAS.build()
+    print(f"{'n':>6} {'ms/frame':>9} {'fps':>7} {'collide(ms)':>12} {'ns/bomb':>8} {'sprite(ms)':>11}")
+    for n in (10, 100, 1000, 10000):
+        ms, collide = frame_ms(n)
+        sprite = sprite_collide_ms(n)
+        print(f"{n:>6} {ms:>9.3f} {1000/ms:>7.0f} {collide:>12.3f} {collide/n*1e6:>8.0f} {sprite:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+"""
+ゲーム全体（World）を画面なしで決まった場面ごとに動かし，速さ・メモリ確保量・最大RSSを
+保存済みの基準値（bench/baseline.json）と比べるベンチマーク
+場面ごとに別プロセスで実行するので，最大RSSは場面ごとの値になる
+例：python bench/run_bench.py                      # 基準値と比べ，遅く・重くなっていれば終了コード1
+    python bench/run_bench.py --update-baseline    # 今の結果を基準値として保存する
+    python bench/run_bench.py --soak               # 1時間分（216000フレーム）の長時間実行も含める
+    python bench/run_bench.py --narrow-cost        # 細かい当たり判定（マスク・円）にかかる時間を測る
+    python bench/run_bench.py --pipeline           # 描画も含めて1つのプロセスと並列モードの速さを比べる
+    python bench/run_bench.py --replay             # リプレイの記録にかかる時間を測り，同じ入力と結果に戻るか確かめる
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+try:
+    import resource
+except ImportError:  # Windowsでは最大RSSを測らない
+    resource = None
+
+import game_kokaton as gk
+from batch_kokaton import AimPolicy, RandomPolicy
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+SEED = 1
+
+
+def early(world: gk.World, tick: int) -> None:
+    """
+    序盤（0フレーム目から）：敵機と爆弾が少しずつ増えていく
+    """
+
+
+def saturation(world: gk.World, tick: int) -> None:
+    """
+    tmr>=1500：10フレームごとに爆弾が出現し，全ての爆弾が小さい爆弾を落とす状態
+    """
+    if tick == 0:
+        world.tmr = 1500
+
+
+def minbomb_flood(world: gk.World, tick: int) -> None:
+    """
+    常に200個の爆弾がいて，それぞれが10フレームごとに小さい爆弾を落とす
+    """
+    if tick == 0:
+        world.tmr = 1500
+    while len(world.bombs) < 200:
+        world.add_bomb(10)
+
+
+def explosion_storm(world: gk.World, tick: int) -> None:
+    """
+    30フレームごとに敵機を上限まで出し，ストロベリーの効果で全て爆発させる
+    """
+    if tick == 0:
+        world.tmr = 1500
+    if tick % 30 == 0:
+        while world.add_enemy() is not None:
+            pass
+        world.wipe()
+
+
+_renderer = None
+
+
+def get_renderer() -> gk.Renderer:
+    """
+    ダミーのビデオドライバの画面に描くRendererを返す（初めて呼ばれたときに画面を作る）
+    """
+    global _renderer
+    if _renderer is None:
+        screen = gk.pg.display.set_mode((gk.WIDTH, gk.HEIGHT))
+        gk.ASSETS.convert_loaded()
+        _renderer = gk.Renderer(screen, gk.Background())
+    return _renderer
+
+
+def render(world: gk.World, tick: int) -> None:
+    """
+    序盤を背景のスクロールも含めて毎フレーム画面全体に描く（ダミーのビデオドライバ）
+    """
+    renderer = get_renderer()
+    renderer.begin(world.tmr)
+    renderer.draw_world(world)
+    renderer.end()
+
+
+SCENARIOS = {  # 場面の名前：(場面を作る関数，進めるフレーム数，操作方法)
+    "early": (early, 1500, AimPolicy),
+    "saturation": (saturation, 1500, None),
+    "minbomb_flood": (minbomb_flood, 600, None),
+    "explosion_storm": (explosion_storm, 600, None),
+    "render": (render, 600, AimPolicy),
+}
+SOAK = {"soak": (early, 60*60*60, AimPolicy)}  # ゲーム内で1時間
+
+
+def run(scenario: tuple, trace: bool) -> dict:
+    """
+    1つの場面を最初から動かす
+    引数1 scenario：(場面を作る関数，進めるフレーム数，操作方法)
+    引数2 trace：tracemallocでメモリ確保量を測るかどうか（遅くなるので速さとは別に測る）
+    戻り値：測った値の辞書
+    """
+    setup, ticks, policy = scenario
+    world = gk.World(SEED)
+    world.hp = 10**9  # 途中でゲームオーバーにならないようにする
+    policy = policy(SEED) if policy is not None else (lambda world: gk.IDLE_INPUT)
+    if trace:
+        tracemalloc.start()
+    start = time.perf_counter()
+    for tick in range(ticks):
+        setup(world, tick)
+        world.step(policy(world))
+    elapsed = time.perf_counter() - start
+    if not trace:
+        return {"ticks_per_sec": round(ticks/elapsed, 1)}
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"alloc_peak_kib": round(peak/1024, 1), "alloc_end_kib": round(current/1024, 1)}
+
+
+def measure(name: str, repeat: int) -> dict:
+    """
+    このプロセスで1つの場面を測る（速さ，メモリ確保量の順に別々に動かす）
+    引数1 name：場面の名前
+    引数2 repeat：速さを測る回数（中央値を使う）
+    """
+    scenario = (SCENARIOS | SOAK)[name]
+    gk.BOMB_ATLAS.build()
+    result = {"ticks": scenario[1]}
+    speeds = [run(scenario, False)["ticks_per_sec"] for _ in range(1 if name in SOAK else repeat)]
+    result["ticks_per_sec"] = round(statistics.median(speeds), 1)
+    if name not in SOAK:  # 長時間実行はtracemallocを付けると遅すぎるので測らない
+        result |= run(scenario, True)
+    if resource is not None:
+        result["peak_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+
+def measure_in_subprocess(name: str, repeat: int, broad_only: bool = False) -> dict:
+    """
+    別プロセスで1つの場面を測り，結果を受け取る
+    引数3 broad_only：当たり判定を矩形・円と矩形の判定だけにするかどうか
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), "--one", name, "--repeat", str(repeat)]
+    if broad_only:
+        cmd.append("--broad-only")
+    out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def narrow_cost(names: list[str], repeat: int, limit: float) -> int:
+    """
+    場面ごとに細かい当たり判定あり・なしの速さを測り，1フレームあたりに増えた時間を
+    60Hzの1フレーム（16.7ms）に対する割合で表示する
+    引数1 names：測る場面の名前
+    引数2 repeat：速さを測る回数
+    引数3 limit：許す割合（%）
+    戻り値：どれかの場面で許す割合を超えたら1
+    """
+    frame_ms = 1000 / 60
+    print(f"{'scenario':<16} {'broad ms':>9} {'narrow ms':>10} {'cost ms':>8} {'of frame':>9}")
+    over = False
+    for name in names:
+        broad = 1000 / measure_in_subprocess(name, repeat, True)["ticks_per_sec"]
+        narrow = 1000 / measure_in_subprocess(name, repeat)["ticks_per_sec"]
+        pct = (narrow - broad) / frame_ms * 100
+        over = over or pct >= limit
+        print(f"{name:<16} {broad:>9.3f} {narrow:>10.3f} {narrow-broad:>8.3f} {pct:>8.2f}%")
+    print("ok" if not over else f"narrow phase costs {limit}% of a frame or more")
+    return 1 if over else 0
+
+
+def run_pipeline(ticks: int, pipelined: bool) -> tuple[float, int, str]:
+    """
+    ランダムな操作で序盤を毎フレーム描きながら動かす（ゲームオーバーになったらそこで止める）
+    並列モードでは，ワーカーが次のフレームを進めている間にこのプロセスが1つ前のフレームを描く
+    引数1 ticks：進める最大のフレーム数
+    引数2 pipelined：並列モード（PipelinedWorld）で動かすかどうか
+    戻り値：(ticks/s，進めたフレーム数，最後の状態のハッシュ値)
+    """
+    renderer = get_renderer()
+    world = gk.PipelinedWorld(SEED) if pipelined else gk.World(SEED)  # ワーカーの起動は測らない
+    policy = RandomPolicy(SEED)  # Worldを見ない操作なので，どちらのモードでも同じ入力になる
+    steps = 0
+    start = time.perf_counter()
+    for _ in range(ticks):
+        world.sync()
+        if world.over:
+            break
+        world.step(policy(world))
+        steps += 1
+        renderer.begin(world.tmr)
+        if pipelined:
+            renderer.draw_shared(world)
+        else:
+            renderer.draw_world(world)
+        renderer.end()
+    elapsed = time.perf_counter() - start
+    digest = world.state_hash()
+    if pipelined:
+        world.close()
+    return steps/elapsed, steps, digest
+
+
+def pipeline_gain(ticks: int, repeat: int) -> int:
+    """
+    描画も含めて1つのプロセスと並列モードの速さを比べ，同じ結果になったかどうかを表示する
+    CPUが1つしかない環境では並列に動かないので速くならない
+    引数1 ticks：進める最大のフレーム数
+    引数2 repeat：それぞれ測る回数（速さが中央の回を使う）
+    戻り値：2つのモードの最後の状態が違えば1
+    """
+    print(f"{'mode':<10} {'ticks':>6} {'ticks/s':>9}")
+    results = {}
+    for name, pipelined in (("single", False), ("pipelined", True)):
+        runs = sorted((run_pipeline(ticks, pipelined) for _ in range(repeat)), key=lambda r: r[0])
+        results[name] = runs[len(runs)//2]
+        speed, steps, _ = results[name]
+        print(f"{name:<10} {steps:>6} {speed:>9.0f}")
+    same = results["single"][1:] == results["pipelined"][1:]
+    print(f"gain x{results['pipelined'][0]/results['single'][0]:.2f} on {os.cpu_count()} CPU(s), "
+          f"{'same result' if same else 'RESULTS DIFFER'}")
+    return 0 if same else 1
+
+
+OFFSCREEN = [(-40, 300), (gk.WIDTH+60, -25), (-32768, 32767)]  # 画面外の照準の位置（2バイトの値の端も含む）
+
+
+def replay_check(ticks: int) -> int:
+    """
+    狙う操作で序盤を動かしながらリプレイに記録し，記録にかかった時間を表示して，読み込んだ入力と
+    最後の状態が記録したときと同じか確かめる．狙う操作は画面から半分出た敵機も狙うので，
+    照準が画面の外（負の位置）になることがある．それに加えて時々OFFSCREENの位置に照準を動かす
+    引数 ticks：進めるフレーム数
+    戻り値：入力か最後の状態が違えば1
+    """
+    world = gk.World(SEED)
+    world.hp = 10**9
+    policy = AimPolicy(SEED)
+    sent = []
+    record_ns = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "check.kkr")
+        recorder = gk.ReplayRecorder(path, world.seed)
+        for tick in range(ticks):
+            inp = policy(world)
+            if tick % 100 == 99:
+                inp = inp._replace(mouse=OFFSCREEN[tick // 100 % len(OFFSCREEN)])
+            sent.append(inp)
+            start = time.perf_counter_ns()
+            recorder.record(inp)
+            record_ns += time.perf_counter_ns() - start
+            world.step(inp)
+        recorder.close(world)
+        size = os.path.getsize(path)
+        replay = gk.Replay.load(path)
+    got = list(replay.inputs())
+    same_inputs = got == sent
+    replayed = gk.World(replay.seed)
+    replayed.hp = 10**9
+    for inp in got:
+        replayed.step(inp)
+    same_state = replayed.state_hash() == replay.digest == world.state_hash()
+    offscreen = sum(not (0 <= x < gk.WIDTH and 0 <= y < gk.HEIGHT) for x, y in (inp.mouse for inp in sent))
+    print(f"{ticks} ticks, {offscreen} off-screen aims, {size} bytes, "
+          f"record {record_ns/ticks/1000:.2f} us/tick")
+    print(f"inputs {'same' if same_inputs else 'DIFFER'}, final state {'same' if same_state else 'DIFFERS'}")
+    return 0 if same_inputs and same_state else 1
+
+
+def machine() -> dict:
+    """
+    速さと最大RSSを測った環境を表す値を返す（基準値と一緒に保存する）
+    """
+    return {
+        "platform": platform.platform(),
+        "cpu": platform.processor() or platform.machine(),
+        "cpus": os.cpu_count(),
+        "python": platform.python_version(),
+        "pygame": gk.pg.version.ver,
+        "numpy": gk.np.__version__,
+    }
+
+
+def compare(results: dict, baseline: dict, tol_speed: float, tol_mem: float) -> list[str]:
+    """
+    基準値より許容範囲を超えて遅く・重くなった項目を集める
+    引数1 results：今回の結果
+    引数2 baseline：基準値
+    引数3 tol_speed：ticks/sの低下をどこまで許すか（割合）
+    引数4 tol_mem：メモリの増加をどこまで許すか（割合）
+    戻り値：基準値を外れた項目の説明のリスト
+    """
+    failures = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for key, value in result.items():
+            if key not in base or key == "ticks":
+                continue
+            if key == "ticks_per_sec":
+                limit = base[key] * (1 - tol_speed)
+                bad = value < limit
+            else:
+                limit = base[key] * (1 + tol_mem)
+                bad = value > limit
+            if bad:
+                failures.append(f"{name}.{key}: {value} (baseline {base[key]}, limit {limit:.1f})")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="ゲーム全体のベンチマーク")
+    parser.add_argument("--one", help=argparse.SUPPRESS)  # 子プロセスで1つの場面を測る
+    parser.add_argument("--broad-only", action="store_true", help=argparse.SUPPRESS)  # 細かい当たり判定をしない
+    parser.add_argument("--only", nargs="+", metavar="SCENARIO", help="測る場面を選ぶ")
+    parser.add_argument("--soak", action="store_true", help="1時間分の長時間実行も含める")
+    parser.add_argument("--repeat", type=int, default=5, help="速さを測る回数（中央値を使う）")
+    parser.add_argument("--tol-speed", type=float, default=0.25, help="ticks/sの低下の許容割合")
+    parser.add_argument("--tol-mem", type=float, default=0.25, help="メモリ確保量・最大RSSの増加の許容割合")
+    parser.add_argument("--baseline", default=BASELINE, help="基準値のファイル")
+    parser.add_argument("--update-baseline", action="store_true", help="今回の結果を基準値として保存する")
+    parser.add_argument("--narrow-cost", action="store_true",
+                        help="細かい当たり判定（マスク・円）あり・なしの差を1フレームに対する割合で表示する")
+    parser.add_argument("--narrow-limit", type=float, default=5, help="細かい当たり判定に許す1フレームの割合（%%）")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="描画も含めて，1つのプロセスと並列モード（ゲームを別プロセスで進める）の速さを比べる")
+    parser.add_argument("--replay", action="store_true",
+                        help="リプレイの記録にかかる時間を測り，画面外の照準も含めて同じ入力と結果に戻るか確かめる")
+    args = parser.parse_args()
+
+    if args.one:
+        gk.World.NARROW_PHASE = not args.broad_only
+        print(json.dumps(measure(args.one, args.repeat)))
+        return 0
+
+    if args.pipeline:
+        return pipeline_gain(SCENARIOS["early"][1], args.repeat)
+    if args.replay:
+        return replay_check(SCENARIOS["early"][1])
+    names = args.only or list(SCENARIOS) + (list(SOAK) if args.soak else [])
+    if args.narrow_cost:
+        return narrow_cost(names, args.repeat, args.narrow_limit)
+    results = {}
+    print(f"{'scenario':<16} {'ticks':>7} {'ticks/s':>9} {'alloc peak':>11} {'alloc end':>10} {'peak RSS':>9}")
+    for name in names:
+        r = results[name] = measure_in_subprocess(name, args.repeat)
+        print(f"{name:<16} {r['ticks']:>7} {r['ticks_per_sec']:>9.0f} "
+              f"{r.get('alloc_peak_kib', '-'):>8} KiB {r.get('alloc_end_kib', '-'):>6} KiB "
+              f"{r.get('peak_rss_kib', 0)/1024:>6.1f} MiB")
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline | results | {"machine": machine()}, f, indent=2)
+            f.write("\n")
+        print(f"baseline saved to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print("no baseline (run with --update-baseline)")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("machine") != machine():  # 速さと最大RSSは環境で変わる
+        print(f"note: baseline was measured on {baseline.get('machine', 'an unrecorded machine')}")
+    failures = compare(results, baseline, args.tol_speed, args.tol_mem)
+    for failure in failures:
+        print("REGRESSION", failure)
+    print("ok" if not failures else f"{len(failures)} regression(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
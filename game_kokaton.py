@@ -1,14 +1,47 @@
+import atexit
+import hashlib
+import heapq
+import json
 import math
+import multiprocessing
 import os
 import random
+import runpy
+import struct
 import sys
+import threading
 import time
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from multiprocessing import shared_memory
+from typing import Callable, NamedTuple
+import numpy as np
 import pygame as pg
 
 
 WIDTH = 1100  # ゲームウィンドウの幅
 HEIGHT = 650  # ゲームウィンドウの高さ
-os.chdir(os.path.dirname(os.path.abspath(__file__)))
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))  # fig/などの置き場所（作業ディレクトリは変えない）
+IMAGE_EXTS = (".png", ".jpg", ".gif")  # アセットとして先読みする画像の拡張子
+
+
+def asset_path(path: str) -> str:
+    """
+    "fig/3.png"のようなアセットのパスを，このファイルの場所を起点にした絶対パスにする
+    """
+    return os.path.join(BASE_DIR, path)
+
+
+def discover_assets(directory: str = "fig") -> list[str]:
+    """
+    ディレクトリにある画像アセットのパスを集める
+    引数 directory：BASE_DIRからの相対パス
+    戻り値："fig/3.png"の形のパスのリスト
+    """
+    names = sorted(os.listdir(asset_path(directory)))
+    return [f"{directory}/{name}" for name in names if name.lower().endswith(IMAGE_EXTS)]
 
 
 def check_bound(obj_rct: pg.Rect) -> tuple[bool, bool]:
@@ -25,769 +58,3826 @@ def check_bound(obj_rct: pg.Rect) -> tuple[bool, bool]:
     return yoko, tate
 
 
-def calc_orientation(org: pg.Rect, dst: pg.Rect) -> tuple[float, float]:
+def is_offscreen(obj_rct: pg.Rect) -> bool:
     """
-    orgから見て，dstがどこにあるかを計算し，方向ベクトルをタプルで返す
-    引数1 org：爆弾SurfaceのRect
-    引数2 dst：こうかとんSurfaceのRect
-    戻り値：orgから見たdstの方向ベクトルを表すタプル
+    オブジェクトが画面の左・上・下に完全に出たかどうかを判定する
+    （右側は出現位置なので判定しない）
+    引数：敵機やアイテムなどのRect
+    戻り値：画面から完全に出ていればTrue
     """
-    x_diff, y_diff = dst.centerx-org.centerx, dst.centery-org.centery
-    norm = math.sqrt(x_diff**2+y_diff**2)
-    return x_diff/norm, y_diff/norm
+    return obj_rct.right < 0 or obj_rct.bottom < 0 or HEIGHT < obj_rct.top
 
 
-def gameover(screen: pg.Surface, res_rank: str) -> None:
-    """
-    引数：screen
-    戻り値：なし
-    ゲームオーバー画面を表示する
-    """
-    gameover_img = pg.Surface((1100,650))
-    pg.draw.rect(gameover_img, (0,0,0), (0,0,WIDTH,HEIGHT))
-    gameover_img.set_alpha(200)
-    fonto = pg.font.Font(None,80)
-    txt = fonto.render("Game Over", True, (255,255,255))
-    gameover_img.blit(txt, [400,300])
-    rank_font = pg.font.Font(None, 60)
-    rank_txt = rank_font.render(f"Rank: {res_rank}", True, (255,255,255))
-    gameover_img.blit(rank_txt, [470,400])
-    kk_img = pg.transform.rotozoom(pg.image.load("fig/8.png"), 0, 0.9)
-    kk_rct = kk_img.get_rect()
-    kk_rct.center = 350,325
-    gameover_img.blit(kk_img,kk_rct)
-    kk2_img = pg.transform.rotozoom(pg.image.load("fig/8.png"), 0, 0.9)
-    kk2_rct = kk2_img.get_rect()
-    kk2_rct.center = 750,325
-    gameover_img.blit(kk2_img,kk2_rct)
-    screen.blit(gameover_img, [0,0])
-    pg.display.update()
-    time.sleep(5)
+def calc_orientation(org: tuple[float, float], dst: tuple[float, float]) -> tuple[float, float]:
+    """
+    orgから見て，dstがどこにあるかを計算し，方向ベクトルをタプルで返す
+    引数1 org：爆弾・敵機の中心座標
+    引数2 dst：こうかとんの中心座標
+    戻り値：orgから見たdstの方向ベクトルを表すタプル（同じ位置なら(0, 0)）
+    """
+    x_diff, y_diff = dst[0]-org[0], dst[1]-org[1]
+    norm = math.sqrt(x_diff**2+y_diff**2) or 1
+    return x_diff/norm, y_diff/norm
 
 
-class Bird(pg.sprite.Sprite):
+class AssetCache:
     """
-    ゲームキャラクター（こうかとん）に関するクラス
+    画像アセットを1度だけ読み込み，派生画像をキャッシュするクラス
+    派生画像（反転・回転拡大縮小・拡大縮小）は操作の列をキーとして保持し，
+    合計バイト数がmax_bytesを超えたら古いものから捨てる
+    先読みのスレッドプールからも呼ばれるので，キャッシュと数の更新はロックの中で行う
+    （デコードと変換はロックの外で行い，同じ画像を2つのスレッドが同時に読んだら先に入れた方を使う．
+    ディスプレイ形式への変換はメインスレッドだけが行う）
     """
-    delta = {  # 押下キーと移動量の辞書
-        pg.K_w: (0, -1),
-        pg.K_s: (0, +1),
-        pg.K_a: (-1, 0),
-        pg.K_d: (+1, 0),
-    }
-
-    def __init__(self, num: int, xy: tuple[int, int]):
+    def __init__(self, max_bytes: int = 64*1024*1024):
         """
-        こうかとん画像Surfaceを生成する
-        引数1 num：こうかとん画像ファイル名の番号
-        引数2 xy：こうかとん画像の位置座標タプル
+        引数 max_bytes：派生画像キャッシュの上限バイト数
         """
-        super().__init__()
-        img0 = pg.transform.rotozoom(pg.image.load(f"fig/{num}.png"), 0, 0.9)
-        img = pg.transform.flip(img0, True, False)  # デフォルトのこうかとん
-        self.imgs = {
-            (+1, 0): img,  # 右
-            (+1, -1): pg.transform.rotozoom(img, 45, 0.9),  # 右上
-            (0, -1): pg.transform.rotozoom(img, 90, 0.9),  # 上
-            (-1, -1): pg.transform.rotozoom(img0, -45, 0.9),  # 左上
-            (-1, 0): img0,  # 左
-            (-1, +1): pg.transform.rotozoom(img0, 45, 0.9),  # 左下
-            (0, +1): pg.transform.rotozoom(img, -90, 0.9),  # 下
-            (+1, +1): pg.transform.rotozoom(img, -45, 0.9),  # 右下
-        }
-        self.dire = (+1, 0)
-        self.image = self.imgs[self.dire]
-        self.rect = self.image.get_rect()
-        self.rect.center = xy
-        self.speed = 10
-        self.hp = 10
-        
-
-    def change_img(self, num: int, screen: pg.Surface):
+        self.max_bytes = max_bytes
+        self.images: dict[str, pg.Surface] = {}  # 読み込み済みの元画像
+        self.variants: OrderedDict[tuple, pg.Surface] = OrderedDict()  # 派生画像（LRU順）
+        self.variant_bytes = 0
+        self.unconverted: set[str] = set()  # ディスプレイ生成前に（またはワーカースレッドで）読み込んだ画像
+        self.pending: dict[str, Future] = {}  # 先読み中の画像
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def preload(self, paths: list[str], executor: Executor) -> None:
         """
-        こうかとん画像を切り替え，画面に転送する
-        引数1 num：こうかとん画像ファイル名の番号
-        引数2 screen：画面Surface
+        画像ファイルの読み込み（デコード）をスレッドプールで始めておく
+        引数1 paths：画像ファイルのパスのリスト
+        引数2 executor：読み込みを行うスレッドプール
         """
-        self.image = pg.transform.rotozoom(pg.image.load(f"fig/{num}.png"), 0, 0.9)
-        screen.blit(self.image, self.rect)
+        with self.lock:
+            for path in paths:
+                if path not in self.images and path not in self.pending:
+                    self.pending[path] = executor.submit(pg.image.load, asset_path(path))
 
-    def update(self, key_lst: list[bool], screen: pg.Surface):
+    def load(self, path: str) -> pg.Surface:
         """
-        押下キーに応じてこうかとんを移動させる
-        引数1 key_lst：押下キーの真理値リスト
-        引数2 screen：画面Surface
+        画像ファイルを読み込み，ディスプレイ形式に変換して返す
+        先読み中なら読み終わるのを待つ（まだ始まっていなければ自分で読む）．変換はディスプレイがあるときに
+        メインスレッドだけで行い，それ以外で読んだ画像は変換せずに覚えておいて，次にメインスレッドで
+        load()したときかconvert_loaded()で変換する
+        引数 path：画像ファイルのパス（BASE_DIRからの相対パス）
+        戻り値：画像Surface
         """
-        sum_mv = [0, 0]
-        for k, mv in __class__.delta.items():
-            if key_lst[k]:
-                sum_mv[0] += mv[0]
-                sum_mv[1] += mv[1]
-        self.rect.move_ip(self.speed*sum_mv[0], self.speed*sum_mv[1])
-        if check_bound(self.rect) != (True, True):
-            self.rect.move_ip(-self.speed*sum_mv[0], -self.speed*sum_mv[1])
-        if not (sum_mv[0] == 0 and sum_mv[1] == 0):
-            self.dire = tuple(sum_mv)
-            self.image = self.imgs[self.dire]
-        screen.blit(self.image, self.rect)
+        convert = _can_convert()
+        with self.lock:
+            img = self.images.get(path)
+            if img is not None:
+                self.hits += 1
+                if not convert or path not in self.unconverted:
+                    return img
+            else:
+                self.misses += 1
+                future = self.pending.pop(path, None)
+        if img is None:
+            if future is not None and future.cancel():  # まだ順番待ちなら自分で読む
+                future = None
+            img = future.result() if future is not None else pg.image.load(asset_path(path))
+            if not convert:
+                with self.lock:
+                    if path not in self.images:  # 別のスレッドが先に入れていたらそちらを使う
+                        self.images[path] = img
+                        self.unconverted.add(path)
+                    return self.images[path]
+        self._store_converted([path], [_convert(img)])
+        with self.lock:
+            return self.images[path]
+
+    def _store_converted(self, paths: list[str], imgs: list[pg.Surface]) -> None:
+        """
+        変換した画像を入れる（変換していない方から作った派生画像は作り直すために捨てる）
+        引数1 paths：画像ファイルのパスのリスト
+        引数2 imgs：それぞれを変換した画像のリスト
+        """
+        with self.lock:
+            for path, img in zip(paths, imgs):
+                if path in self.unconverted or path not in self.images:
+                    self.images[path] = img
+                    self.unconverted.discard(path)
+            for key in [k for k in self.variants if k[0] in paths]:
+                self.variant_bytes -= _surface_bytes(self.variants.pop(key))
+
+    def get(self, path: str, *ops: tuple) -> pg.Surface:
+        """
+        元画像に操作の列を順に適用した派生画像を返す
+        引数1 path：画像ファイルのパス
+        引数2以降 ops：("flip", x, y)，("rotozoom", angle, scale)，("scale", (w, h))のタプル
+        戻り値：派生画像Surface
+        """
+        if not ops:
+            return self.load(path)
+        key = (path, ops)
+        with self.lock:
+            img = self.variants.get(key)
+            if img is not None:
+                self.hits += 1
+                self.variants.move_to_end(key)
+                return img
+            self.misses += 1
+        img = _apply_op(self.get(path, *ops[:-1]), ops[-1])
+        with self.lock:
+            if key in self.variants:  # 別のスレッドが先に作った
+                return self.variants[key]
+            self.variants[key] = img
+            self.variant_bytes += _surface_bytes(img)
+            while self.variant_bytes > self.max_bytes and len(self.variants) > 1:
+                _, old = self.variants.popitem(last=False)
+                self.variant_bytes -= _surface_bytes(old)
+        return img
+
+    def convert_loaded(self) -> None:
+        """
+        ディスプレイ生成前やワーカースレッドで読み込んだ画像をディスプレイ形式に変換する
+        それらから作った派生画像は作り直すために捨てる（メインスレッドから呼ぶ）
+        """
+        if not _can_convert():
+            return
+        with self.lock:
+            paths = list(self.unconverted)
+            imgs = [self.images[path] for path in paths]
+        self._store_converted(paths, [_convert(img) for img in imgs])
+        SpriteSheet.convert_all()
+
+    def drop_pending(self) -> int:
+        """
+        まだ誰も受け取っていない先読みをやめる（起動が終わった後に残った分）
+        戻り値：やめた数
+        """
+        with self.lock:
+            futures = list(self.pending.values())
+            self.pending.clear()
+        for future in futures:
+            future.cancel()  # 読み始めている分は読み終わって捨てられる
+        return len(futures)
+
+    def stats(self) -> dict[str, int]:
+        """
+        キャッシュのヒット数・ミス数・保持数を返す
+        """
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "images": len(self.images),
+                "variants": len(self.variants),
+                "variant_bytes": self.variant_bytes,
+                "pending": len(self.pending),
+            }
+
+
+def _apply_op(src: pg.Surface, op: tuple) -> pg.Surface:
+    """
+    Surfaceに操作を1つ適用した新しいSurfaceを返す
+    引数1 src：元のSurface
+    引数2 op：("flip", x, y)，("rotozoom", angle, scale)，("scale", (w, h))のタプル
+    """
+    name, *args = op
+    if name == "flip":
+        return pg.transform.flip(src, *args)
+    elif name == "rotozoom":
+        return pg.transform.rotozoom(src, *args)
+    elif name == "scale":
+        return pg.transform.scale(src, *args)
+    raise ValueError(f"unknown image op: {name}")
 
 
-class Bomb(pg.sprite.Sprite):
+def _can_convert() -> bool:
     """
-    爆弾に関するクラス
+    今ディスプレイ形式に変換してよいか（ディスプレイがあり，メインスレッドで動いているか）を返す
+    """
+    return pg.display.get_surface() is not None and threading.current_thread() is threading.main_thread()
+
+
+def _convert(img: pg.Surface) -> pg.Surface:
     """
-    def __init__(self,):
+    透過情報を保ったままSurfaceをディスプレイ形式に変換する
+    カラーキーはrotozoomで失われるので，カラーキー付きの画像は透明な黒の上に描いて透明度付きにする
+    （透明な部分の色が回転・縮小の補間で縁ににじまないように）
+    """
+    if img.get_colorkey() is not None:
+        clear = pg.Surface(img.get_size(), pg.SRCALPHA)
+        clear.blit(img, (0, 0))
+        return clear.convert_alpha()
+    if img.get_flags() & pg.SRCALPHA:
+        return img.convert_alpha()
+    return img.convert()
+
+
+def _surface_bytes(img: pg.Surface) -> int:
+    """
+    Surfaceのピクセルデータのバイト数を返す
+    """
+    return img.get_width() * img.get_height() * img.get_bytesize()
+
+
+ASSETS = AssetCache()  # 全スプライトで共有する画像キャッシュ
+
+
+class SpriteSheet:
+    """
+    画像の派生画像（回転・拡大縮小などを量子化したもの）をまとめて1枚のアトラスに並べ，
+    それぞれをサブサーフェスとして返すクラス
+    組み立てたアトラスはcacheディレクトリに保存し，元画像と派生画像の指定が変わらなければ
+    次の起動からはファイルを読むだけにする
+    """
+    cache_dir = os.path.join(BASE_DIR, "cache")
+    magic = b"KKSS"
+    version = 1
+    max_width = 2048  # アトラスの幅の上限
+    sheets: list["SpriteSheet"] = []  # 作ったシート（ディスプレイ生成後に変換するため）
+
+    def __init__(self, name: str, specs: dict):
         """
-        左から右に流れる爆弾円Surfaceを生成する
+        引数1 name：シートの名前（キャッシュファイル名に使う）
+        引数2 specs：{キー: (画像ファイルのパス, AssetCache.getに渡す操作の列)}の辞書
         """
-        super().__init__()
-        rad = random.randint(15, 25)  # 爆弾円の半径：5以上20以下の乱数
-        self.image = pg.Surface((2*rad, 2*rad))
-        self.color = random.randint(1,3)  # ランダムで色を決定する
-        if self.color == 1:
-            for r in range (rad, 0, -1):
-                alpha = int(250*(r/rad))
-                pg.draw.circle(self.image, (alpha,0,0), (rad, rad), r)
-        if self.color == 2:
-            for r in range (rad, 0, -1):
-                alpha = int(250*(r/rad))
-                pg.draw.circle(self.image, (0,alpha,0), (rad, rad), r)
-        if self.color == 3:
-            for r in range (rad, 0, -1):
-                alpha = int(250*(r/rad))
-                pg.draw.circle(self.image, (0,0,alpha), (rad, rad), r)
-
-        self.image.set_colorkey((0, 0, 0))
-        self.rect = self.image.get_rect()
-        self.rect.center = WIDTH - 25, random.randint(0,HEIGHT)
-        self.vx, self.vy = -3, 0
-        self.speed = random.randint(2,3)
-        self.interval = random.randint(50,300)
-        
-
-    def update(self):
+        self.name = name
+        self.specs = specs
+        self.image: pg.Surface | None = None  # アトラス
+        self.rects: dict = {}  # キーごとのアトラス上の矩形
+        self.frames: dict = {}  # キーごとのサブサーフェス
+        self.masks: dict = {}  # キーごとの当たり判定用マスク（使うときに作る）
+        self.converted = False
+        self.loaded_from_cache = False
+        self.future: Future | None = None  # スレッドプールで用意中のとき
+        __class__.sheets.append(self)
+
+    def get(self, key) -> pg.Surface:
         """
-        爆弾を速度ベクトルself.vx, self.vyに基づき移動させる
-        引数 screen：画面Surface
+        キーの派生画像を返す（初めて使うときにアトラスを用意する）
         """
-        self.rect.move_ip(self.speed*self.vx, self.speed*self.vy)
-        self.rect
-        if check_bound(self.rect) != (True, True):
-            self.kill()
+        if not self.frames:
+            self.build()
+        return self.frames[key]
 
-class Minbomb(pg.sprite.Sprite):
-    """
-    爆弾に関するクラス
-    """
-    def __init__(self, bomb:Bomb,  bird: Bird):
+    def mask(self, key) -> pg.mask.Mask:
         """
-        爆弾円Surfaceを生成する
-        引数1 emy：爆弾を投下する敵機
-        引数2 bird：攻撃対象のこうかとん
+        キーの派生画像の不透明な部分を表すマスクを返す（初めて使うときに作って取っておく）
         """
-        super().__init__()
-        rad = 5  # 爆弾円の半径：5
-        self.image = pg.Surface((2*rad, 2*rad))
-        self.color = 250
-        for r in range (rad, 0, -1):
-            alpha = int(self.color*(r/rad))
-            pg.draw.circle(self.image, (alpha,0,alpha), (rad, rad), r)
-        self.image.set_colorkey((0, 0, 0))
-        self.rect = self.image.get_rect()
-        self.rect.center = bomb.rect.center
-        self.vx, self.vy = 0, 0
+        mask = self.masks.get(key)
+        if mask is None:
+            mask = self.masks[key] = pg.mask.from_surface(self.get(key))
+        return mask
 
-        
-        #爆弾を投下するemyから見た攻撃対象のbirdの方向を計算
-        self.vx, self.vy = calc_orientation(bomb.rect, bird.rect)
-        self.vx -= 0.9  
-        if self.vx == 0:
-            self.vx = 0.1
-        if self.vy == 0:
-            self.vy = 0.1
-        self.rect.centerx = bomb.rect.centerx
-        self.rect.centery = bomb.rect.centery+bomb.rect.height//2
-        self.speed = random.randint(2,3)
-        
+    def prefetch(self, executor: Executor) -> None:
+        """
+        アトラスの読み込みか組み立てをスレッドプールで始めておく（変換はbuild()でメインスレッドが行う）
+        引数 executor：スレッドプール
+        """
+        if self.image is None and self.future is None:
+            self.future = executor.submit(self._prepare)
 
-    def update(self):
+    def _digest(self) -> str:
         """
-        爆弾を速度ベクトルself.vx, self.vyに基づき移動させる
-        引数 screen：画面Surface
+        元画像（サイズと更新時刻）と派生画像の指定から，キャッシュが使えるかを確かめる値を作る
         """
-        self.rect.move_ip(self.speed*self.vx, self.speed*self.vy)
-        self.rect
-        if check_bound(self.rect) != (True, True):
-            self.kill()
+        h = hashlib.sha1(repr((__class__.version, pg.version.ver, sorted(self.specs.items(), key=repr))).encode())
+        for path in sorted({path for path, _ in self.specs.values()}):
+            st = os.stat(asset_path(path))
+            h.update(f"{path}:{st.st_size}:{st.st_mtime_ns}".encode())
+        return h.hexdigest()
 
-class Explosion(pg.sprite.Sprite):
-    """
-    爆発に関するクラス
-    """
-    def __init__(self, obj: "Bomb|Enemy", life: int):
+    def _cache_path(self) -> str:
+        return os.path.join(__class__.cache_dir, f"{self.name}.atlas")
+
+    def cached(self) -> bool:
         """
-        爆弾が爆発するエフェクトを生成する
-        引数1 obj：爆発するBombまたは敵機インスタンス
-        引数2 life：爆発時間
+        今の元画像と指定で作ったキャッシュファイルがあるかを返す（ヘッダとメタ情報だけ読む）
         """
-        super().__init__()
-        img = pg.image.load(f"fig/explosion.gif")
-        self.imgs = [img, pg.transform.flip(img, 1, 1)]
-        self.image = self.imgs[0]
-        self.rect = self.image.get_rect(center=obj.rect.center)
-        self.life = life
+        try:
+            with open(self._cache_path(), "rb") as f:
+                magic, version, _, _, n = struct.unpack("<4sBHHI", f.read(struct.calcsize("<4sBHHI")))
+                meta = json.loads(f.read(n))
+            return (magic == __class__.magic and version == __class__.version
+                    and meta["digest"] == self._digest())
+        except (OSError, ValueError, KeyError, struct.error):
+            return False
+
+    def build(self) -> None:
+        """
+        アトラスを用意してサブサーフェスを作る（先読み中なら終わるのを待つ）
+        """
+        if self.future is not None:
+            future, self.future = self.future, None
+            future.result()
+        elif self.image is None:
+            self._prepare()
+        self._convert()
+
+    def _prepare(self) -> None:
+        """
+        キャッシュファイルからアトラスを読み込む（無いか古ければ組み立てて保存する）
+        """
+        digest = self._digest()
+        if not self._load(digest):
+            self._render()
+            self._save(digest)
 
-    def update(self):
+    def _render(self) -> None:
         """
-        爆発時間を1減算した爆発経過時間_lifeに応じて爆発画像を切り替えることで
-        爆発エフェクトを表現する
+        派生画像を作り，高さの順に棚詰めでアトラスに並べる
+        （派生画像はアトラスに写すだけなのでASSETSにはキャッシュしない）
         """
-        self.life -= 1
-        self.image = self.imgs[self.life//10%2]
-        if self.life < 0:
-            self.kill()
+        imgs = {}
+        for key, (path, ops) in self.specs.items():
+            img = ASSETS.load(path)
+            for op in ops:
+                img = _apply_op(img, op)
+            imgs[key] = img
+        order = sorted(imgs, key=lambda k: -imgs[k].get_height())
+        x = y = shelf = width = 0
+        for key in order:
+            w, h = imgs[key].get_size()
+            if x + w > __class__.max_width:
+                x, y, shelf = 0, y + shelf, 0
+            self.rects[key] = pg.Rect(x, y, w, h)
+            x += w
+            shelf = max(shelf, h)
+            width = max(width, x)
+        self.image = pg.Surface((max(width, 1), max(y + shelf, 1)), pg.SRCALPHA)
+        for key in order:
+            self.image.blit(imgs[key], self.rects[key])
+
+    def _save(self, digest: str) -> None:
+        """
+        アトラスを保存する（ヘッダ，キーと矩形のJSON，zlibで圧縮したRGBAのピクセル）
+        書き込めないときは保存しない
+        """
+        meta = json.dumps({"digest": digest, "rects": [[repr(k), list(r)] for k, r in self.rects.items()]}).encode()
+        pixels = zlib.compress(pg.image.tostring(self.image, "RGBA"), 1)
+        try:
+            os.makedirs(__class__.cache_dir, exist_ok=True)
+            tmp = self._cache_path() + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(struct.pack("<4sBHHI", __class__.magic, __class__.version,
+                                    *self.image.get_size(), len(meta)))
+                f.write(meta)
+                f.write(pixels)
+            os.replace(tmp, self._cache_path())
+        except OSError:
+            pass
+
+    def _load(self, digest: str) -> bool:
+        """
+        保存済みのアトラスを読み込む
+        戻り値：読み込めたかどうか（無い，壊れている，古いときはFalse）
+        """
+        try:
+            with open(self._cache_path(), "rb") as f:
+                raw = f.read()
+            magic, version, w, h, n = struct.unpack_from("<4sBHHI", raw)
+            head = struct.calcsize("<4sBHHI")
+            meta = json.loads(raw[head:head+n])
+            if magic != __class__.magic or version != __class__.version or meta["digest"] != digest:
+                return False
+            keys = {repr(k): k for k in self.specs}
+            rects = {keys[k]: pg.Rect(r) for k, r in meta["rects"]}
+            if len(rects) != len(keys):
+                return False
+            pixels = zlib.decompress(raw[head+n:])
+            del raw
+            image = pg.image.frombuffer(pixels, (w, h), "RGBA")  # 展開したバイト列をコピーせずに使う
+        except (OSError, ValueError, KeyError, struct.error, zlib.error):
+            return False
+        self.image, self.rects = image, rects
+        self.loaded_from_cache = True
+        return True
+
+    def _convert(self) -> None:
+        """
+        ディスプレイがあればアトラスをディスプレイ形式にして，サブサーフェスを作り直す
+        """
+        if not self.converted and _can_convert():
+            self.image = self.image.convert_alpha()
+            self.converted = True
+        self.frames = {key: self.image.subsurface(rect) for key, rect in self.rects.items()}
 
+    @staticmethod
+    def convert_all() -> None:
+        """
+        ディスプレイ生成前に用意したアトラスをディスプレイ形式に変換する
+        """
+        for sheet in SpriteSheet.sheets:
+            if sheet.image is not None and sheet.future is None:
+                sheet._convert()
+
+
+_BIRD_ZOOM = ("rotozoom", 0, 0.9)
+_BIRD_FLIP = ("flip", True, False)  # デフォルトのこうかとん
+# 向きごとのこうかとん画像の作り方（斜めと上下は0.9倍した画像をさらに0.9倍して回したもの）
+_BIRD_DIRECTIONS = {
+    (+1, 0): (_BIRD_ZOOM, _BIRD_FLIP),  # 右
+    (+1, -1): (_BIRD_ZOOM, _BIRD_FLIP, ("rotozoom", 45, 0.9)),  # 右上
+    (0, -1): (_BIRD_ZOOM, _BIRD_FLIP, ("rotozoom", 90, 0.9)),  # 上
+    (-1, -1): (_BIRD_ZOOM, ("rotozoom", -45, 0.9)),  # 左上
+    (-1, 0): (_BIRD_ZOOM,),  # 左
+    (-1, +1): (_BIRD_ZOOM, ("rotozoom", 45, 0.9)),  # 左下
+    (0, +1): (_BIRD_ZOOM, _BIRD_FLIP, ("rotozoom", -90, 0.9)),  # 下
+    (+1, +1): (_BIRD_ZOOM, _BIRD_FLIP, ("rotozoom", -45, 0.9)),  # 右下
+}
+ITEM_ANGLES = 36  # アイテムの回転角度の段階数（10度ごと）
+
+# こうかとん（0～9番の顔と，番号ごとの8方向）
+BIRD_SHEET = SpriteSheet("bird", {
+    **{num: (f"fig/{num}.png", (_BIRD_ZOOM,)) for num in range(10)},
+    **{(num, dire): (f"fig/{num}.png", ops) for num in range(10) for dire, ops in _BIRD_DIRECTIONS.items()},
+})
+ENEMY_SHEET = SpriteSheet("enemy", {  # 敵機
+    i: (f"fig/alien{i}.png", (("rotozoom", 0, 0.8),)) for i in range(1, 4)
+})
+ITEM_SHEET = SpriteSheet("item", {  # アイテム（番号，角度の段階）
+    (num, a): (f"fig/item{num}.png", (("rotozoom", a*360//ITEM_ANGLES, 0.25),))
+    for num in range(3) for a in range(ITEM_ANGLES)
+})
+
+
+def startup_assets() -> list[str]:
+    """
+    起動時に先読みする画像のパスを返す
+    スプライトシートの元画像は，キャッシュファイルが使えるなら読まないので除く
+    """
+    sources = {path for sheet in SpriteSheet.sheets for path, _ in sheet.specs.values()}
+    stale = {path for sheet in SpriteSheet.sheets if not sheet.cached() for path, _ in sheet.specs.values()}
+    return [path for path in discover_assets() if path not in sources or path in stale]
 
 
-class Shot(pg.sprite.Sprite):
+class BombAtlas:
     """
-    爆発に関するクラス
+    爆弾円のグラデーション画像を(色, 半径)ごとに1度だけ生成して共有するクラス
+    半径ごとに「中心からのリング番号」のインデックス画像をNumPyで作り，
+    色ごとのグラデーションはパレットとして与える
     """
-    def __init__(self, obj: "Bomb|Enemy", life: int):
+    def __init__(self):
+        self.rings: dict[int, np.ndarray] = {}  # 半径ごとのリング番号配列
+        self.images: dict[tuple[tuple[int, int, int], int], pg.Surface] = {}
+        self.masks: dict[int, pg.mask.Mask] = {}  # 半径ごとの爆弾円の当たり判定用マスク
+        self.converted = False
+
+    def get(self, color: tuple[int, int, int], rad: int) -> pg.Surface:
         """
-        爆弾が爆発するエフェクトを生成する
-        引数1 obj：爆発するBombまたは敵機インスタンス
-        引数2 life：爆発時間
+        爆弾円Surfaceを返す（初回のみ生成する）
+        引数1 color：RGBそれぞれの有無を0/1で表すタプル
+        引数2 rad：爆弾円の半径
+        戻り値：爆弾円Surface（全インスタンスで共有するので書き換えないこと）
         """
-        super().__init__()
-        img = pg.image.load(f"fig/explosion.gif")
-        self.imgs = [img, pg.transform.flip(img, 1, 1)]
-        self.image = self.imgs[0]
-        self.rect = self.image.get_rect(center=obj.rect.center)
-        self.life = life
-    def update(self):
+        img = self.images.get((color, rad))
+        if img is None:
+            img = self._render(color, rad)
+            self.images[(color, rad)] = img
+        return img
+
+    def mask(self, rad: int) -> pg.mask.Mask:
         """
-        爆発時間を1減算した爆発経過時間_lifeに応じて爆発画像を切り替えることで
-        爆発エフェクトを表現する
+        爆弾円の描かれるピクセルと同じ形の円のマスクを返す（半径ごとに初回のみ生成する）
+        引数 rad：爆弾円の半径
         """
-        self.life -= 1
-        self.image = self.imgs[self.life//10%2]
-        if self.life < 0:
-            self.kill()
+        mask = self.masks.get(rad)
+        if mask is None:
+            img = pg.surfarray.make_surface((self._ring_index(rad) > 0).astype(np.uint8))
+            img.set_colorkey(0)
+            mask = self.masks[rad] = pg.mask.from_surface(img)
+        return mask
+
+    def build(self) -> None:
+        """
+        ゲームで使う全ての(色, 半径)の組み合わせを生成しておく
+        ディスプレイ生成前に作った画像はディスプレイ形式に作り直す
+        """
+        if not self.converted and pg.display.get_surface() is not None:
+            self.images.clear()
+            self.converted = True
+        for color in Bomb.colors.values():
+            for rad in range(Bomb.min_rad, Bomb.max_rad+1):
+                self.get(color, rad)
+        self.get(Minbomb.color_rgb, Minbomb.rad)
+
+    def _ring_index(self, rad: int) -> np.ndarray:
+        """
+        各ピクセルが内側から何番目の円に含まれるかを表す配列を返す（円の外側は0）
+        """
+        ring = self.rings.get(rad)
+        if ring is None:
+            c = np.arange(2*rad) + 0.5 - rad  # ピクセル中心の座標
+            dist = np.hypot(c[:, None], c[None, :])
+            ring = np.maximum(np.ceil(dist), 1).astype(np.uint8)
+            ring[dist > rad] = 0
+            self.rings[rad] = ring
+        return ring
+
+    def _render(self, color: tuple[int, int, int], rad: int) -> pg.Surface:
+        """
+        リング番号をパレットで色に変換した爆弾円Surfaceを生成する
+        """
+        img = pg.surfarray.make_surface(self._ring_index(rad))
+        palette = [(0, 0, 0)] * 256
+        for r in range(1, rad+1):
+            alpha = int(250*(r/rad))
+            palette[r] = (alpha*color[0], alpha*color[1], alpha*color[2])
+        img.set_palette(palette)
+        img.set_colorkey((0, 0, 0))
+        if pg.display.get_surface() is not None:
+            img = img.convert()
+            self.converted = True
+        return img
 
 
-#class Enemy(pg.sprite.Sprite):
-class Enemy(pg.sprite.Sprite):
+BOMB_ATLAS = BombAtlas()  # 全ての爆弾で共有する爆弾円画像
+
+
+FX_BLAST, FX_GLOW, FX_DEBRIS = range(3)  # エフェクトの種類（爆発，光，破片）
+
+
+class EffectAtlas:
     """
-    敵に関するクラス
+    爆発エフェクトのコマ画像（爆発の2コマと，爆発・光・破片が消えていく段階）を1列に並べて持つクラス
+    EffectPoolは要素ごとのコマ番号でこの列を引き，コマごとの合成方法（光と破片は加算）と一緒にblitsに渡す
+    コマ番号は(種類, 表示するフレーム数, 経過フレーム数)の表から1回の配列の参照で引く
+    爆発の絵は透明色とRLE圧縮で持ち，消えていく段階は画像全体の不透明度で表す
+    （画素ごとの不透明度の画像より1桁速く描ける．元のgifの透明は0か255だけなので見た目は同じ）
     """
-    
-    imgs = [pg.image.load(f"fig/alien{i}.png") for i in range(1, 4)] #画像読み込み
-    
-    #def __init__(self):
-        #super().__init__()
-        #self.image =
-        #self.rect = 
-        #self.rect.center = 
-        #self.vx, self.vy = 
-        
-    #def update(self):
+    KEY = (255, 0, 255)  # 爆発の絵の透明色（爆発の絵に無い色）
+    FADES = 8  # 消えるまでの明るさ（爆発は不透明度）の段階数
+    BLAST_FADE = 10  # 爆発の絵が消えていく最後のフレーム数
+    MAX_LIFE = 127  # 表示するフレーム数の上限（コマ番号の表の大きさ）
+    GLOW = (56, (180, 90, 20))  # 光の半径と中心の色
+    DEBRIS = (4, (255, 230, 140))  # 破片の半径と中心の色
+
     def __init__(self):
+        self.frames: list[pg.Surface] = []
+        self.flags: list[int] = []  # コマごとのblitのspecial_flags
+        self.first = np.array([0, 2, 3]) * __class__.FADES  # 種類ごとの最初のコマ番号
+        self.half_w = np.zeros(0)  # コマごとの幅・高さの半分（中心座標から左上を求める）
+        self.half_h = np.zeros(0)
+        self.converted = False
+        kind, life, age = np.ogrid[:3, :__class__.MAX_LIFE+1, :__class__.MAX_LIFE+1]
+        self.lut = self.frame_index(kind, age, life).astype(np.int32)  # [種類, 表示フレーム数, 経過フレーム数]
+
+    def build(self) -> None:
         """
-        画像がランダムな位置で横スクロールする
+        コマ画像を作る（作ってあれば何もしない）．ディスプレイ生成前に作った画像はディスプレイ形式に作り直す
         """
-        super().__init__()
+        display = pg.display.get_surface() is not None
+        if self.frames and (self.converted or not display):
+            return
+        fades = __class__.FADES
+        frames = []
+        for img in (ASSETS.load("fig/explosion.gif"), ASSETS.get("fig/explosion.gif", ("flip", True, True))):
+            frames += [(self._keyed(img, 255 * (fades - level) // fades), 0) for level in range(fades)]
+        for rad, rgb in (__class__.GLOW, __class__.DEBRIS):
+            frames += [(self._disc(rad, rgb, (fades - level) / fades), pg.BLEND_ADD) for level in range(fades)]
+        self.frames = [img for img, _ in frames]
+        self.flags = [flags for _, flags in frames]
+        self.half_w = np.array([img.get_width() / 2 for img in self.frames])
+        self.half_h = np.array([img.get_height() / 2 for img in self.frames])
+        self.converted = display
+
+    def _keyed(self, img: pg.Surface, alpha: int) -> pg.Surface:
+        """
+        透明な部分を透明色で塗った，RLE圧縮で描く画像を作る
+        引数1 img：元の画像（共有の画像なので書き換えない）
+        引数2 alpha：画像全体の不透明度（255なら不透明）
+        """
+        display = pg.display.get_surface()
+        keyed = pg.Surface(img.get_size(), 0, display) if display is not None else pg.Surface(img.get_size())
+        keyed.fill(__class__.KEY)
+        keyed.blit(img, (0, 0))
+        keyed.set_colorkey(__class__.KEY, pg.RLEACCEL)
+        if alpha < 255:
+            keyed.set_alpha(alpha, pg.RLEACCEL)
+        return keyed
+
+    def _disc(self, rad: int, rgb: tuple[int, int, int], level: float) -> pg.Surface:
+        """
+        中心ほど明るい円の画像を作る（黒は加算しても変わらないので透明色を使わない）
+        引数1 rad：半径
+        引数2 rgb：中心の色
+        引数3 level：明るさ（0～1）
+        """
+        c = np.arange(2*rad) + 0.5 - rad  # ピクセル中心の座標
+        light = np.clip(1 - np.hypot(c[:, None], c[None, :]) / rad, 0, 1) * level
+        img = pg.surfarray.make_surface((light[:, :, None] * rgb).astype(np.uint8))
+        return img.convert() if pg.display.get_surface() is not None else img
 
-    
-        original_image = random.choice(Enemy.imgs) #ランダムな画像の読みこみ
-        self.image = pg.transform.rotozoom(original_image, 0, 0.8) #画像の大きさを設定
-        self.rect = self.image.get_rect()
-        self.rect.x = WIDTH + random.randint(0,50) #x座標の位置をランダムにして調整
-        self.rect.y = HEIGHT - random.randint(100, 500) #y座標の位置をランダムにして調整　
+    def frame_index(self, kind: np.ndarray, age: np.ndarray, life: np.ndarray) -> np.ndarray:
+        """
+        エフェクトごとのコマ番号を返す（コマ番号の表を作るときに使う）
+        爆発は残り時間10フレームごとに2コマを入れ替えて最後のBLAST_FADEフレームで薄くし，
+        光と破片は経過時間に応じて暗くする
+        引数1 kind：種類の配列
+        引数2 age：経過フレーム数の配列
+        引数3 life：表示するフレーム数の配列
+        """
+        fades = __class__.FADES
+        fade = np.minimum(age * fades // (life + 1), fades - 1)
+        tail = __class__.BLAST_FADE
+        blast_fade = np.clip((age - life + tail) * fades // (tail + 1), 0, fades - 1)
+        blast = (life - age) // 10 % 2 * fades + blast_fade
+        return np.where(kind == FX_BLAST, blast, self.first[kind] + fade)
 
 
-        self.base_speed = random.randint(1,6) #スピードを5段階に
-        self.speed = self.base_speed
-        self.interval = random.randint(50,300)
-    def slow_speed(self):
-        self.speed = self.base_speed *0.5
-    
-    
-    def update(self):
-        self.rect.x -= self.speed
-        if self.rect.right < 0: #右の座標が0より小さかったら
-            self.rect.x = WIDTH + random.randint(0,50)
-            self.rect.y = HEIGHT - random.randint(100, 500)
-        
+EFFECT_ATLAS = EffectAtlas()  # 全ての爆発エフェクトで共有するコマ画像
 
 
+_FONTS: dict[int, pg.font.Font] = {}  # サイズごとに共有するフォント
 
-class Score:
+
+def get_font(size: int) -> pg.font.Font:
     """
-    打ち落とした爆弾，敵機の数をスコアとして表示するクラス
-    爆弾：1点
-    敵機：10点
+    サイズごとに1つだけ生成したデフォルトフォントを返す
+    引数 size：フォントサイズ
+    戻り値：Fontオブジェクト
     """
-    def __init__(self):
-        self.font = pg.font.Font(None, 50)
-        self.color = (0, 0, 255)
-        self.value = 0
-        self.image = self.font.render(f"Score: {self.value}", 0, self.color)
-        self.rect = self.image.get_rect()
-        self.rect.center = 100, HEIGHT-50
-
-    def update(self, screen: pg.Surface):
-        self.image = self.font.render(f"Score: {self.value}", 0, self.color)
-        screen.blit(self.image, self.rect)
+    font = _FONTS.get(size)
+    if font is None:
+        font = _FONTS[size] = pg.font.Font(None, size)
+    return font
 
 
-class Aim(pg.sprite.Sprite):
+class TextCache:
     """
-    照準機能に関するクラス
+    描画済みの文字列Surfaceを(フォントサイズ, 文字列, 色)をキーにLRUで保持するクラス
     """
-    def __init__(self,mouse_pos:tuple[int,int],b_num:int) -> None:
+    def __init__(self, maxsize: int = 256):
         """
-        カーソルの位置を取得する 
-        引数１ mouse_pos: カーソルの位置
-        引数２ b_num: 残弾数
+        引数 maxsize：保持する文字列Surfaceの最大数
         """
-        self.target_img=pg.image.load("fig/target.png")
-        self.target_img=pg.transform.scale(self.target_img,(60,60))
-        self.x=mouse_pos[0]
-        self.y=mouse_pos[1]
-        self.b=b_num
-        self.font = pg.font.Font(None, 50)
-        self.color = (0, 0, 255)
-        self.image = self.font.render(f"bullets: {self.b}", 0, self.color)
-        self.rect = self.image.get_rect()
-        self.rect.center = 100, HEIGHT-100
+        self.maxsize = maxsize
+        self.surfaces: OrderedDict[tuple, pg.Surface] = OrderedDict()
 
-    def update(self,screen:pg.Surface) -> None:
+    def render(self, size: int, text: str, color: tuple[int, int, int]) -> pg.Surface:
         """
-        カーソルの位置に赤い円を描画する＋残弾数を表示する
-        引数１ screen: 画面surface
+        文字列Surfaceを返す（キャッシュに無いときだけfont.renderする）
+        引数1 size：フォントサイズ
+        引数2 text：文字列
+        引数3 color：文字色
+        戻り値：文字列Surface
         """
-        screen.blit(self.target_img,[self.x-28,self.y-26])
-        screen.blit(self.image,self.rect)
-    
+        key = (size, text, color)
+        img = self.surfaces.get(key)
+        if img is not None:
+            self.surfaces.move_to_end(key)
+            return img
+        img = self.surfaces[key] = get_font(size).render(text, 0, color)
+        if len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+        return img
+
+
+TEXT_CACHE = TextCache()  # HUDで共有する文字列キャッシュ
+
 
-class Point:
+class GlyphAtlas:
     """
-    爆発用の座標のクラス
+    数字とコロンのグリフを1枚のSurfaceに並べ，1文字ずつのサブサーフェスとして持つクラス
+    数値が変わっても新しいSurfaceを作らずにグリフを並べて描画できる
     """
-    def __init__(self, pos:tuple[int,int]) -> None:
+    chars = "0123456789:"
+
+    def __init__(self, size: int, color: tuple[int, int, int]):
         """
-        クリックした座標
-        引数１ pos: エフェクトを描画する座標
+        引数1 size：フォントサイズ
+        引数2 color：文字色
         """
-        self.rect = pg.Rect(0, 0, 0, 0)
-        self.rect.center = pos
+        font = get_font(size)
+        renders = [font.render(c, 0, color) for c in __class__.chars]
+        width = sum(img.get_width() for img in renders)
+        height = max(img.get_height() for img in renders)
+        self.image = pg.Surface((width, height), renders[0].get_flags(), renders[0])
+        self.image.set_palette(renders[0].get_palette())
+        self.image.set_colorkey(renders[0].get_colorkey())
+        self.glyphs: dict[str, pg.Surface] = {}
+        x = 0
+        for c, img in zip(__class__.chars, renders):
+            self.image.blit(img, (x, 0))
+            self.glyphs[c] = self.image.subsurface((x, 0, img.get_width(), img.get_height()))
+            x += img.get_width()
 
 
-class Gravity(pg.sprite.Sprite):
+_GLYPHS: dict[tuple[int, tuple[int, int, int]], GlyphAtlas] = {}
+
+
+def get_glyphs(size: int, color: tuple[int, int, int]) -> GlyphAtlas:
     """
-    重力場に関するクラス
+    (フォントサイズ, 色)ごとに1つだけ生成したグリフアトラスを返す
     """
-    def __init__(self, life:int):
-        super().__init__()
-        self.image = pg.Surface((WIDTH, HEIGHT))
-        pg.draw.rect(self.image, (0,0,0), self.image.get_rect())
-        self.image.set_alpha(150)
-        self.rect = self.image.get_rect()
-        self.life = life
-    
-    def update(self):
-        """
-        重力場の発動時間を1ずつ減算していき、0未満になったら消す
-        """
-        self.life -= 1
-        if self.life < 0:
-            self.kill()
+    atlas = _GLYPHS.get((size, color))
+    if atlas is None:
+        atlas = _GLYPHS[(size, color)] = GlyphAtlas(size, color)
+    return atlas
 
 
-class Time():
+class HudText:
     """
-    タイムをカウントするクラス
+    「ラベル＋値」の形のHUD文字列を表示する基底クラス
+    値が変わったとき（dirty）だけ描画内容を組み立て直す．
+    値が数字とコロンだけならグリフアトラスから合成し，それ以外はTEXT_CACHEを使う
     """
-    def __init__(self):
-        self.font = pg.font.Font(None, 50)
-        self.color = (150, 150, 255)
-        self.rect = self.font.render("Time: 00:00", 0, self.color).get_rect()
-        self.rect.center = 105, 40
-    
-    def update(self, screen: pg.Surface, tmr: int):
-        total = tmr // 60
-        min = total // 60
-        sec = total % 60
-        time_str = f"Time:{min:02}:{sec:02}"
-        self.image = self.font.render(time_str, 0, self.color)
-        screen.blit(self.image, self.rect)
+    def __init__(self, size: int, color: tuple[int, int, int], label: str, text: str):
+        """
+        引数1 size：フォントサイズ
+        引数2 color：文字色
+        引数3 label：変化しない先頭の文字列
+        引数4 text：表示位置を決めるための最初の値
+        """
+        self.size = size
+        self.color = color
+        self.label = label
+        self.font = get_font(size)
+        self.rect = TEXT_CACHE.render(size, label+text, color).get_rect()
+        self.text = None  # 現在表示している値
+        self.blit_seq: list[tuple[pg.Surface, tuple[int, int]]] = []
+
+    def set_text(self, text: str) -> None:
+        """
+        表示する値を設定し，変わっていれば描画内容を組み立て直す
+        引数 text：表示する値の文字列
+        """
+        if text == self.text:
+            return
+        self.text = text
+        x, y = self.rect.topleft
+        glyphs = get_glyphs(self.size, self.color).glyphs
+        if all(c in glyphs for c in text):
+            label = TEXT_CACHE.render(self.size, self.label, self.color)
+            self.blit_seq = [(label, (x, y))]
+            x += label.get_width()
+            for c in text:
+                self.blit_seq.append((glyphs[c], (x, y)))
+                x += glyphs[c].get_width()
+        else:
+            self.blit_seq = [(TEXT_CACHE.render(self.size, self.label+text, self.color), (x, y))]
+
+    def draw(self, screen: pg.Surface) -> list[pg.Rect]:
+        """
+        組み立て済みの文字列を画面に転送する
+        引数 screen：画面Surface
+        戻り値：描画した矩形のリスト
+        """
+        return screen.blits(self.blit_seq)
 
 
-class Rank():
+class ScreenFX:
     """
-    ランクの表示をするクラス
+    画面全体にかける効果（暗くする・フェード・フラッシュ）に関するクラス
+    半透明の全画面Surfaceを作る代わりに，単色で塗った画面と同じ形式のSurfaceを
+    BLEND_RGB_MULT・BLEND_RGB_ADDで画面に転送する（SIMDの効く転送になり，Surface.fillの
+    特殊フラグより速い）．重ねる絵は効果と画面の大きさごとに最初に使うときだけ作って使い回す
     """
     def __init__(self):
-        self.font = pg.font.Font(None, 50)
-        self.color = (150,150,255)
-        self.rect = self.font.render("Rank:X", 0, self.color).get_rect()
-        self.rect.center = 70, 80
+        self.overlays: dict[tuple, pg.Surface] = {}  # (効果の名前, 画面の大きさ, …)ごとの重ねる絵
+        self.colors: dict[tuple, tuple[int, int, int]] = {}  # 単色の重ねる絵を今塗っている色
 
-    def get_rank(self, tmr: int) -> str:
-        total_sec = tmr // 60
-        if total_sec < 30:
-            return "D"
-        elif total_sec < 60:
-            return "C"
-        elif total_sec < 120:
-            return "B"
-        elif total_sec < 180:
-            return "A"
-        else:
-            return "S"
+    def _tint(self, screen: pg.Surface, name: str, color: tuple[int, int, int], flags: int) -> pg.Rect:
+        """
+        単色の重ねる絵を画面全体に合成する（色が前回と違うときだけ塗り直す）
+        引数1 screen：画面Surface
+        引数2 name：効果の名前
+        引数3 color：重ねる色
+        引数4 flags：合成方法（BLEND_RGB_MULTなど）
+        戻り値：合成した矩形
+        """
+        key = (name, screen.get_size())
+        img = self.overlays.get(key)
+        if img is None:
+            img = self.overlays[key] = pg.Surface(key[1], 0, screen)
+        if self.colors.get(key) != color:
+            img.fill(color)
+            self.colors[key] = color
+        return screen.blit(img, (0, 0), special_flags=flags)
+
+    def dim(self, screen: pg.Surface, level: int, times: int = 1) -> pg.Rect:
+        """
+        画面の明るさをlevel/255倍にする（不透明度255-levelの黒を重ねるのと同じ）
+        引数1 screen：画面Surface
+        引数2 level：残す明るさ（0～255）
+        引数3 times：重ねる回数（効果が重なっているとき）
+        戻り値：合成した矩形
+        """
+        level = round(255 * (level/255)**times)
+        return self._tint(screen, "dim", (level, level, level), pg.BLEND_RGB_MULT)
 
-    def update(self, screen: pg.Surface, tmr: int):
-        if (tmr // 60) < 30:
-            rank = "D"
-        elif (tmr // 60) < 60:
-            rank = "C"
-        elif (tmr // 60) < 120:
-            rank = "B"
-        elif (tmr // 60) < 180:
-            rank = "A"
-        else:
-            rank = "S"
+    def fade(self, screen: pg.Surface, t: float) -> pg.Rect:
+        """
+        画面を黒にフェードさせる
+        引数1 screen：画面Surface
+        引数2 t：フェードの進み具合（0で元のまま，1で真っ黒）
+        戻り値：合成した矩形
+        """
+        return self.dim(screen, round(255 * (1 - min(max(t, 0), 1))))
 
-        self.image = self.font.render(f"Rank:{rank}", 0, self.color)
-        screen.blit(self.image, self.rect)
+    def flash(self, screen: pg.Surface, t: float, color: tuple[int, int, int] = (255, 255, 255)) -> pg.Rect:
+        """
+        画面を明るく光らせる
+        引数1 screen：画面Surface
+        引数2 t：光の強さ（0で元のまま，1でcolorを全て足す）
+        引数3 color：光の色
+        戻り値：合成した矩形
+        """
+        t = min(max(t, 0), 1)
+        return self._tint(screen, "flash", tuple(round(c*t) for c in color), pg.BLEND_RGB_ADD)
 
-        
-class HP:
-    """
-    体力を表示するクラス
-    """
-    def __init__(self, bird: Bird):
-        self.font = pg.font.Font(None, 50)
-        self.color = (0, 0, 255)
-        self.value = bird.hp  # こうかとんのHP
-        self.image = self.font.render(f"HP: {self.value}", 0, self.color)
-        self.rect = self.image.get_rect()
-        self.rect.center = WIDTH/2, 30
+    def gameover_overlay(self, size: tuple[int, int], res_rank: str) -> pg.Surface:
+        """
+        ゲームオーバーの文字と悲しむこうかとんの絵を返す（初めて使う画面の大きさとランクのときだけ作る）
+        不透明度200で重ねたときの明るさ（200/255倍）にしてあり，暗くした画面にBLEND_RGB_ADDで足す
+        引数1 size：画面の大きさ
+        引数2 res_rank：表示するランク
+        戻り値：画面と同じ大きさの重ねる絵
+        """
+        key = ("gameover", size, res_rank)
+        img = self.overlays.get(key)
+        if img is not None:
+            return img
+        display = pg.display.get_surface()
+        img = pg.Surface(size, 0, display) if display is not None else pg.Surface(size)
+        img.blit(get_font(80).render("Game Over", True, (255,255,255)), [400,300])
+        img.blit(get_font(60).render(f"Rank: {res_rank}", True, (255,255,255)), [470,400])
+        kk_img = BIRD_SHEET.get(8)
+        for center in ((350,325), (750,325)):
+            img.blit(kk_img, kk_img.get_rect(center=center))
+        img.fill((200, 200, 200), special_flags=pg.BLEND_RGB_MULT)
+        self.overlays[key] = img
+        return img
+
+    def gameover(self, screen: pg.Surface, res_rank: str) -> pg.Rect:
+        """
+        画面を暗くしてゲームオーバーの絵を重ねる（不透明度200の黒い画面に絵を描いて重ねたのと同じ見た目）
+        引数1 screen：画面Surface
+        引数2 res_rank：表示するランク
+        戻り値：描いた矩形
+        """
+        self.dim(screen, 255-200)
+        return screen.blit(self.gameover_overlay(screen.get_size(), res_rank), (0, 0),
+                           special_flags=pg.BLEND_RGB_ADD)
 
-    def update(self, screen: pg.Surface):
-        self.image = self.font.render(f"HP: {self.value}", 0, self.color)
-        screen.blit(self.image, self.rect)
 
+SCREEN_FX = ScreenFX()  # 画面効果の重ねる絵を共有する
 
 
-class Item(pg.sprite.Sprite):
+class Bird(pg.sprite.Sprite):
     """
-    アイテムに関連するクラス
+    ゲームキャラクター（こうかとん）に関するクラス
     """
-    def __init__(self,hp):
-        super().__init__()
-        self.num = random.randint(0,2)  # ランダムで画像を設定するための乱数
-        self.item = pg.image.load(f"fig/item{self.num}.png")  # 乱数の値によって画像を変える
-        self.image = pg.transform.rotozoom(self.item, random.randint(0,360), 0.25)  # ランダムな角度を設定
-        self.rect = self.image.get_rect()
-        self.rect.center =  WIDTH, random.randint(0, HEIGHT)  # 画面右側のランダムな高さから出現
-        self.vx, self.vy = random.randint(-10,-5),0  # ランダムな速度で左に流れる
-        self.count = 0  
-        self.hp = hp
+    delta = {  # 押下キーと移動量の辞書
+        pg.K_w: (0, -1),
+        pg.K_s: (0, +1),
+        pg.K_a: (-1, 0),
+        pg.K_d: (+1, 0),
+    }
 
-    def get_item(self):
+    def __init__(self, num: int, xy: tuple[int, int]):
+        """
+        こうかとん画像Surfaceを生成する
+        引数1 num：こうかとん画像ファイル名の番号
+        引数2 xy：こうかとん画像の位置座標タプル
+        """
+        super().__init__()
+        self.num = num
+        self.reset(xy)
+
+    def reset(self, xy: tuple[int, int]):
+        """
+        向き・位置・速さ・HPを最初の状態に戻す（次のゲームで使い回すとき）
+        引数 xy：こうかとん画像の位置座標タプル
+        """
+        self.dire = (+1, 0)
+        self.image = BIRD_SHEET.get((self.num, self.dire))
+        self.mask = BIRD_SHEET.mask((self.num, self.dire))  # 当たり判定用マスク
+        self.rect = self.image.get_rect()
+        self.rect.center = xy
+        self.prev = self.rect.topleft  # 1つ前のフレームの位置（描画の補間用）
+        self.speed = 10
+        self.hp = 10
+
+
+    def change_img(self, num: int, screen: pg.Surface | None = None):
+        """
+        こうかとん画像を切り替え，画面に転送する
+        引数1 num：こうかとん画像ファイル名の番号
+        引数2 screen：画面Surface（Noneなら画像を切り替えるだけ）
+        """
+        self.image = BIRD_SHEET.get(num)
+        self.mask = BIRD_SHEET.mask(num)
+        if screen is not None:
+            screen.blit(self.image, self.rect)
+
+    def update(self, keys: frozenset[int]):
+        """
+        押下キーに応じてこうかとんを移動させる
+        引数 keys：押下されているキーの集合
+        """
+        self.prev = self.rect.topleft
+        sum_mv = [0, 0]
+        for k, mv in __class__.delta.items():
+            if k in keys:
+                sum_mv[0] += mv[0]
+                sum_mv[1] += mv[1]
+        self.rect.move_ip(self.speed*sum_mv[0], self.speed*sum_mv[1])
+        if check_bound(self.rect) != (True, True):
+            self.rect.move_ip(-self.speed*sum_mv[0], -self.speed*sum_mv[1])
+        if not (sum_mv[0] == 0 and sum_mv[1] == 0):
+            self.dire = tuple(sum_mv)
+            self.image = BIRD_SHEET.get((self.num, self.dire))
+            self.mask = BIRD_SHEET.mask((self.num, self.dire))
+
+
+_NO_INDEX = np.zeros(0, dtype=np.intp)  # 該当なしを表す空の添字配列
+_RECT_MASKS: dict[tuple[int, int], pg.mask.Mask] = {}  # 大きさごとの全て埋まったマスク
+
+
+def rect_mask(size: tuple[int, int]) -> pg.mask.Mask:
+    """
+    矩形全体が当たり判定になるマスクを返す（大きさごとに1つだけ作る）
+    引数 size：矩形の大きさ
+    """
+    mask = _RECT_MASKS.get(size)
+    if mask is None:
+        mask = _RECT_MASKS[size] = pg.mask.Mask(size, fill=True)
+    return mask
+
+
+class ArrayPool:
+    """
+    要素ごとの値を種類ごとのNumPy配列にまとめて持つクラス（Structure of Arrays）の親クラス
+    取り除いた要素の添字は空きとして取っておき，次に追加するときに使い回す
+    """
+    columns: tuple[str, ...] = ()  # 子クラスが持つ要素ごとの配列の属性名（足りなくなったら倍にする）
+
+    def __init__(self, capacity: int):
+        """
+        引数 capacity：最初に確保する要素の数
+        """
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.serial = np.zeros(capacity, dtype=np.int64)  # 追加した通し番号（添字を使い回しても区別できる）
+        self.serials = 0  # 今までに追加した数
+        self.images: list[pg.Surface | None] = [None] * capacity
+        self.free: list[int] = []  # 空いている添字
+        self.high = 0  # 使ったことのある添字の数（配列演算はここまで）
+        self.count = 0  # 生きている要素の数
+        self.high_water = 0  # 生きている要素の数の最大値
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _grow(self) -> None:
+        """
+        配列の大きさを倍にする
+        """
+        n = len(self.alive)
+        for name in self.columns + ("alive", "serial"):
+            arr = getattr(self, name)
+            setattr(self, name, np.concatenate([arr, np.zeros_like(arr)]))
+        self.images.extend([None] * n)
+
+    def _alloc(self, image: pg.Surface) -> int:
+        """
+        空いている添字（無ければ新しい添字）を生きている状態にして返す
+        引数 image：要素の画像
+        """
+        if self.free:
+            i = self.free.pop()
+        else:
+            if self.high == len(self.alive):
+                self._grow()
+            i = self.high
+            self.high += 1
+        self.alive[i] = True
+        self.serials += 1
+        self.serial[i] = self.serials
+        self.images[i] = image
+        self.count += 1
+        self.high_water = max(self.high_water, self.count)
+        return i
+
+    def _alloc_many(self, n: int) -> np.ndarray:
+        """
+        空いている添字（足りなければ新しい添字）をn個まとめて生きている状態にして返す（画像は持たない）
+        引数 n：要素の数
+        """
+        take = min(n, len(self.free))
+        reused = self.free[len(self.free)-take:]
+        del self.free[len(self.free)-take:]
+        while self.high + n - take > len(self.alive):
+            self._grow()
+        idx = np.array(reused + list(range(self.high, self.high + n - take)), dtype=np.intp)
+        self.high += n - take
+        self.alive[idx] = True
+        self.serial[idx] = np.arange(self.serials + 1, self.serials + n + 1)
+        self.serials += n
+        self.count += n
+        self.high_water = max(self.high_water, self.count)
+        return idx
+
+    def kill(self, idx: np.ndarray) -> None:
+        """
+        要素を取り除く
+        引数 idx：取り除く要素の添字の配列
+        """
+        if not len(idx):
+            return
+        idx = idx[self.alive[idx]]
+        self.alive[idx] = False
+        self.free.extend(idx.tolist())
+        self.count -= len(idx)
+
+    def clear(self) -> None:
+        """
+        全ての要素を取り除く
+        """
+        self.alive[:] = False
+        self.free.clear()
+        self.high = self.count = 0
+
+    def stats(self) -> dict[str, int]:
+        """
+        生きている要素・空いている添字の数と最大値を返す
+        """
+        return {"live": self.count, "free": len(self.free) + len(self.alive) - self.high,
+                "high_water": self.high_water, "size": len(self.alive)}
+
+    def indices(self) -> np.ndarray:
+        """
+        生きている要素の添字を小さい順に返す
+        """
+        return np.flatnonzero(self.alive[:self.high])
+
+
+class ProjectilePool(ArrayPool):
+    """
+    爆弾の位置・速度・速さ・半径・色をNumPy配列にまとめて持つクラス
+    移動・画面外の削除・当たり判定をそれぞれ配列演算1回で行い，描画はSurface.blitsで1回にまとめる
+    位置は小数のまま持つので，斜めに飛ぶ小さい爆弾も速度の端数を失わない
+    """
+    columns = ("x", "y", "px", "py", "vx", "vy", "speed", "rad", "color", "interval")
+
+    def __init__(self, capacity: int = 256):
+        """
+        引数 capacity：最初に確保する爆弾の数（足りなくなったら倍にする）
+        """
+        self.x = np.zeros(capacity)  # 中心のx座標
+        self.y = np.zeros(capacity)  # 中心のy座標
+        self.px = np.zeros(capacity)  # 1つ前のフレームの中心座標（描画の補間用）
+        self.py = np.zeros(capacity)
+        self.vx = np.zeros(capacity)  # 速度ベクトル
+        self.vy = np.zeros(capacity)
+        self.speed = np.zeros(capacity)  # 速さ（速度ベクトルに掛ける）
+        self.rad = np.zeros(capacity, dtype=np.int32)  # 半径
+        self.color = np.zeros(capacity, dtype=np.int32)  # 色番号
+        self.interval = np.zeros(capacity, dtype=np.int32)  # 小さい爆弾を落とす間隔（0なら落とさない）
+        super().__init__(capacity)
+
+    def add(self, x: float, y: float, vx: float, vy: float, speed: float,
+            rad: int, color: int, rgb: tuple[int, int, int], interval: int = 0) -> int:
+        """
+        爆弾を1つ追加する
+        引数1,2 x, y：中心座標
+        引数3,4 vx, vy：速度ベクトル
+        引数5 speed：速さ
+        引数6 rad：半径
+        引数7 color：色番号
+        引数8 rgb：爆弾円画像の色
+        引数9 interval：小さい爆弾を落とす間隔
+        戻り値：追加した爆弾の添字
+        """
+        i = self._alloc(BOMB_ATLAS.get(rgb, rad))
+        self.x[i], self.y[i], self.vx[i], self.vy[i], self.speed[i] = x, y, vx, vy, speed
+        self.px[i], self.py[i] = x, y
+        self.rad[i], self.color[i], self.interval[i] = rad, color, interval
+        return i
+
+    def centers(self, idx: np.ndarray) -> list[tuple[int, int]]:
+        """
+        爆弾の中心座標を整数のタプルで返す
+        引数 idx：爆弾の添字の配列
+        """
+        if not len(idx):
+            return []
+        return list(zip(self.x[idx].astype(int).tolist(), self.y[idx].astype(int).tolist()))
+
+    def update(self) -> None:
+        """
+        全ての爆弾を速度ベクトルに基づき移動させ，画面からはみ出たものを取り除く
+        """
+        if not self.count:
+            return
+        n = self.high
+        alive = self.alive[:n]
+        x, y, rad = self.x[:n], self.y[:n], self.rad[:n]
+        self.px[:n] = x
+        self.py[:n] = y
+        x += self.speed[:n] * self.vx[:n] * alive
+        y += self.speed[:n] * self.vy[:n] * alive
+        out = (x-rad < 0) | (WIDTH < x+rad) | (y-rad < 0) | (HEIGHT < y+rad)  # check_boundと同じ判定
+        self.kill(np.flatnonzero(alive & out))
+
+    def hit_rect(self, rect: pg.Rect) -> np.ndarray:
+        """
+        矩形と重なっている（円と矩形の判定）爆弾の添字を返す
+        引数 rect：判定する矩形
+        """
+        if not self.count:
+            return _NO_INDEX
+        n = self.high
+        x, y, rad = self.x[:n], self.y[:n], self.rad[:n]
+        dx = x - np.minimum(np.maximum(x, rect.left), rect.right)  # 矩形上で円の中心に一番近い点までの距離
+        dy = y - np.minimum(np.maximum(y, rect.top), rect.bottom)
+        return np.flatnonzero(self.alive[:n] & (dx*dx + dy*dy < rad*rad))
+
+    def hit_mask(self, rect: pg.Rect, mask: pg.mask.Mask) -> np.ndarray:
+        """
+        マスクの不透明な部分と重なっている爆弾の添字を返す
+        円と矩形の判定で絞り込んでから，残った爆弾だけ爆弾円のマスクと重ねて調べる
+        引数1 rect：マスクを置く矩形（スプライトのrect）
+        引数2 mask：スプライトの当たり判定用マスク
+        """
+        idx = self.hit_rect(rect)
+        if not len(idx):
+            return idx
+        left = np.floor(self.x[idx] - self.rad[idx]).astype(int).tolist()  # 描画と同じ位置
+        top = np.floor(self.y[idx] - self.rad[idx]).astype(int).tolist()
+        keep = [k for k, (l, t, r) in enumerate(zip(left, top, self.rad[idx].tolist()))
+                if mask.overlap(BOMB_ATLAS.mask(r), (l - rect.left, t - rect.top))]
+        return idx[keep]
+
+    def hit_rects(self, rects: list[pg.Rect]) -> np.ndarray:
+        """
+        いずれかの矩形と重なっている爆弾の添字を返す
+        引数 rects：判定する矩形のリスト
+        """
+        if not self.count or not rects:
+            return _NO_INDEX
+        if len(rects) == 1:
+            return self.hit_rect(rects[0])
+        return np.unique(np.concatenate([self.hit_rect(rect) for rect in rects]))
+
+    def draw(self, screen: pg.Surface, doreturn: bool = True, alpha: float = 1.0) -> list[pg.Rect] | None:
+        """
+        全ての爆弾をSurface.blitsでまとめて画面に転送する
+        引数1 screen：画面Surface
+        引数2 doreturn：描いた矩形のリストを返すかどうか
+        引数3 alpha：1つ前のフレームの位置（0）から今の位置（1）までのどこに描くか
+        """
+        idx = self.indices()
+        x, y = self.x[idx], self.y[idx]
+        if alpha < 1:
+            px, py = self.px[idx], self.py[idx]
+            x = px + (x - px) * alpha
+            y = py + (y - py) * alpha
+        left = np.floor(x - self.rad[idx]).astype(int).tolist()
+        top = np.floor(y - self.rad[idx]).astype(int).tolist()
+        images = self.images
+        return screen.blits([(images[i], (l, t)) for i, l, t in zip(idx.tolist(), left, top)], doreturn)
+
+
+class Bomb:
+    """
+    爆弾に関するクラス
+    爆弾1つ1つはProjectilePoolの要素として持ち，このクラスは出現のさせ方を決める
+    """
+    colors = {1: (1, 0, 0), 2: (0, 1, 0), 3: (0, 0, 1)}  # 色番号とRGBの対応
+    min_rad, max_rad = 15, 25  # 爆弾円の半径の範囲
+
+    @staticmethod
+    def spawn(pool: ProjectilePool, rng: random.Random = random) -> int:
+        """
+        右端から左に流れる爆弾を出現させる
+        引数1 pool：爆弾を入れるProjectilePool
+        引数2 rng：乱数生成器
+        戻り値：追加した爆弾の添字
+        """
+        rad = rng.randint(Bomb.min_rad, Bomb.max_rad)  # 爆弾円の半径：15以上25以下の乱数
+        color = rng.randint(1,3)  # ランダムで色を決定する
+        y = rng.randint(0,HEIGHT)
+        speed = rng.randint(2,3)
+        interval = rng.randint(50,300)
+        return pool.add(WIDTH - 25, y, -3, 0, speed, rad, color, Bomb.colors[color], interval)
+
+
+class Minbomb:
+    """
+    こうかとんを狙う小さい爆弾に関するクラス
+    爆弾1つ1つはProjectilePoolの要素として持ち，このクラスは出現のさせ方を決める
+    """
+    color_rgb = (1, 0, 1)  # 紫色
+    rad = 5  # 爆弾円の半径：5
+
+    @staticmethod
+    def spawn(pool: ProjectilePool, center: tuple[float, float], half_height: int,
+              bird: "Bird", rng: random.Random = random) -> int:
+        """
+        爆弾または敵機からこうかとんに向かう小さい爆弾を出現させる
+        引数1 pool：小さい爆弾を入れるProjectilePool
+        引数2 center：爆弾を投下する爆弾・敵機の中心座標
+        引数3 half_height：爆弾を投下する爆弾・敵機の高さの半分（その下端から落とす）
+        引数4 bird：攻撃対象のこうかとん
+        引数5 rng：乱数生成器
+        戻り値：追加した小さい爆弾の添字
+        """
+        #爆弾を投下するemyから見た攻撃対象のbirdの方向を計算
+        vx, vy = calc_orientation(center, bird.rect.center)
+        vx -= 0.9
+        if vx == 0:
+            vx = 0.1
+        if vy == 0:
+            vy = 0.1
+        speed = rng.randint(2,3)
+        return pool.add(center[0], center[1]+half_height, vx, vy, speed,
+                        Minbomb.rad, 0, Minbomb.color_rgb)
+
+
+class SpritePool:
+    """
+    kill()されたスプライトを捨てずに取っておき，次に作るときにreset()して使い回すクラス
+    スプライトの生成と破棄をくり返さないので，長時間遊んでもGCによる引っかかりが出にくい
+    """
+    def __init__(self, cls: type, size: int):
+        """
+        引数1 cls：使い回すスプライトのクラス（Pooledを継承し，reset()を持つこと）
+        引数2 size：取っておくスプライトの最大数
+        """
+        self.cls = cls
+        self.size = size
+        self.free: list[pg.sprite.Sprite] = []  # 使い回せるスプライト
+        self.live = 0  # 使用中のスプライトの数
+        self.high_water = 0  # 使用中のスプライトの数の最大値
+        self.created = 0  # 新しく作った数
+        self.reused = 0  # 使い回した数
+
+    def acquire(self, *args) -> pg.sprite.Sprite:
+        """
+        取っておいたスプライトをreset(*args)して返す（無ければ新しく作る）
+        """
+        if self.free:
+            sprite = self.free.pop()
+            sprite.reset(*args)
+            self.reused += 1
+        else:
+            sprite = self.cls(*args)
+            sprite.pool = self
+            self.created += 1
+        self.live += 1
+        self.high_water = max(self.high_water, self.live)
+        return sprite
+
+    def release(self, sprite: pg.sprite.Sprite) -> None:
+        """
+        全てのグループから外れたスプライトを取っておく（Pooledから呼ばれる）
+        """
+        self.live -= 1
+        if len(self.free) < self.size:
+            self.free.append(sprite)
+
+    def stats(self) -> dict[str, int]:
+        """
+        使用中・取り置き中の数と最大値を返す
+        """
+        return {"live": self.live, "free": len(self.free), "high_water": self.high_water,
+                "size": self.size, "created": self.created, "reused": self.reused}
+
+
+class Pooled:
+    """
+    全てのグループから外れたときに自分をSpritePoolに戻すスプライト用の親クラス
+    pygameのSpriteは__dict__を持つので，__slots__ではなくインスタンスの使い回しでメモリを抑える
+    """
+    pool: SpritePool | None = None
+
+    def kill(self):
+        alive = self.alive()
+        super().kill()
+        if alive and self.pool is not None:
+            self.pool.release(self)
+
+    def remove_internal(self, group):  # Group.remove()やGroup.empty()で外されたとき
+        super().remove_internal(group)
+        if self.pool is not None and not self.alive():
+            self.pool.release(self)
+
+
+class Culled:
+    """
+    画面の外に出たら自分を消す（プールに戻す）動くスプライト用の親クラス
+    """
+    def cull(self) -> None:
+        """
+        画面の左・上・下に完全に出ていたらkill()する（update()の最後に呼ぶ）
+        """
+        if is_offscreen(self.rect):
+            self.kill()
+
+
+POOL_SIZES = {  # 使い回すために取っておくスプライトの最大数
+    "Shot": 16,
+    "Item": 16,
+}
+
+
+class EffectPool(ArrayPool):
+    """
+    爆発エフェクト（爆発，光，破片）の位置・速度・経過時間・表示時間・種類をNumPy配列にまとめて持つクラス
+    1つの爆発は爆発の絵1つ，光1つ，飛び散る破片DEBRIS個の要素になる．
+    移動・時間切れの削除を配列演算1回で行い，描画はコマ番号でEFFECT_ATLASを引いてSurface.blits1回で行う
+    位置と速度は(x, y)の組をfloat32で持ち，1つ前のフレームの位置は速度から求める（要素あたりのメモリを減らす）．
+    経過時間はプールの時計と出現したフレームの差で表し，一番早く消える要素の時刻までは時間切れを調べない
+    破片の飛び方にはゲームの乱数（World.rng）を使わないので，エフェクトが変わってもゲームの展開は変わらない
+    """
+    columns = ("pos", "vel", "born", "life", "kind")
+    DEBRIS = 6  # 1つの爆発で飛び散る破片の数
+    PER_BURST = 2 + DEBRIS  # 1つの爆発が使う要素の数
+    GLOW_LIFE = 20  # 光が消えるまでのフレーム数
+    DRAG = 0.92  # 破片の1フレームごとの減速の倍率
+
+    def __init__(self, capacity: int = 64, seed: int = 0):
+        """
+        引数1 capacity：最初に確保する要素の数（足りなくなったら倍にする）
+        引数2 seed：破片の飛び方の乱数のシード
+        """
+        self.pos = np.zeros((capacity, 2), dtype=np.float32)  # 中心座標
+        self.vel = np.zeros((capacity, 2), dtype=np.float32)  # 次のフレームに動く量（爆発と光は0）
+        self.born = np.zeros(capacity, dtype=np.int32)  # 出現したときのclock
+        self.life = np.zeros(capacity, dtype=np.int32)  # 表示するフレーム数
+        self.kind = np.zeros(capacity, dtype=np.int8)  # 種類（FX_BLASTなど）
+        self.clock = 0  # update()を呼んだ回数（経過フレーム数はclock-born）
+        self.next_death = math.inf  # clockがこれを超えたら時間切れの要素がある
+        super().__init__(capacity)
+        self.reseed(seed)
+
+    def clear(self) -> None:
+        super().clear()
+        self.clock = 0
+        self.next_death = math.inf
+
+    def ages(self, idx: np.ndarray) -> np.ndarray:
+        """
+        要素の経過フレーム数を返す
+        引数 idx：要素の添字の配列
+        """
+        return self.clock - self.born[idx]
+
+    def reseed(self, seed: int) -> None:
+        """
+        破片の飛び方の乱数を作り直す（同じシードなら同じ飛び方になる）
+        """
+        self.rng = np.random.default_rng(seed)
+
+    def burst(self, centers: list[tuple[int, int]], life: int, debris: bool = True) -> None:
+        """
+        爆発をまとめて出現させる
+        引数1 centers：爆発の中心座標のリスト
+        引数2 life：爆発の絵を表示するフレーム数
+        引数3 debris：光と破片も出すかどうか（Falseなら爆発の絵だけ）
+        """
+        if not centers:
+            return
+        kinds = [FX_BLAST] + ([FX_GLOW] + [FX_DEBRIS]*__class__.DEBRIS if debris else [])
+        per = len(kinds)
+        idx = self._alloc_many(len(centers) * per)
+        kind = np.tile(kinds, len(centers))
+        self.pos[idx] = np.repeat(np.asarray(centers, dtype=np.float32), per, axis=0)
+        self.vel[idx] = 0
+        self.born[idx] = self.clock
+        self.kind[idx] = kind
+        self.life[idx] = np.where(kind == FX_BLAST, min(life, EffectAtlas.MAX_LIFE), __class__.GLOW_LIFE)
+        flying = idx[kind == FX_DEBRIS]
+        if len(flying):
+            angle = self.rng.uniform(0, 2*math.pi, len(flying))
+            speed = self.rng.uniform(3, 9, len(flying))
+            self.vel[flying, 0] = np.cos(angle) * speed
+            self.vel[flying, 1] = np.sin(angle) * speed
+            self.life[flying] = self.rng.integers(20, 40, len(flying))
+        self.next_death = min(self.next_death, self.clock + int(self.life[idx].min()))
+
+    def update(self) -> None:
+        """
+        全てのエフェクトの時間を進めて破片を動かし，表示時間を過ぎたものを取り除く
+        """
+        if not self.count:
+            return
+        n = self.high
+        self.pos[:n] += self.vel[:n]
+        self.vel[:n] *= __class__.DRAG
+        self.clock += 1
+        if self.clock > self.next_death:
+            end = self.born[:n] + self.life[:n]  # 最後に表示するclock
+            self.kill(np.flatnonzero(self.alive[:n] & (end < self.clock)))
+            self.next_death = int(end[self.alive[:n]].min()) if self.count else math.inf
+
+    def sprites(self) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """
+        描く順（爆発の絵の上に光と破片を加算する）に，
+        (コマ番号，左上のx座標，y座標，1つ前のフレームの左上のx座標，y座標)の配列を返す
+        """
+        atlas = EFFECT_ATLAS
+        atlas.build()
+        idx = self.indices()
+        idx = idx[np.argsort(self.kind[idx], kind="stable")]
+        age = self.ages(idx)
+        frame = atlas.lut[self.kind[idx], self.life[idx], age]
+        pos = self.pos[idx]
+        pos[:, 0] -= atlas.half_w[frame]
+        pos[:, 1] -= atlas.half_h[frame]
+        # 最後のupdate()で動いた量はvel/DRAG（出現したばかりの要素はまだ動いていない）
+        prev = pos - self.vel[idx] * ((age > 0) / __class__.DRAG)[:, None]
+        return frame, pos[:, 0], pos[:, 1], prev[:, 0], prev[:, 1]
+
+    def draw(self, screen: pg.Surface, doreturn: bool = True, alpha: float = 1.0) -> list[pg.Rect] | None:
+        """
+        全てのエフェクトを，コマごとの合成方法を付けてSurface.blitsでまとめて画面に転送する
+        引数1 screen：画面Surface
+        引数2 doreturn：描いた矩形のリストを返すかどうか
+        引数3 alpha：1つ前のフレームの位置（0）から今の位置（1）までのどこに描くか
+        """
+        if not self.count:
+            return [] if doreturn else None
+        frame, x, y, px, py = self.sprites()
+        if alpha < 1:
+            x = px + (x - px) * alpha
+            y = py + (y - py) * alpha
+        left = np.floor(x).astype(int).tolist()
+        top = np.floor(y).astype(int).tolist()
+        frames, flags = EFFECT_ATLAS.frames, EFFECT_ATLAS.flags
+        return screen.blits([(frames[f], (l, t), None, flags[f]) for f, l, t in zip(frame.tolist(), left, top)],
+                            doreturn)
+
+
+class Shot(Pooled, pg.sprite.Sprite):
+    """
+    照準の位置に撃った弾の当たり判定に関するクラス
+    見た目は爆発と同じで，EffectPoolの爆発の絵として描く（このスプライトは描かない）
+    """
+    def __init__(self, xy: tuple[int, int], life: int):
+        """
+        引数1 xy：撃った位置
+        引数2 life：当たり判定が残るフレーム数
+        """
+        super().__init__()
+        self.rect = ASSETS.load("fig/explosion.gif").get_rect()
+        self.reset(xy, life)
+
+    def reset(self, xy: tuple[int, int], life: int):
+        """
+        弾を最初の状態に戻す（SpritePoolで使い回すとき）
+        引数1 xy：撃った位置
+        引数2 life：当たり判定が残るフレーム数
+        """
+        self.rect.center = xy
+        self.life = life
+
+    def update(self):
+        self.life -= 1
+        if self.life < 0:
+            self.kill()
+
+
+class EnemyPool(ArrayPool):
+    """
+    敵機の位置・大きさ・速さ・爆弾投下の間隔と次に投下するフレームをNumPy配列にまとめて持つクラス
+    移動と画面外に出た敵機の削除を配列演算1回で行い，描画はSurface.blitsで1回にまとめる
+    減速のような全ての敵機にかかる効果は，update()に渡す倍率1つで表す（敵機ごとの速さは書き換えない）
+    """
+    columns = ("x", "y", "px", "w", "h", "kind", "speed", "interval", "next_fire")
+
+    def __init__(self, capacity: int = 64):
+        """
+        引数 capacity：最初に確保する敵機の数（足りなくなったら倍にする）
+        """
+        self.x = np.zeros(capacity)  # 左上のx座標
+        self.y = np.zeros(capacity)  # 左上のy座標
+        self.px = np.zeros(capacity)  # 1つ前のフレームの左上のx座標（描画の補間用．敵機は縦に動かない）
+        self.w = np.zeros(capacity, dtype=np.int32)  # 画像の幅と高さ
+        self.h = np.zeros(capacity, dtype=np.int32)
+        self.kind = np.zeros(capacity, dtype=np.int32)  # 画像の番号（ENEMY_SHEETのキー）
+        self.speed = np.zeros(capacity)  # 1フレームに左へ進む量（減速の倍率を掛ける前）
+        self.interval = np.zeros(capacity, dtype=np.int64)  # 小さい爆弾を落とす間隔
+        self.next_fire = np.zeros(capacity, dtype=np.int64)  # 次に小さい爆弾を落とすフレーム
+        super().__init__(capacity)
+        self.next_due = 0  # 次にどれかの敵機が爆弾を落とすかもしれない最初のフレーム
+
+    def clear(self) -> None:
+        super().clear()
+        self.next_due = 0
+
+    def add(self, x: int, y: int, kind: int, speed: int, interval: int, tmr: int) -> int:
+        """
+        敵機を1つ追加する
+        引数1,2 x, y：左上の座標
+        引数3 kind：画像の番号（ENEMY_SHEETのキー）
+        引数4 speed：1フレームに左へ進む量
+        引数5 interval：小さい爆弾を落とす間隔
+        引数6 tmr：今のフレーム（intervalで割り切れるフレームに爆弾を落とす）
+        戻り値：追加した敵機の添字
+        """
+        image = ENEMY_SHEET.get(kind) #0.8倍に縮小済みの画像
+        i = self._alloc(image)
+        self.kind[i] = kind
+        self.x[i] = self.px[i] = x
+        self.y[i] = y
+        self.w[i], self.h[i] = image.get_size()
+        self.speed[i], self.interval[i] = speed, interval
+        self.next_fire[i] = tmr + (-tmr % interval)
+        self.next_due = min(self.next_due, int(self.next_fire[i]))
+        return i
+
+    def centers(self, idx: np.ndarray) -> list[tuple[int, int]]:
+        """
+        敵機の中心座標（pg.Rect.centerと同じ丸め方）を整数のタプルで返す
+        引数 idx：敵機の添字の配列
+        """
+        if not len(idx):
+            return []
+        left, top = np.floor(self.x[idx]).astype(int), np.floor(self.y[idx]).astype(int)
+        return list(zip((left + self.w[idx]//2).tolist(), (top + self.h[idx]//2).tolist()))
+
+    def due(self, tmr: int) -> np.ndarray:
+        """
+        tmrフレーム目に小さい爆弾を落とす敵機の添字を出現順に返し，次に落とすフレームを進める
+        引数 tmr：今のフレーム
+        """
+        if tmr < self.next_due or not self.count:
+            return _NO_INDEX
+        n = self.high
+        alive = self.alive[:n]
+        idx = np.flatnonzero(alive & (self.next_fire[:n] == tmr))
+        if len(idx) > 1:
+            idx = idx[np.argsort(self.serial[idx])]
+        self.next_fire[idx] += self.interval[idx]
+        self.next_due = int(self.next_fire[:n][alive].min())
+        return idx
+
+    def update(self, scale: float = 1.0) -> None:
+        """
+        全ての敵機を左に進め，画面の左に完全に出たものを取り除く
+        （敵機は縦に動かず画面内の高さに出現するので，is_offscreenの上下の判定は要らない）
+        引数 scale：速さに掛ける倍率（減速中は1より小さい）
+        """
+        if not self.count:
+            return
+        n = self.high
+        x = self.x[:n]
+        self.px[:n] = x
+        x -= self.speed[:n] if scale == 1 else self.speed[:n] * scale  # 取り除いた添字も動くが使われない
+        out = np.flatnonzero((x + self.w[:n] < 0) & self.alive[:n])  # floor(x)+w < 0 と同じ
+        if len(out):
+            self.kill(out)
+
+    def hit_rects(self, rects: list[pg.Rect], masked: bool = True) -> np.ndarray:
+        """
+        いずれかの矩形と重なっている敵機の添字を返す
+        矩形どうしの判定（pg.Rect.colliderectと同じ）で絞り込み，maskedなら残った敵機だけ
+        画像の不透明な部分（ENEMY_SHEETのマスク）が矩形と重なっているかを調べる
+        引数1 rects：判定する矩形のリスト
+        引数2 masked：マスクで細かく判定するかどうか
+        """
+        if not self.count or not rects:
+            return _NO_INDEX
+        n = self.high
+        left, top = np.floor(self.x[:n]), np.floor(self.y[:n])
+        right, bottom = left + self.w[:n], top + self.h[:n]
+        hit = np.zeros(n, dtype=bool)
+        for r in rects:
+            hit |= (left < r.right) & (r.left < right) & (top < r.bottom) & (r.top < bottom)
+        idx = np.flatnonzero(self.alive[:n] & hit)
+        if not masked or not len(idx):
+            return idx
+        keep = []
+        for k, (i, l, t) in enumerate(zip(idx.tolist(), left[idx].astype(int).tolist(), top[idx].astype(int).tolist())):
+            mask = ENEMY_SHEET.mask(int(self.kind[i]))
+            if any(mask.overlap(rect_mask(r.size), (r.left - l, r.top - t)) for r in rects):
+                keep.append(k)
+        return idx[keep]
+
+    def draw(self, screen: pg.Surface, doreturn: bool = True, alpha: float = 1.0) -> list[pg.Rect] | None:
+        """
+        全ての敵機をSurface.blitsでまとめて画面に転送する
+        引数1 screen：画面Surface
+        引数2 doreturn：描いた矩形のリストを返すかどうか
+        引数3 alpha：1つ前のフレームの位置（0）から今の位置（1）までのどこに描くか
+        """
+        idx = self.indices()
+        x = self.x[idx]
+        if alpha < 1:
+            px = self.px[idx]
+            x = px + (x - px) * alpha
+        left = np.floor(x).astype(int).tolist()
+        top = np.floor(self.y[idx]).astype(int).tolist()
+        images = self.images
+        return screen.blits([(images[i], (l, t)) for i, l, t in zip(idx.tolist(), left, top)], doreturn)
+
+
+class Enemy:
+    """
+    敵に関するクラス
+    敵機1つ1つはEnemyPoolの要素として持ち，このクラスは出現のさせ方を決める
+    """
+    imgs = [1, 2, 3] #画像の番号（ENEMY_SHEETから取り出す）
+
+    @staticmethod
+    def spawn(pool: EnemyPool, tmr: int, rng: random.Random = random) -> int:
+        """
+        画面の右端のランダムな位置から横スクロールする敵機を出現させる
+        引数1 pool：敵機を入れるEnemyPool
+        引数2 tmr：今のフレーム
+        引数3 rng：乱数生成器
+        戻り値：追加した敵機の添字
+        """
+        original_image = rng.choice(Enemy.imgs) #ランダムな画像の読みこみ
+        x = WIDTH + rng.randint(0,50) #x座標の位置をランダムにして調整
+        y = HEIGHT - rng.randint(100, 500) #y座標の位置をランダムにして調整
+        speed = rng.randint(1,6) #スピードを5段階に
+        interval = rng.randint(50,300)
+        return pool.add(x, y, original_image, speed, interval, tmr)
+
+
+class Score(HudText):
+    """
+    打ち落とした爆弾，敵機の数をスコアとして表示するクラス
+    爆弾：1点
+    敵機：10点
+    """
+    def __init__(self):
+        self.value = 0
+        super().__init__(50, (0, 0, 255), "Score: ", f"{self.value}")
+        self.rect.center = 100, HEIGHT-50
+
+    def update(self, screen: pg.Surface):
+        self.set_text(f"{self.value}")
+        return self.draw(screen)
+
+
+class Aim(pg.sprite.Sprite):
+    """
+    照準機能に関するクラス
+    """
+    def __init__(self,mouse_pos:tuple[int,int],b_num:int) -> None:
+        """
+        カーソルの位置を取得する 
+        引数１ mouse_pos: カーソルの位置
+        引数２ b_num: 残弾数
+        """
+        self.target_img=ASSETS.get("fig/target.png",("scale",(60,60)))
+        self.x=mouse_pos[0]
+        self.y=mouse_pos[1]
+        self.b=b_num
+        self.text = HudText(50, (0, 0, 255), "bullets: ", f"{self.b}")
+        self.text.rect.center = 100, HEIGHT-100
+        self.rect = self.text.rect
+
+    def set(self,mouse_pos:tuple[int,int],b_num:int) -> None:
+        """
+        カーソルの位置と残弾数を更新する（毎フレーム作り直さずに使い回す）
+        引数１ mouse_pos: カーソルの位置
+        引数２ b_num: 残弾数
+        """
+        self.x, self.y = mouse_pos
+        self.b = b_num
+
+    def update(self,screen:pg.Surface) -> list[pg.Rect]:
+        """
+        カーソルの位置に赤い円を描画する＋残弾数を表示する
+        引数１ screen: 画面surface
+        戻り値：描画した矩形のリスト
+        """
+        rects = [screen.blit(self.target_img,[self.x-28,self.y-26])]
+        self.text.set_text(f"{self.b}")
+        return rects + self.text.draw(screen)
+    
+
+class Gravity(pg.sprite.Sprite):
+    """
+    重力場に関するクラス
+    画像は持たず，発動中はRendererがScreenFX.dim()で画面全体を暗くする
+    """
+    dim = 255-150  # 不透明度150の黒を重ねたのと同じ明るさ
+
+    def __init__(self, life:int):
+        super().__init__()
+        self.rect = pg.Rect(0, 0, WIDTH, HEIGHT)
+        self.life = life
+    
+    def update(self):
+        """
+        重力場の発動時間を1ずつ減算していき、0未満になったら消す
+        """
+        self.life -= 1
+        if self.life < 0:
+            self.kill()
+
+
+class Time(HudText):
+    """
+    タイムをカウントするクラス
+    """
+    def __init__(self):
+        super().__init__(50, (150, 150, 255), "Time:", " 00:00")
+        self.rect.center = 105, 40
+        self.total = -1  # 表示中の経過秒数
+    
+    def update(self, screen: pg.Surface, tmr: int):
+        total = tmr // 60
+        if total != self.total:  # 秒が変わったときだけ文字列を作る
+            self.total = total
+            min = total // 60
+            sec = total % 60
+            self.set_text(f"{min:02}:{sec:02}")
+        return self.draw(screen)
+
+
+class Rank(HudText):
+    """
+    ランクの表示をするクラス
+    """
+    thresholds = (  # (この秒数未満なら, ランク)の表．どれにも当てはまらなければS
+        (30, "D"),
+        (60, "C"),
+        (120, "B"),
+        (180, "A"),
+    )
+
+    def __init__(self):
+        super().__init__(50, (150,150,255), "Rank:", "X")
+        self.rect.center = 70, 80
+
+    @staticmethod
+    def get_rank(tmr: int) -> str:
+        total_sec = tmr // 60
+        for limit, rank in __class__.thresholds:
+            if total_sec < limit:
+                return rank
+        return "S"
+
+    def update(self, screen: pg.Surface, tmr: int):
+        self.set_text(self.get_rank(tmr))
+        return self.draw(screen)
+
+        
+class HP(HudText):
+    """
+    体力を表示するクラス
+    """
+    def __init__(self, hp: int):
+        self.value = hp  # こうかとんのHP
+        super().__init__(50, (0, 0, 255), "HP: ", f"{self.value}")
+        self.rect.center = WIDTH/2, 30
+
+    def update(self, screen: pg.Surface):
+        self.set_text(f"{self.value}")
+        return self.draw(screen)
+
+
+
+class Item(Culled, Pooled, pg.sprite.Sprite):
+    """
+    アイテムに関連するクラス
+    """
+    def __init__(self,hp,rng: random.Random = random):
+        super().__init__()
+        self.reset(hp, rng)
+
+    def reset(self,hp,rng: random.Random = random):
+        """
+        アイテムを新しく出現した状態にする（SpritePoolで使い回すとき）
+        """
+        self.num = rng.randint(0,2)  # ランダムで画像を設定するための乱数
+        angle = rng.randint(0,360)  # ランダムな角度を設定（10度ごとに回転済みの画像から近いものを選ぶ）
+        self.image = ITEM_SHEET.get((self.num, round(angle*ITEM_ANGLES/360) % ITEM_ANGLES))
+        self.rect = self.image.get_rect()
+        self.rect.center =  WIDTH, rng.randint(0, HEIGHT)  # 画面右側のランダムな高さから出現
+        self.prev = self.rect.topleft  # 1つ前のフレームの位置（描画の補間用）
+        self.vx, self.vy = rng.randint(-10,-5),0  # ランダムな速度で左に流れる
+        self.count = 0  
+        self.hp = hp
+
+    def get_item(self):
         """
         アイテムを獲得したときのメソッド
         アイテムを削除する
         """
-        self.kill()
-        return
+        self.kill()
+        return
+
+        # for i in range(3):  # アイテムの個数分繰り返し
+        #     if self.num != i:  # iが画像番号でないときは処理を行わない
+        #         continue
+        #     else: 
+        #         self.kill()  # 削除
+        #         if i == 0:  # 画像番号ごとに効果を付ける
+        #             self.count += 1
+        #             self.hp.value += 3
+        #             # 回復
+        #         elif i == 1:
+        #             self.count += 5
+        #             # 重力場
+        #         elif i == 2:
+        #             self.count += 10
+        #             # 無敵
+
+        # return self.count
+
+    def update(self):
+        self.prev = self.rect.topleft
+        self.rect.move_ip(self.vx, self.vy)
+        self.cull()  # 画面の左に流れ出たら消す
+
+class Click(pg.sprite.Sprite):
+    
+    def __init__(self,aim):
+        super().__init__
+        self.life = 5
+        
+
+        
+
+class _Scope:
+    """
+    Profiler.scope()が返す計測区間（withで囲んだ処理の時間を記録する）
+    """
+    __slots__ = ("profiler", "slot", "start")
+
+    def __init__(self, profiler: "Profiler", slot: int):
+        self.profiler = profiler
+        self.slot = slot
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self, *exc):
+        self.profiler._record(self.slot, self.start, time.perf_counter_ns())
+
+
+_NULL_SCOPE = nullcontext()  # 計測しないときに返す何もしない区間
+
+
+class Profiler:
+    """
+    フレーム内の処理（区間）ごとの時間をperf_counter_nsで測り，固定長のリングバッファに記録するクラス
+    パーセンタイルの表にはフレームごとの区間の合計時間を使い，Chromeトレースには1フレームに何回も
+    通る区間（追いつくために何ステップか進めたときのstepなど）も1回ずつ別の区間として書き出す
+    無効のときはscope()が何もしない共有オブジェクトを返すだけなので，ほとんど時間を使わない
+    """
+    max_phases = 32  # 記録できる区間の種類の数
+
+    def __init__(self, size: int = 600):
+        """
+        引数 size：記録しておくフレーム数
+        """
+        self.enabled = False
+        self.size = size
+        self.names: list[str] = []  # 区間の名前（登録順）
+        self.scopes: dict[str, _Scope] = {}
+        self.durs = np.zeros((size, __class__.max_phases), dtype=np.int64)  # 区間の合計時間
+        self.spans: list[list[tuple[int, int, int]]] = [[] for _ in range(size)]  # 区間を通るたびの(番号, 開始, 終了)
+        self.frame_start = np.zeros(size, dtype=np.int64)
+        self.frame_ns = np.zeros(size, dtype=np.int64)
+        self.group_names: list[str] = []
+        self.counts = np.zeros((size, 0), dtype=np.int64)  # フレームごとのグループの生存数
+        self.index = 0  # 記録中のフレーム
+        self.filled = 0  # 記録済みのフレーム数
+        self.overlay = False  # 画面にグラフを表示するかどうか
+        self.overlay_img: pg.Surface | None = None
+        self.overlay_text: pg.Surface | None = None
+
+    def scope(self, name: str) -> "_Scope|nullcontext":
+        """
+        withで囲んだ処理の時間をnameの区間として記録する
+        引数 name：区間の名前
+        """
+        if not self.enabled:
+            return _NULL_SCOPE
+        scope = self.scopes.get(name)
+        if scope is None:
+            scope = self.scopes[name] = _Scope(self, len(self.names))
+            self.names.append(name)
+        return scope
+
+    def _record(self, slot: int, start: int, end: int) -> None:
+        self.durs[self.index, slot] += end - start
+        self.spans[self.index].append((slot, start, end))
+
+    def begin_frame(self) -> None:
+        """
+        フレームの計測を始める
+        """
+        if not self.enabled:
+            return
+        i = self.index
+        self.durs[i] = 0
+        self.spans[i].clear()
+        self.frame_start[i] = time.perf_counter_ns()
+
+    def end_frame(self, counts: dict[str, int] | None = None) -> None:
+        """
+        フレームの計測を終え，次のフレームに進む
+        引数 counts：グループごとの生存数
+        """
+        if not self.enabled:
+            return
+        i = self.index
+        self.frame_ns[i] = time.perf_counter_ns() - self.frame_start[i]
+        if counts:
+            if list(counts) != self.group_names:
+                self.group_names = list(counts)
+                self.counts = np.zeros((self.size, len(counts)), dtype=np.int64)
+            self.counts[i] = list(counts.values())
+        self.index = (i + 1) % self.size
+        self.filled = min(self.filled + 1, self.size)
+
+    def _order(self) -> np.ndarray:
+        """
+        記録済みのフレームの添字を古い順に返す
+        """
+        return (np.arange(self.index - self.filled, self.index)) % self.size
+
+    def summary(self) -> dict:
+        """
+        フレーム時間・区間ごとの時間の50/95/99パーセンタイル（ミリ秒）と，グループの生存数を返す
+        """
+        if not self.filled:
+            return {}
+        order = self._order()
+
+        def pct(ns: np.ndarray) -> dict[str, float]:
+            p = np.percentile(ns, [50, 95, 99]) / 1e6
+            return {"p50": round(float(p[0]), 3), "p95": round(float(p[1]), 3), "p99": round(float(p[2]), 3)}
+
+        result = {"frames": self.filled, "frame": pct(self.frame_ns[order])}
+        for slot, name in enumerate(self.names):
+            result[name] = pct(self.durs[order, slot])
+        if self.group_names:
+            counts = self.counts[order]
+            result["live"] = {name: {"last": int(counts[-1, j]), "max": int(counts[:, j].max())}
+                              for j, name in enumerate(self.group_names)}
+        return result
+
+    def export_chrome_trace(self, path: str) -> None:
+        """
+        記録済みのフレームをChromeのトレース形式（chrome://tracing，Perfetto）のJSONに書き出す
+        区間は通った回数だけ書き出すので，入れ子の区間は親の区間の中に収まる
+        引数 path：書き出すファイルのパス
+        """
+        events = []
+        for i in self._order().tolist():
+            t0 = int(self.frame_start[i])
+            events.append({"name": "frame", "ph": "X", "pid": 1, "tid": 1,
+                           "ts": t0 / 1000, "dur": int(self.frame_ns[i]) / 1000})
+            for slot, start, end in sorted(self.spans[i], key=lambda span: (span[1], -span[2])):
+                events.append({"name": self.names[slot], "ph": "X", "pid": 1, "tid": 1,
+                               "ts": start / 1000, "dur": (end - start) / 1000})
+            if self.group_names:
+                events.append({"name": "live", "ph": "C", "pid": 1, "tid": 1, "ts": t0 / 1000,
+                               "args": dict(zip(self.group_names, self.counts[i].tolist()))})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+    def draw_overlay(self, screen: pg.Surface) -> pg.Rect | None:
+        """
+        直近のフレーム時間のグラフとパーセンタイルを画面右上に描く
+        引数 screen：画面Surface
+        戻り値：描いた矩形（表示しないときはNone）
+        """
+        if not (self.enabled and self.overlay and self.filled):
+            return None
+        w, h = 240, 80
+        if self.overlay_img is None:
+            self.overlay_img = pg.Surface((w, h))
+        img = self.overlay_img
+        img.fill((0, 0, 0))
+        order = self._order()[-w:]
+        ms = self.frame_ns[order] / 1e6
+        scale = h / 33.4  # 上端が2フレーム分（33.4ms）
+        for x, t in enumerate(ms.tolist()):
+            color = (0, 200, 0) if t <= 16.7 else (220, 60, 60)
+            pg.draw.line(img, color, (x, h-1), (x, h-1-min(h-1, int(t*scale))))
+        pg.draw.line(img, (255, 255, 0), (0, h-1-int(16.7*scale)), (w, h-1-int(16.7*scale)))
+        if self.overlay_text is None or self.index % 30 == 0:  # 文字は0.5秒ごとに更新する
+            p = np.percentile(self.frame_ns[self._order()], [50, 95, 99]) / 1e6
+            self.overlay_text = get_font(20).render(
+                f"p50 {p[0]:.1f} p95 {p[1]:.1f} p99 {p[2]:.1f} ms", True, (255, 255, 255))
+        img.blit(self.overlay_text, (4, 2))
+        return screen.blit(img, (screen.get_width()-w-10, 10))
+
+
+PROFILER = Profiler()  # メインループとWorldで共有するプロファイラ（既定では無効）
+
+
+class FrameInput(NamedTuple):
+    """
+    1フレーム分の入力
+    """
+    keys: frozenset[int] = frozenset()  # 押下されている移動キー
+    mouse: tuple[int, int] = (0, 0)  # 照準（マウスカーソル）の位置
+    clicks: int = 0  # このフレームのクリック回数
+    sprint: bool = False  # ダッシュ中かどうか
+
+
+IDLE_INPUT = FrameInput()  # 何も操作しない入力
+
+
+WAVES_PATH = asset_path("waves.json")  # 出現の設定ファイル
+
+
+class Wave:
+    """
+    「fromフレーム目からuntilフレーム目の手前まで，経過フレーム数がeveryで割り切れるとき」という
+    出現の規則を並べたもの．どれかの規則に当てはまるフレームで1回出現する
+    """
+    def __init__(self, rules: list[dict]):
+        """
+        引数 rules：{"from": 開始, "until": 終了（省略なら最後まで）, "every": 間隔}のリスト
+        """
+        self.rules = [(rule.get("from", 0), rule.get("until"), rule["every"]) for rule in rules]
+        for start, until, every in self.rules:
+            if every <= 0:
+                raise ValueError(f"wave interval must be positive: {every}")
+
+    def next_tick(self, tmr: int) -> int | None:
+        """
+        tmrフレーム目以降で次に出現するフレームを返す（もう出現しないならNone）
+        """
+        ticks = []
+        for start, until, every in self.rules:
+            t = max(tmr, start)
+            t += -t % every
+            if until is None or t < until:
+                ticks.append(t)
+        return min(ticks, default=None)
+
+
+class Waves(NamedTuple):
+    """
+    設定ファイルから読み込んだ出現の設定
+    """
+    enemy: Wave  # 敵機の出現
+    bomb: Wave  # 爆弾の出現
+    item: Wave  # アイテムの出現
+    bomb_drop: tuple[tuple[int, int], ...]  # 爆弾が小さい爆弾を落とし始めるフレームと，間隔で割った余り
+
+    @staticmethod
+    def load(path: str = WAVES_PATH) -> "Waves":
+        """
+        出現の設定ファイル（JSON）を読み込む．同じファイルは2回目から読み込んだものを返す
+        引数 path：設定ファイルのパス
+        """
+        waves = _WAVES.get(path)
+        if waves is None:
+            with open(path) as f:
+                config = json.load(f)
+            drops = tuple((rule.get("from", 0), rule.get("phase", 0)) for rule in config.get("bomb_drop", []))
+            waves = _WAVES[path] = Waves(Wave(config.get("enemy", [])), Wave(config.get("bomb", [])),
+                                         Wave(config.get("item", [])), drops)
+        return waves
+
+
+_WAVES: dict[str, Waves] = {}
+
+# 同じフレームの予定を処理する順番（元のtmrの剰余による判定の順番と同じ．敵機の爆弾投下は
+# 予定に入れずにEnemyPool.due()で求め，敵機の出現と爆弾の出現の間に行う）
+_STAGE_ENEMY = 0  # 敵機の出現
+_STAGE_BOMB = 2  # 爆弾の出現
+_STAGE_DROP = 3  # 爆弾の小さい爆弾投下（bomb_dropの規則ごとに_STAGE_DROP+規則の番号）
+_STAGE_ITEM = 100  # アイテムの出現
+
+
+class SpawnScheduler:
+    """
+    出現や爆弾投下の予定を(フレーム, 段階, 番号, 確認用の値)の優先度付きキュー（ヒープ）で持つクラス
+    毎フレームは予定の時刻が来たものだけを取り出すので，敵機や爆弾の数には比例しない
+    同じフレームの予定は段階，番号（爆弾の添字）の順に取り出す
+    """
+    def __init__(self):
+        self.heap: list[tuple] = []
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def clear(self) -> None:
+        self.heap.clear()
+
+    def push(self, tick: int | None, stage: int, seq: int = 0, token: int = 0) -> None:
+        """
+        予定を入れる（tickがNoneなら何もしない）
+        引数1 tick：予定のフレーム
+        引数2 stage：段階（同じフレームで先に処理するものほど小さい）
+        引数3 seq：同じ段階の中での順番
+        引数4 token：予定を入れたときの対象の通し番号（対象が入れ替わっていないかの確認用）
+        """
+        if tick is not None:
+            heapq.heappush(self.heap, (tick, stage, seq, token))
+
+    def pop_due(self, tmr: int):
+        """
+        tmrフレーム目までの予定を順に取り出すジェネレータ（取り出している間に入れた同じフレームの予定も含む）
+        """
+        heap = self.heap
+        while heap and heap[0][0] <= tmr:
+            yield heapq.heappop(heap)
+
+
+ENTITY_CAPS = {  # グループごとの同時に存在できる数の上限（超える出現は見送る）
+    "emys": 64,
+    "bombs": 1024,
+    "minbombs": 4096,
+    "items": 16,
+    "exps": 256 * EffectPool.PER_BURST,  # 爆発エフェクトの要素（爆発1つでPER_BURST個）
+    "shots": 16,
+    "gravitys": 4,
+}
+
+
+class World:
+    """
+    ゲームの状態（スプライトグループ，タイマー，乱数など）を持ち，
+    入力から1フレームずつゲームを進めるクラス
+    画面を使わないので，ダミーのビデオドライバで実時間より速く動かせる
+    """
+    EXP_COOLTIME = 15  # 弾を撃てる間隔
+    SLOW_TIME = 200  # アイテムで敵機が減速する時間
+    SLOW_SCALE = 0.5  # 減速中の敵機の速さの倍率
+    NARROW_PHASE = True  # 矩形で絞り込んだ後にマスク・円で細かく当たり判定するかどうか（ベンチマーク用）
+    RELOAD_INTERVAL = 200  # 弾が1発回復する間隔
+    MAX_BULLETS = 10  # 残弾数の上限
+
+    def __init__(self, seed: int | None = None, pool_sizes: dict[str, int] | None = None,
+                 caps: dict[str, int] | None = None, waves: Waves | None = None):
+        """
+        引数1 seed：乱数のシード（Noneならランダム）
+        引数2 pool_sizes：クラス名ごとに使い回すスプライトの最大数（省略したものはPOOL_SIZES）
+        引数3 caps：グループごとの同時に存在できる数の上限（省略したものはENTITY_CAPS）
+        引数4 waves：出現の設定（Noneならwaves.json）
+        """
+        self.waves = waves if waves is not None else Waves.load()
+        if len(self.waves.bomb_drop) > _STAGE_ITEM - _STAGE_DROP:
+            raise ValueError("too many bomb_drop rules")
+        self.scheduler = SpawnScheduler()
+        self.caps = ENTITY_CAPS | (caps or {})
+        sizes = POOL_SIZES | (pool_sizes or {})
+        self.pools = {cls: SpritePool(cls, sizes[cls.__name__]) for cls in (Shot, Item)}
+        self.bird = Bird(3, (900, 400))
+        self.bombs = ProjectilePool()
+        self.minbombs = ProjectilePool()
+        self.exps = EffectPool()
+        self.emys = EnemyPool()
+        self.gravitys = pg.sprite.Group()
+        self.shots = pg.sprite.Group()
+        self.items = pg.sprite.Group()
+        self.reset(seed)
+
+    def reset(self, seed: int | None = None) -> None:
+        """
+        ゲームを最初の状態に戻す．画像・グループ・プールは作り直さずに使い回す
+        引数 seed：乱数のシード（Noneならランダムに決める．決めたシードはself.seedに残るのでリプレイに使える）
+        """
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.rng = random.Random(seed)
+        for group in (self.gravitys, self.shots, self.items):
+            group.empty()  # Pooledのスプライトはプールに戻る
+        self.exps.clear()
+        self.exps.reseed(seed)
+        self.emys.clear()
+        self.bombs.clear()
+        self.minbombs.clear()
+        self.bird.reset((900, 400))
+        self.scheduler.clear()
+        self.scheduler.push(self.waves.enemy.next_tick(0), _STAGE_ENEMY)
+        self.scheduler.push(self.waves.bomb.next_tick(0), _STAGE_BOMB)
+        self.scheduler.push(self.waves.item.next_tick(0), _STAGE_ITEM)
+        self.tmr = 0
+        self.slow_until = 0  # 敵機の減速が終わるフレーム
+        self.score = 0
+        self.hp = self.bird.hp
+        self.rl = __class__.MAX_BULLETS  # 残弾数
+        self.last_explosion_time = -100
+        self.last_reload_time = 0
+        self.over = False  # ゲームオーバーになったかどうか
+        self.shots_fired = 0  # 撃った弾の数
+        self.items_used = 0  # 効果を発動したアイテムの数
+
+    def rank(self) -> str:
+        """
+        現在の経過時間でのランクを返す
+        """
+        return Rank.get_rank(self.tmr)
+
+    def room(self, name: str) -> bool:
+        """
+        グループにまだ上限までの空きがあるかどうかを返す
+        引数 name：グループの属性名（ENTITY_CAPSのキー）
+        """
+        return len(getattr(self, name)) < self.caps[name]
+
+    def explode(self, centers: list[tuple[int, int]], life: int, debris: bool = True) -> None:
+        """
+        爆発エフェクトをまとめて出現させる（上限に入りきらない分は出さない）
+        引数1 centers：爆発の中心座標のリスト
+        引数2 life：爆発の絵を表示するフレーム数
+        引数3 debris：光と破片も出すかどうか
+        """
+        per = EffectPool.PER_BURST if debris else 1
+        n = min(len(centers), (self.caps["exps"] - len(self.exps)) // per)
+        if n > 0:
+            self.exps.burst(centers[:n], life, debris)
+
+    def add(self, name: str, cls: type, *args) -> pg.sprite.Sprite | None:
+        """
+        スプライトをSpritePoolから取り出して（clsのコンストラクタ／reset()にargsを渡す）グループに入れる
+        引数1 name：グループの属性名
+        引数2 cls：スプライトのクラス
+        戻り値：入れたスプライト（グループが上限に達していればNone）
+        """
+        if not self.room(name):
+            return None
+        sprite = self.pools[cls].acquire(*args)
+        getattr(self, name).add(sprite)
+        return sprite
+
+    def live_counts(self) -> dict[str, int]:
+        """
+        グループごとの今生きている数を返す
+        """
+        return {name: len(getattr(self, name)) for name in self.caps}
+
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        """
+        スプライトと爆弾の使い回しの状況を返す
+        """
+        stats = {cls.__name__: pool.stats() for cls, pool in self.pools.items()}
+        stats["Effect"] = self.exps.stats()
+        stats["Enemy"] = self.emys.stats()
+        stats["Bomb"] = self.bombs.stats()
+        stats["Minbomb"] = self.minbombs.stats()
+        return stats
+
+    def sync(self) -> None:
+        """
+        PipelinedWorldと同じ使い方をするためのもの（Worldはstep()の中で進め終わるので何もしない）
+        """
+
+    def step(self, inp: FrameInput) -> None:
+        """
+        入力に従ってゲームを1フレーム進める
+        引数 inp：このフレームの入力
+        """
+        if self.over:
+            return
+        tmr = self.tmr
+        bird = self.bird
+        bird.speed = 20 if inp.sprint else 10
+        for _ in range(inp.clicks): #マウスがクリックされたら
+            if tmr-self.last_explosion_time >= __class__.EXP_COOLTIME: #クールタイム確認
+                if self.rl >= 1:
+                    self.add("shots", Shot, inp.mouse, 10)
+                    self.explode([inp.mouse], 10, False)  # 弾の見た目
+                    self.last_explosion_time = tmr
+                    self.rl -= 1
+                    self.shots_fired += 1
+
+        if tmr - self.last_reload_time >= __class__.RELOAD_INTERVAL and self.rl < __class__.MAX_BULLETS:
+            self.rl += 1
+            self.last_reload_time = tmr
+
+        self.gravitys.update()
+        with PROFILER.scope("spawn"):
+            self.spawn()
+
+        with PROFILER.scope("collide"):
+            alive = self.collide()
+        if not alive:
+            self.over = True
+            bird.change_img(8)  # こうかとん悲しみエフェクト
+            return
+
+        with PROFILER.scope("update"):
+            bird.update(inp.keys)
+            self.emys.update(__class__.SLOW_SCALE if tmr < self.slow_until else 1.0)
+            self.bombs.update()
+            self.minbombs.update()
+            self.exps.update()
+            self.shots.update()
+            self.items.update()
+        self.tmr += 1
+
+    def add_enemy(self) -> int | None:
+        """
+        敵機を出現させる（intervalで割り切れるフレームごとに小さい爆弾を落とす）
+        戻り値：出現させた敵機の添字（上限に達していればNone）
+        """
+        if not self.room("emys"):
+            return None
+        return Enemy.spawn(self.emys, self.tmr, self.rng)
+
+    def enemy_fire(self) -> None:
+        """
+        投下するフレームが来た敵機から，こうかとんを狙う小さい爆弾を出現させる
+        """
+        emys = self.emys
+        idx = emys.due(self.tmr)
+        for i, center in zip(idx.tolist(), emys.centers(idx)):
+            if self.room("minbombs"):
+                Minbomb.spawn(self.minbombs, center, int(emys.h[i])//2, self.bird, self.rng)
+
+    def add_bomb(self, interval: int | None = None) -> int:
+        """
+        爆弾を出現させ，小さい爆弾を落とす予定を入れる
+        引数 interval：小さい爆弾を落とす間隔（Noneなら爆弾ごとの乱数）
+        戻り値：出現させた爆弾の添字
+        """
+        bombs = self.bombs
+        i = Bomb.spawn(bombs, self.rng)
+        if interval is not None:
+            bombs.interval[i] = interval
+        for rule in range(len(self.waves.bomb_drop)):
+            self._schedule_drop(i, rule, self.tmr)
+        return i
+
+    def _schedule_drop(self, i: int, rule: int, tmr: int) -> None:
+        """
+        i番目の爆弾の，tmrフレーム目以降で次に小さい爆弾を落とす予定を入れる
+        """
+        start, phase = self.waves.bomb_drop[rule]
+        interval = int(self.bombs.interval[i])
+        if interval <= phase:  # 余りがphaseになることはない
+            return
+        t = max(tmr, start)
+        t += (phase - t) % interval
+        self.scheduler.push(t, _STAGE_DROP + rule, i, int(self.bombs.serial[i]))
+
+    def spawn(self) -> None:
+        """
+        予定の時刻が来た敵機，爆弾，アイテムの出現と爆弾からの投下を行う（予定はwaves.jsonと各爆弾の間隔で決まる）
+        """
+        tmr = self.tmr
+        rng = self.rng
+        waves = self.waves
+        scheduler = self.scheduler
+        bombs = self.bombs
+        fired = False
+        for _, stage, seq, token in scheduler.pop_due(tmr):
+            if stage != _STAGE_ENEMY and not fired:  # 出現した敵機も含めて，爆弾の出現より先に投下する
+                self.enemy_fire()
+                fired = True
+            if stage == _STAGE_ENEMY:
+                self.add_enemy()
+                scheduler.push(waves.enemy.next_tick(tmr+1), stage)
+            elif stage == _STAGE_BOMB:
+                if self.room("bombs"):
+                    self.add_bomb()
+                scheduler.push(waves.bomb.next_tick(tmr+1), stage)
+            elif stage == _STAGE_ITEM:
+                self.add("items", Item, self.hp, rng)
+                scheduler.push(waves.item.next_tick(tmr+1), stage)
+            elif bombs.alive[seq] and bombs.serial[seq] == token:  # 大きい爆弾から,追従する小さい爆弾を出現させる
+                if self.room("minbombs"):
+                    Minbomb.spawn(self.minbombs, (bombs.x[seq], bombs.y[seq]), int(bombs.rad[seq]), self.bird, rng)
+                self._schedule_drop(seq, stage - _STAGE_DROP, tmr+1)
+        if not fired:
+            self.enemy_fire()
+
+    def state_hash(self) -> str:
+        """
+        ゲームの状態（タイマー，スコア，全てのスプライトと爆弾の位置，乱数の状態）のハッシュ値を返す
+        リプレイを再生した結果が記録したときと同じかどうかを確かめるのに使う
+        """
+        h = hashlib.sha256()
+        h.update(struct.pack("<6q", self.tmr, self.score, self.hp, self.rl, self.slow_until, self.over))
+        h.update(struct.pack("<4i", *self.bird.rect))
+        for group in (self.items, self.shots, self.gravitys):
+            for sprite in group:
+                h.update(struct.pack("<4i", *sprite.rect))
+        idx = self.exps.indices()
+        for array in (self.exps.pos[idx], self.exps.ages(idx), self.exps.kind[idx]):
+            h.update(array.tobytes())
+        idx = self.emys.indices()
+        for array in (self.emys.x, self.emys.y, self.emys.speed, self.emys.next_fire):
+            h.update(array[idx].tobytes())
+        for pool in (self.bombs, self.minbombs):
+            idx = pool.indices()
+            for array in (pool.x, pool.y, pool.vx, pool.vy, pool.rad):
+                h.update(array[idx].tobytes())
+        h.update(repr(self.rng.getstate()).encode())
+        return h.hexdigest()
+
+    def wipe(self) -> None:
+        """
+        ストロベリーの効果：画面上の敵機と爆弾を全て爆発させて消す
+        """
+        if self.room("gravitys"):
+            self.gravitys.add(Gravity(50))
+        self.explode(self.emys.centers(self.emys.indices()), 50)  # 爆発エフェクト
+        self.emys.clear()
+        self.explode(self.bombs.centers(self.bombs.indices()), 50)
+        self.bombs.clear()
+        self.minbombs.clear()
+
+    def collide(self) -> bool:
+        """
+        衝突判定を行い，スコア・HP・アイテム効果を反映する
+        戻り値：こうかとんが生きていればTrue，HPが尽きたらFalse
+        """
+        bird = self.bird
+        shot_rects = [shot.rect for shot in self.shots]
+        hit = self.emys.hit_rects(shot_rects, __class__.NARROW_PHASE)  # ビームと衝突した敵機
+        self.emys.kill(hit)
+        self.explode(self.emys.centers(hit), 100)  # 爆発エフェクト
+        self.score += 10 * len(hit)  # 1機につき10点アップ
+
+        for bombs in (self.bombs, self.minbombs):
+            if __class__.NARROW_PHASE:  # こうかとんと衝突した爆弾（透明な角には当たらない）
+                hit = bombs.hit_mask(bird.rect, bird.mask)
+            else:
+                hit = bombs.hit_rect(bird.rect)
+            bombs.kill(hit)
+            for center in bombs.centers(hit):
+                if self.hp <= 1:  # HPが1以下ならゲームオーバー
+                    return False
+                else:  # HPが1より大きければHPが1減る
+                    self.hp -= 1
+                self.explode([center], 50)  # 爆発エフェクト
+                self.score += 1  # 1点アップ
+
+        for bombs in (self.bombs, self.minbombs):
+            hit = bombs.hit_rects(shot_rects)  #照準の接触判定
+            bombs.kill(hit)
+            self.explode(bombs.centers(hit), 50)  # 爆発エフェクト
+
+        for item in pg.sprite.groupcollide(self.items, self.shots, True,False): # アイテムとの衝突判定
+            if item.num == 0:  # 0番のアイテム(キャンディ)を取るとHPが1回復
+                if self.hp < 10:
+                    self.hp += 1
+            elif item.num == 1:  # 1番のアイテム(ストロベリー)を取ると画面上の敵を倒す
+                self.wipe()
+            elif item.num == 2:  # 画面上の敵の減速
+                self.slow_until = self.tmr + __class__.SLOW_TIME
+                self.rl += 5
+            item.get_item()
+            self.items_used += 1
+        return True
+
+
+def run_headless(seed: int | None, max_ticks: int,
+                 policy: Callable[[World], FrameInput] | None = None) -> World:
+    """
+    画面を使わずにゲームを最大max_ticksフレーム進める
+    引数1 seed：乱数のシード
+    引数2 max_ticks：進める最大フレーム数
+    引数3 policy：Worldから次の入力を決める関数（Noneなら何も操作しない）
+    戻り値：進めた後のWorld
+    """
+    world = World(seed)
+    while not world.over and world.tmr < max_ticks:
+        PROFILER.begin_frame()
+        world.step(policy(world) if policy is not None else IDLE_INPUT)
+        PROFILER.end_frame(world.live_counts() if PROFILER.enabled else None)
+    return world
+
+
+class BackgroundLayer:
+    """
+    横スクロールする背景の1枚のレイヤーに関するクラス
+    画像と反転画像を横に並べて画面の高さで切り取った帯を最初に1回だけ作り，
+    毎フレームは帯の中の見えている部分だけを（帯の端をまたぐときは2回に分けて）画面に転送する
+    """
+    def __init__(self, path: str, speed: float, size: tuple[int, int] = (1600, 900),
+                 y: int = 0, colorkey: tuple[int, int, int] | None = None):
+        """
+        引数1 path：背景画像のパス
+        引数2 speed：1フレームあたりのスクロール量（0ならスクロールしない）
+        引数3 size：画像を拡大・縮小する大きさ
+        引数4 y：画像のどの高さから画面に映すか
+        引数5 colorkey：透明にする色（奥のレイヤーを透かす手前のレイヤー用）
+        """
+        w, h = size
+        display = pg.display.get_surface()
+        strip_size = (2*w, min(HEIGHT, h-y))
+        # 画像，反転画像の順に並べた帯（画面があれば最初から画面と同じ形式で作る）
+        self.strip = pg.Surface(strip_size, 0, display) if display is not None else pg.Surface(strip_size)
+        img = pg.transform.scale(ASSETS.load(path), size)  # 帯を作った後は要らないのでキャッシュしない
+        self.strip.blit(img, (0, -y))
+        del img
+        half = self.strip.subsurface((0, 0, w, strip_size[1]))
+        self.strip.blit(pg.transform.flip(half, True, False), (w, 0))  # 横スクロール用の反転画像
+        if colorkey is not None:
+            self.strip.set_colorkey(colorkey)
+        self.width = 2*w  # 帯の幅（スクロールの周期）
+        self.speed = speed
+        self.x = None  # 現在のスクロール量
+        self.area = pg.Rect(0, 0, 0, self.strip.get_height())  # 1回目に転送する帯の範囲
+        self.wrap = pg.Rect(0, 0, 0, self.strip.get_height())  # 帯の端をまたぐときに2回目に転送する範囲
+        self.wrap_pos = [0, 0]
+
+    def scroll(self, tmr: int) -> bool:
+        """
+        経過フレーム数からスクロール量を決める
+        引数 tmr：経過フレーム数
+        戻り値：スクロール量が前回から変わったかどうか
+        """
+        x = int(tmr*self.speed) % self.width
+        if x == self.x:
+            return False
+        self.x = x
+        self.area.x = x
+        self.area.width = min(WIDTH, self.width - x)
+        self.wrap.width = WIDTH - self.area.width
+        self.wrap_pos[0] = self.area.width
+        return True
+
+    def draw(self, screen: pg.Surface) -> None:
+        """
+        帯の見えている部分を画面に転送する
+        引数 screen：画面Surface
+        """
+        screen.blit(self.strip, (0, 0), self.area)
+        if self.wrap.width:
+            screen.blit(self.strip, self.wrap_pos, self.wrap)
+
+
+_REPLAY_HEADER = struct.Struct("<4sBq")  # マジックナンバー，版，シード
+_REPLAY_FOOTER = struct.Struct("<BI32s")  # 終わりの印，フレーム数，最後の状態のハッシュ値
+_REPLAY_KEYS = tuple(Bird.delta)  # キーのビットの並び（その次のビットがダッシュ）
+_REPLAY_SPRINT = 1 << len(_REPLAY_KEYS)
+# 1フレーム分の記録の先頭バイトの意味
+_TAG_KEYS = 0x01  # キーが変わった（キーのビットマスク1バイトが続く）
+_TAG_MOUSE_NEAR = 0x02  # マウスが少し動いた（x, yの差分が1バイトずつ続く）
+_TAG_MOUSE_FAR = 0x04  # マウスが大きく動いた（x, yの符号付きの値が2バイトずつ続く．画面外の負の位置もある）
+_TAG_CLICKS = 0x08  # クリックした（回数1バイトが続く）
+_TAG_END = 0x40  # 記録の終わり（フレーム数と最後の状態のハッシュ値が続く）
+_TAG_IDLE = 0x80  # 下位7ビットのフレーム数だけ入力が変わらなかった
+
+
+def pack_keys(inp: FrameInput) -> int:
+    """
+    入力の移動キーとダッシュを1バイトのビットマスクにする（リプレイと並列モードで使う）
+    引数 inp：1フレーム分の入力
+    """
+    keys = _REPLAY_SPRINT if inp.sprint else 0
+    for bit, k in enumerate(_REPLAY_KEYS):
+        if k in inp.keys:
+            keys |= 1 << bit
+    return keys
+
+
+def unpack_keys(mask: int) -> tuple[frozenset[int], bool]:
+    """
+    pack_keys()のビットマスクを移動キーの集合とダッシュ中かどうかに戻す
+    引数 mask：ビットマスク
+    """
+    keys = frozenset(k for bit, k in enumerate(_REPLAY_KEYS) if mask & (1 << bit))
+    return keys, bool(mask & _REPLAY_SPRINT)
+
+
+class ReplayRecorder:
+    """
+    シードと1フレームごとの入力を，前のフレームとの差分だけのバイナリ形式でファイルに書き出すクラス
+    入力が変わらないフレームは数をまとめて1バイトにするので，操作していない間はほとんど書き込まない
+    """
+    magic = b"KKRP"
+    version = 5  # ゲームの規則が変わって同じ入力でも結果が変わるときにも上げる
+
+    def __init__(self, path: str, seed: int):
+        """
+        引数1 path：書き出すファイルのパス
+        引数2 seed：Worldの乱数のシード
+        """
+        self.file = open(path, "wb", buffering=1 << 16)
+        self.file.write(_REPLAY_HEADER.pack(__class__.magic, __class__.version, seed))
+        self.keys = 0
+        self.mouse = (0, 0)
+        self.idle = 0  # まだ書いていない入力の変わらないフレームの数
+        self.ticks = 0  # 記録したフレームの数
+
+    def _flush_idle(self) -> None:
+        if self.idle:
+            self.file.write(bytes((_TAG_IDLE | self.idle,)))
+            self.idle = 0
+
+    def record(self, inp: FrameInput) -> None:
+        """
+        1フレーム分の入力を記録する
+        引数 inp：Worldに渡す入力
+        """
+        self.ticks += 1
+        keys = pack_keys(inp)
+        if keys == self.keys and inp.mouse == self.mouse and not inp.clicks:
+            self.idle += 1
+            if self.idle == 0x7F:
+                self._flush_idle()
+            return
+        self._flush_idle()
+        tag = 0
+        body = bytearray()
+        if keys != self.keys:
+            tag |= _TAG_KEYS
+            body.append(keys)
+            self.keys = keys
+        if inp.mouse != self.mouse:
+            dx, dy = inp.mouse[0] - self.mouse[0], inp.mouse[1] - self.mouse[1]
+            if -128 <= dx < 128 and -128 <= dy < 128:
+                tag |= _TAG_MOUSE_NEAR
+                body += struct.pack("<bb", dx, dy)
+            else:
+                tag |= _TAG_MOUSE_FAR
+                body += struct.pack("<hh", *inp.mouse)
+            self.mouse = inp.mouse
+        if inp.clicks:
+            tag |= _TAG_CLICKS
+            body.append(min(inp.clicks, 255))
+        self.file.write(bytes((tag,)) + body)
+
+    def close(self, world: World) -> None:
+        """
+        記録を終え，フレーム数と最後の状態のハッシュ値を書いてファイルを閉じる
+        引数 world：記録したゲームのWorld
+        """
+        self._flush_idle()
+        self.file.write(_REPLAY_FOOTER.pack(_TAG_END, self.ticks, bytes.fromhex(world.state_hash())))
+        self.file.close()
+
+
+class Replay(NamedTuple):
+    """
+    読み込んだリプレイ
+    """
+    seed: int
+    ticks: int  # 記録されたフレーム数
+    digest: str  # 記録したときの最後の状態のハッシュ値
+    data: bytes  # 入力の記録
+
+    @staticmethod
+    def load(path: str) -> "Replay":
+        """
+        リプレイファイルを読み込む
+        引数 path：リプレイファイルのパス
+        戻り値：読み込んだリプレイ
+        """
+        with open(path, "rb") as f:
+            raw = f.read()
+        magic, version, seed = _REPLAY_HEADER.unpack_from(raw)
+        if magic != ReplayRecorder.magic or version != ReplayRecorder.version:
+            raise ValueError(f"{path} is not a replay file (version {ReplayRecorder.version})")
+        tag, ticks, digest = _REPLAY_FOOTER.unpack_from(raw, len(raw) - _REPLAY_FOOTER.size)
+        if tag != _TAG_END:
+            raise ValueError(f"{path} is truncated")
+        return Replay(seed, ticks, digest.hex(), raw[_REPLAY_HEADER.size:len(raw)-_REPLAY_FOOTER.size])
+
+    def inputs(self):
+        """
+        記録された入力を1フレームずつ返すジェネレータ
+        """
+        data = self.data
+        keys, mouse = frozenset(), (0, 0)
+        inp = IDLE_INPUT._replace(mouse=mouse)
+        i = 0
+        while i < len(data):
+            tag = data[i]
+            i += 1
+            if tag & _TAG_IDLE:
+                for _ in range(tag & 0x7F):
+                    yield inp
+                continue
+            if tag & _TAG_KEYS:
+                keys, sprint = unpack_keys(data[i])
+                i += 1
+                inp = inp._replace(keys=keys, sprint=sprint)
+            if tag & _TAG_MOUSE_NEAR:
+                dx, dy = struct.unpack_from("<bb", data, i)
+                i += 2
+                mouse = (mouse[0] + dx, mouse[1] + dy)
+            elif tag & _TAG_MOUSE_FAR:
+                mouse = struct.unpack_from("<hh", data, i)
+                i += 4
+            inp = inp._replace(mouse=mouse, clicks=0)
+            if tag & _TAG_CLICKS:
+                yield inp._replace(clicks=data[i])
+                i += 1
+            else:
+                yield inp
 
-        # for i in range(3):  # アイテムの個数分繰り返し
-        #     if self.num != i:  # iが画像番号でないときは処理を行わない
-        #         continue
-        #     else: 
-        #         self.kill()  # 削除
-        #         if i == 0:  # 画像番号ごとに効果を付ける
-        #             self.count += 1
-        #             self.hp.value += 3
-        #             # 回復
-        #         elif i == 1:
-        #             self.count += 5
-        #             # 重力場
-        #         elif i == 2:
-        #             self.count += 10
-        #             # 無敵
+    def play(self) -> World:
+        """
+        画面を使わずに最速で再生する
+        戻り値：再生し終えたWorld（state_hash()がdigestと同じなら記録したときと同じ結果）
+        """
+        world = World(self.seed)
+        for inp in self.inputs():
+            world.step(inp)
+        return world
 
-        # return self.count
 
-    def update(self):
-        self.rect.move_ip(self.vx, self.vy)    
+# メインループで受け取るイベント（これ以外はキューに入れない）
+INPUT_EVENTS = (pg.QUIT, pg.KEYDOWN, pg.MOUSEBUTTONDOWN,
+                pg.JOYBUTTONDOWN, pg.JOYDEVICEADDED, pg.JOYDEVICEREMOVED)
 
-class Click(pg.sprite.Sprite):
-    
-    def __init__(self,aim):
-        super().__init__
-        self.life = 5
-        
 
-        
+def is_start_event(event: pg.event.Event) -> bool:
+    """
+    ゲームを始める操作（クリック，スペース・エンターキー，ゲームパッドのボタン）かどうかを返す
+    """
+    return event.type in (pg.MOUSEBUTTONDOWN, pg.JOYBUTTONDOWN) or (
+        event.type == pg.KEYDOWN and event.key in (pg.K_SPACE, pg.K_RETURN))
 
-def main():
-    pg.display.set_caption("シューティングゲーム")
-    screen = pg.display.set_mode((WIDTH,HEIGHT))
-    bg_img = pg.image.load(f"fig/bg_moon_getsumen.jpg")
-    bg_img = pg.transform.scale(bg_img, (1600,900))
-    bg_img2 = pg.transform.flip(bg_img,True,False)  # 横スクロール用の反転画像
-    score = Score()
-
-    bird = Bird(3, (900, 400))
-    bombs = pg.sprite.Group()
-    minbombs = pg.sprite.Group()
-    exps = pg.sprite.Group()
-    emys = pg.sprite.Group()
-    gravitys = pg.sprite.Group()
-    shots = pg.sprite.Group()
-    count = Time()
-    rank = Rank()
-
-    items = pg.sprite.Group()
-    hp = HP(bird)
-
-    mouse_pos=pg.mouse.get_pos()
-    
-    tmr = 0
-    slow_timer = 0
-    clock = pg.time.Clock()
 
-    
-    last_explosion_time = -100
-    EXP_COOLTIME = 15
-    rl=10
-    last_reload_time = 0
-    RELOAD_INTERVAL = 200
-    aim=Aim(pg.mouse.get_pos(),rl)
-
-    while True:
+class InputSource:
+    """
+    1フレームごとの入力（FrameInput）を作るものの基底クラス
+    イベントはGameがフレームごとに1回だけまとめて受け取り，handle()に順に渡す
+    """
+    needs_world = False  # read()でWorldの中身を見るかどうか（見るものは並列モードで使えない）
+
+    def reset(self) -> None:
+        """
+        ゲームを始めるときに呼ばれ，それまでに溜まった入力を捨てる
+        """
+
+    def handle(self, event: pg.event.Event) -> None:
+        """
+        イベントを1つ処理する
+        引数 event：pygameのイベント（INPUT_EVENTSのどれか）
+        """
+
+    def read(self, world: World) -> FrameInput:
+        """
+        このフレームの入力を返す（1フレームに1回だけ呼ぶ）
+        引数 world：入力を渡すWorld
+        戻り値：このフレームの入力
+        """
+        return IDLE_INPUT
+
+
+class KeyboardMouse(InputSource):
+    """
+    キーボードとマウスの入力
+    移動キーと左Shift（ダッシュ）は押されている間だけ有効
+    """
+    def __init__(self):
+        self.clicks = 0
+
+    def reset(self) -> None:
+        self.clicks = 0
+
+    def handle(self, event: pg.event.Event) -> None:
+        if event.type == pg.MOUSEBUTTONDOWN:
+            self.clicks += 1
+
+    def read(self, world: World) -> FrameInput:
         key_lst = pg.key.get_pressed()
-        mouse_pos=pg.mouse.get_pos()
-        
-        aim=Aim(mouse_pos,rl)
-        for event in pg.event.get():
-            if event.type == pg.QUIT:
-                return 0
-            
-            if event.type == pg.KEYDOWN and event.key == pg.K_LSHIFT:
-                bird.speed = 20
-                
-            else:
-                bird.speed = 10
-            
-            if event.type==pg.MOUSEBUTTONDOWN: #マウスがクリックされたら
-                if tmr-last_explosion_time >= EXP_COOLTIME: #クールタイム確認
-                    if rl >= 1:
-                        p = Point(pg.mouse.get_pos())
-                        shots.add(Shot(p, 10))
-                        last_explosion_time = tmr
-                        rl -= 1
-
-        if tmr - last_reload_time >= RELOAD_INTERVAL and rl < 10:
-            rl += 1
-            last_reload_time = tmr 
-
-        x = tmr % 3200  # xを0から3199の範囲で変化させる
-        screen.blit(bg_img, [-x, 0])  # 最初の背景画像（画面左端からスクロール量 -x の位置）
-        screen.blit(bg_img2, [-x + 1600 ,0])  # 2枚目の背景画像（1枚目の右端から開始）
-        screen.blit(bg_img, [-x + 3200, 0])  # 3枚目の背景画像（2枚目の右端から開始）
-        
-        gravitys.update()
-        gravitys.draw(screen)
-        if tmr < 250:
-            spawn_interval = 300  # 300フレームごとに敵出現
-        elif tmr < 750:
-            spawn_interval = 200  # 200フレームごとに敵出現
-        else:
-            spawn_interval = 150  # 150フレームごとに敵出現
-        if tmr % spawn_interval == 0:
-            emys.add(Enemy())
-        for emy in emys:
-            if  tmr%emy.interval == 0:
-                    #intervalに応じて爆弾投下
-                    minbombs.add(Minbomb(emy, bird))
-        
+        keys = frozenset(k for k in Bird.delta if key_lst[k])
+        inp = FrameInput(keys, pg.mouse.get_pos(), self.clicks, bool(key_lst[pg.K_LSHIFT]))
+        self.clicks = 0
+        return inp
 
-        if tmr >= 250 and tmr%50 == 0:  # 一定時間経過後に50フレームに1回，爆弾を出現させる
-            bombs.add(Bomb())
-        elif tmr >= 500 and tmr%25 == 0:  # 一定時間経過後に25フレームに1回，爆弾を出現させる
-            bombs.add(Bomb())
-        elif tmr >= 1500 and tmr%10 == 0:  # 一定時間経過後に25フレームに1回，爆弾を出現させる
-            bombs.add(Bomb())
-        if tmr >= 1000:
-            for bomb in bombs: #大きい爆弾から,追従する小さい爆弾を出現させる
-                if  tmr%bomb.interval == 0:
-                    #intervalに応じて爆弾投下
-                    minbombs.add(Minbomb(bomb, bird))
-        if tmr >= 1500:
-            for bomb in bombs: #大きい爆弾から,追従する小さい爆弾を出現させる
-                if  tmr%bomb.interval == 100:
-                    #intervalに応じて爆弾投下
-                    minbombs.add(Minbomb(bomb, bird))
-                    
-        # if tmr%200 == 0:  # 200フレームに1回，敵機を出現させる
-        #     emys.add(Enemy())
-
-        # for emy in emys:
-        #     if emy.state == "stop" and tmr%emy.interval == 0:
-        #         # 敵機が停止状態に入ったら，intervalに応じて爆弾投下
-        #         bombs.add(Bomb(emy, bird))
-
-        if tmr%250 == 0:  # 100フレームに1回，アイテムを出現させる
-            items.add(Item(hp))
-
-        if slow_timer != 0:
-            slow_timer -= 1
-            if len(emys) != 0:
-                for emy in emys:
-                    emy.slow_speed()
-
-
-        for emy in pg.sprite.groupcollide(emys, shots , True, False).keys():  # ビームと衝突した敵機リスト
-            exps.add(Explosion(emy, 100))  # 爆発エフェクト
-            score.value += 10  # 10点アップ
-
-
-        for bomb in pg.sprite.spritecollide(bird, bombs, True):  # こうかとんと衝突した爆弾リスト
-            # if bird.state != "hyper":  # 無敵状態でないならゲームオーバー
-            #     if bomb.state=="active":
-            # if bomb.state=="active":
-                if hp.value <= 1:  # HPが1以下ならゲームオーバー
-                    bird.change_img(8, screen)  # こうかとん悲しみエフェクト
-                    score.update(screen)
-                    # result = tmr // 60
-                    # print(result)
-
-                    gameover(screen, rank.get_rank(tmr))
-                    pg.display.update()
-                    time.sleep(2)
-                    return
-                else:  # HPが1より大きければHPが1減る
-                    hp.value -= 1
-                exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-                score.value += 1  # 1点アップ
-                #exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-
-        for minbomb in pg.sprite.spritecollide(bird, minbombs, True):  # こうかとんと衝突した爆弾リスト
-            # if bird.state != "hyper":  # 無敵状態でないならゲームオーバー
-            #     if bomb.state=="active":
-            if hp.value <= 1:  # HPが1以下ならゲームオーバー
-                bird.change_img(8, screen)  # こうかとん悲しみエフェクト
-                score.update(screen)
-                gameover(screen, rank.get_rank(tmr))
-                pg.display.update()
-                time.sleep(2)
-                return
-            else:  # HPが1より大きければHPが1減る
-                hp.value -= 1
-            exps.add(Explosion(minbomb, 50))  # 爆発エフェクト
-            score.value += 1  # 1点アップ
-        
-           
-        # if len(gravitys)>0:
-        #     for emy in emys:
-        #         exps.add(Explosion(emy,50))  # 爆発エフェクト
-        #         emy.kill()
-        #     for bomb in bombs:
-        #         exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-        #         bomb.kill()
-                #exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-
-        for bomb in pg.sprite.groupcollide(bombs, shots, True,False):#照準の接触判定
-            exps.add(Explosion(bomb,50))  # 爆発エフェクト
-            bomb.kill()
-        for minbomb in pg.sprite.groupcollide(minbombs, shots, True,False):#照準の接触判定
-            exps.add(Explosion(minbomb, 50))  # 爆発エフェクト
-            minbomb.kill()
-
-        # if len(gravitys)>0:
-        #     for emy in emys:
-        #         exps.add(Explosion(emy,50))  # 爆発エフェクト
-        #         emy.kill()
-        #     for bomb in bombs:
-        #         exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-        #         bomb.kill()
-        #         else:  # HPが1より大きければHPが1減る
-        #             hp.value -= 1
-        #     exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-        #     score.value += 1  # 1点アップ
-
-        #for item in pg.sprite.spritecollide(bird, items, True): # アイテムとの衝突判定
-        for item in pg.sprite.groupcollide(items, shots, True,False): # アイテムとの衝突判定
-            if item.num == 0:  # 0番のアイテム(キャンディ)を取るとHPが1回復
-                if hp.value < 10:
-                    hp.value += 1 
-            elif item.num == 1:  # 1番のアイテム(ストロベリー)を取ると画面上の敵を倒す
-                gravitys.add(Gravity(50))
-                if len(emys) != 0:
-                    for emy in emys:
-                        exps.add(Explosion(emy,50))  # 爆発エフェクト
-                        emy.kill()
-                if len(bombs) != 0:
-                    for bomb in bombs:
-                        exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-                        bomb.kill()
-                if len(minbombs) != 0:
-                    for minbomb in minbombs:
-                        minbomb.kill()
-            elif item.num == 2:  # 画面上の敵の減速
-                slow_timer = 200
-                rl += 5
-                # if len(emys) != 0:
-                #     for emy in emys:
-                #         emy.slow_speed()
-            else:  # 必要に応じて追加
+
+class Gamepad(InputSource):
+    """
+    pg.joystickのゲームパッドの入力
+    左スティックで移動，右スティックで照準を動かし，ボタン0で撃つ．ボタン1を押している間はダッシュ
+    """
+    deadzone = 0.3  # これより小さいスティックの傾きは無視する
+    aim_speed = 15  # スティックを倒しきったときの照準の移動量（ピクセル/フレーム）
+
+    def __init__(self, index: int = 0):
+        """
+        引数 index：使うゲームパッドの番号（つながっていなければつながったときに使う）
+        """
+        pg.joystick.init()
+        self.stick = pg.joystick.Joystick(index) if index < pg.joystick.get_count() else None
+        self.aim = [WIDTH//2, HEIGHT//2]
+        self.clicks = 0
+
+    def reset(self) -> None:
+        self.clicks = 0
+
+    def handle(self, event: pg.event.Event) -> None:
+        if event.type == pg.JOYBUTTONDOWN and event.button == 0:
+            self.clicks += 1
+        elif event.type == pg.JOYDEVICEADDED and self.stick is None:
+            self.stick = pg.joystick.Joystick(event.device_index)
+        elif (event.type == pg.JOYDEVICEREMOVED and self.stick is not None
+              and event.instance_id == self.stick.get_instance_id()):
+            self.stick = None
+
+    def read(self, world: World) -> FrameInput:
+        stick = self.stick
+        clicks, self.clicks = self.clicks, 0
+        if stick is None:
+            return FrameInput(frozenset(), tuple(self.aim), clicks, False)
+        dz = __class__.deadzone
+        x, y = stick.get_axis(0), stick.get_axis(1)
+        keys = frozenset(k for k, on in ((pg.K_a, x < -dz), (pg.K_d, x > dz),
+                                         (pg.K_w, y < -dz), (pg.K_s, y > dz)) if on)
+        if stick.get_numaxes() >= 4:
+            for i, axis in enumerate((stick.get_axis(2), stick.get_axis(3))):
+                if abs(axis) > dz:
+                    limit = (WIDTH, HEIGHT)[i]
+                    self.aim[i] = min(max(self.aim[i] + int(axis*__class__.aim_speed), 0), limit)
+        sprint = stick.get_numbuttons() > 1 and stick.get_button(1)
+        return FrameInput(keys, tuple(self.aim), clicks, bool(sprint))
+
+
+class Scripted(InputSource):
+    """
+    Worldを見て入力を決める関数（ボットなど）による入力
+    """
+    needs_world = True
+
+    def __init__(self, policy: Callable[[World], FrameInput]):
+        """
+        引数 policy：Worldから次の入力を決める関数
+        """
+        self.policy = policy
+
+    def read(self, world: World) -> FrameInput:
+        return self.policy(world)
+
+    @staticmethod
+    def from_file(path: str) -> "Scripted":
+        """
+        Pythonファイルに書いたpolicy関数で操作する入力を作る
+        引数 path：policy(world)（Worldを受け取ってFrameInputを返す関数）を定義したファイルのパス
+        戻り値：その関数による入力
+        """
+        policy = runpy.run_path(path).get("policy")
+        if not callable(policy):
+            raise ValueError(f"{path} does not define policy(world)")
+        return Scripted(policy)
+
+
+class ReplaySource(InputSource):
+    """
+    リプレイファイルに記録された入力（ゲームを始めるたびに最初から）
+    記録が終わった後は何も操作しない
+    """
+    def __init__(self, replay: Replay):
+        """
+        引数 replay：読み込んだリプレイ
+        """
+        self.replay = replay
+        self.reset()
+
+    def reset(self) -> None:
+        self.inputs = self.replay.inputs()
+
+    def read(self, world: World) -> FrameInput:
+        return next(self.inputs, IDLE_INPUT)
+
+
+# 並列モード：ワーカープロセスがゲームを進め，メインプロセスは共有メモリに書かれた状態を描く
+_PIPE_STEP, _PIPE_RESET, _PIPE_HASH, _PIPE_QUIT = range(4)  # ワーカーへの命令
+_PIPE_INPUT = np.dtype([("seed", "<i8"), ("cmd", "<i4"), ("keys", "<i4"),
+                        ("mx", "<i4"), ("my", "<i4"), ("clicks", "<i4")], align=True)  # 命令と1フレーム分の入力
+_PIPE_HEADER = np.dtype([("tmr", "<i8"), ("score", "<i8"), ("hp", "<i8"), ("rl", "<i8"), ("over", "<i8"),
+                         ("count", "<i8"), ("live", "<i8", (len(ENTITY_CAPS),)),
+                         ("hashed", "<i8"), ("digest", "u1", (32,))])  # HUDの値と描くスプライトの数
+_PIPE_SPRITE = np.dtype([("image", "<i4"), ("x", "<f4"), ("y", "<f4"),
+                         ("px", "<f4"), ("py", "<f4")])  # 画像の番号，左上の座標，1つ前のフレームの左上の座標
+_PIPE_DRAWN = ("emys", "bombs", "minbombs", "exps", "items")  # こうかとんの後に描くグループの順
+
+
+def render_images() -> list[tuple[pg.Surface, int]]:
+    """
+    ゲーム中に描く全ての画像を，blitのspecial_flagsと組にして決まった順に並べて返す
+    （並列モードでは画像をこの並びの番号で受け渡す）
+    どちらのプロセスでも同じ順になるように，シートのキー，爆弾の(色, 半径)，エフェクトのコマの順に並べる
+    """
+    images = [sheet.get(key) for sheet in (BIRD_SHEET, ENEMY_SHEET, ITEM_SHEET) for key in sheet.specs]
+    images += [BOMB_ATLAS.get(color, rad)
+               for color in Bomb.colors.values() for rad in range(Bomb.min_rad, Bomb.max_rad+1)]
+    images.append(BOMB_ATLAS.get(Minbomb.color_rgb, Minbomb.rad))
+    EFFECT_ATLAS.build()
+    return [(img, 0) for img in images] + list(zip(EFFECT_ATLAS.frames, EFFECT_ATLAS.flags))
+
+
+def _render_parts(world: World, ids: dict[int, int], fx_base: int):
+    """
+    Worldの描くもの（こうかとん，_PIPE_DRAWNのグループ）を描く順に，
+    (画像の番号，左上のx座標，y座標，1つ前のフレームの左上のx座標，y座標)の列の組で返すジェネレータ
+    引数1 world：描くWorld
+    引数2 ids：画像のid()からrender_images()での番号への辞書
+    引数3 fx_base：render_images()でのエフェクトの最初のコマの番号
+    """
+    bird = world.bird
+    yield [ids[id(bird.image)]], [bird.rect.x], [bird.rect.y], [bird.prev[0]], [bird.prev[1]]
+    emys = world.emys
+    idx = emys.indices()
+    y = emys.y[idx]
+    yield [ids[id(emys.images[i])] for i in idx.tolist()], emys.x[idx], y, emys.px[idx], y
+    for pool in (world.bombs, world.minbombs):
+        idx = pool.indices()
+        rad = pool.rad[idx]
+        yield ([ids[id(pool.images[i])] for i in idx.tolist()], pool.x[idx] - rad, pool.y[idx] - rad,
+               pool.px[idx] - rad, pool.py[idx] - rad)
+    frame, x, y, px, py = world.exps.sprites()
+    yield frame + fx_base, x, y, px, py
+    sprites = world.items.sprites()
+    yield ([ids[id(s.image)] for s in sprites], [s.rect.x for s in sprites], [s.rect.y for s in sprites],
+           [s.prev[0] for s in sprites], [s.prev[1] for s in sprites])
+
+
+class _PipelineBuffers:
+    """
+    並列モードの共有メモリを，命令と入力の欄と，2つのフレームのバッファ（ヘッダとスプライトの配列）として見るクラス
+    どちらのプロセスも同じ並びで見るので，1フレームごとのやり取りでpickleを使わない
+    """
+    def __init__(self, buf: memoryview, capacity: int):
+        """
+        引数1 buf：共有メモリ
+        引数2 capacity：1フレームに書き込めるスプライトの数
+        """
+        self.inbox = np.ndarray((), _PIPE_INPUT, buf, 0)
+        offset = _PIPE_INPUT.itemsize
+        self.headers, self.sprites = [], []
+        for _ in range(2):
+            self.headers.append(np.ndarray((), _PIPE_HEADER, buf, offset))
+            offset += _PIPE_HEADER.itemsize
+            self.sprites.append(np.ndarray(capacity, _PIPE_SPRITE, buf, offset))
+            offset += capacity * _PIPE_SPRITE.itemsize
+
+    @staticmethod
+    def size(capacity: int) -> int:
+        """
+        共有メモリに要るバイト数を返す
+        引数 capacity：1フレームに書き込めるスプライトの数
+        """
+        return _PIPE_INPUT.itemsize + 2 * (_PIPE_HEADER.itemsize + capacity * _PIPE_SPRITE.itemsize)
+
+    def put_input(self, cmd: int, inp: FrameInput = IDLE_INPUT, seed: int = 0) -> None:
+        """
+        ワーカーへの命令と入力を書き込む
+        """
+        inbox = self.inbox
+        inbox["cmd"], inbox["seed"], inbox["keys"] = cmd, seed, pack_keys(inp)
+        inbox["mx"], inbox["my"], inbox["clicks"] = inp.mouse[0], inp.mouse[1], inp.clicks
+
+    def get_input(self) -> FrameInput:
+        """
+        put_input()で書き込まれた入力を返す
+        """
+        inbox = self.inbox
+        keys, sprint = unpack_keys(int(inbox["keys"]))
+        return FrameInput(keys, (int(inbox["mx"]), int(inbox["my"])), int(inbox["clicks"]), sprint)
+
+    def put_frame(self, b: int, world: World, ids: dict[int, int], fx_base: int, hashed: bool) -> None:
+        """
+        Worldの描画に要る状態をバッファに書き込む（書ききれないスプライトは描かない）
+        引数1 b：バッファの番号（0か1）
+        引数2 world：書き込むWorld
+        引数3 ids：画像のid()からrender_images()での番号への辞書
+        引数4 fx_base：render_images()でのエフェクトの最初のコマの番号
+        引数5 hashed：状態のハッシュ値も書き込むかどうか（ゲームオーバーのときは必ず書く）
+        """
+        rec = self.sprites[b]
+        n = 0
+        for image, x, y, px, py in _render_parts(world, ids, fx_base):
+            k = min(len(image), len(rec) - n)
+            part = rec[n:n+k]
+            part["image"], part["x"], part["y"], part["px"], part["py"] = image[:k], x[:k], y[:k], px[:k], py[:k]
+            n += k
+        h = self.headers[b]
+        h["tmr"], h["score"], h["hp"], h["rl"], h["over"] = world.tmr, world.score, world.hp, world.rl, world.over
+        h["count"] = n
+        h["live"] = [len(getattr(world, name)) for name in ENTITY_CAPS]
+        h["hashed"] = hashed or world.over
+        if h["hashed"]:
+            h["digest"] = np.frombuffer(bytes.fromhex(world.state_hash()), dtype=np.uint8)
+
+
+def _pipeline_worker(name: str, capacity: int, go, ready, free) -> None:
+    """
+    並列モードのワーカープロセスで動く関数
+    Worldを持ち，命令が来るたびにゲームを1フレーム進め（またはやり直し），
+    描画に要る状態を共有メモリの2つのバッファに交互に書き込む
+    引数1 name：共有メモリの名前
+    引数2 capacity：1フレームに書き込めるスプライトの数
+    引数3 go：命令が書き込まれたことを知らせるセマフォ
+    引数4 ready：バッファを書き終えたことを知らせるセマフォ
+    引数5 free：バッファごとの，メインプロセスが読み終えたことを知らせるセマフォ
+    """
+    shm = shared_memory.SharedMemory(name)
+    buffers = _PipelineBuffers(shm.buf, capacity)
+    images = render_images()
+    ids = {id(img): n for n, (img, _) in enumerate(images)}
+    fx_base = len(images) - len(EFFECT_ATLAS.frames)
+    world = None
+    written = 0  # 書き込んだフレームの数（次に書くバッファはwritten % 2）
+    try:
+        while True:
+            go.acquire()
+            cmd = int(buffers.inbox["cmd"])
+            if cmd == _PIPE_QUIT:
+                break
+            if cmd == _PIPE_RESET:
+                seed = int(buffers.inbox["seed"])
+                if world is None:
+                    world = World(seed)
+                else:
+                    world.reset(seed)
+            elif cmd == _PIPE_STEP:
+                world.step(buffers.get_input())
+            b = written % 2
+            free[b].acquire()
+            buffers.put_frame(b, world, ids, fx_base, cmd == _PIPE_HASH)
+            written += 1
+            ready.release()
+    finally:
+        del buffers  # 共有メモリを指す配列を消してから閉じる
+        shm.close()
+
+
+class PipelinedWorld:
+    """
+    並列モードのWorld：ゲームはワーカープロセスのWorldで進め，描画に要る状態を共有メモリから読む
+    Worldと同じ名前の属性とメソッド（tmr, score, hp, rl, over, seed, rank(), step(), reset()など）を持つ
+    step()は入力を渡すだけで進め終わるのを待たないので，ワーカーが次のフレームを進めている間に
+    メインプロセスは1つ前のフレームを描ける．sync()で次のフレームが書き終わるのを待つ
+    入力は同じ順にWorld.step()に渡るので，同じシードと入力なら1つのプロセスのときと同じ結果になる
+    """
+    poll = 0.1  # ワーカーが終了していないか確かめる間隔（秒）
+
+    def __init__(self, seed: int | None = None):
+        """
+        引数 seed：乱数のシード（Noneならランダム）
+        """
+        ctx = multiprocessing.get_context("spawn")  # SDLを初期化したプロセスをforkしない
+        capacity = 1 + sum(ENTITY_CAPS[name] for name in _PIPE_DRAWN)
+        self.shm = shared_memory.SharedMemory(create=True, size=_PipelineBuffers.size(capacity))
+        self.buffers = _PipelineBuffers(self.shm.buf, capacity)
+        self.go = ctx.Semaphore(0)
+        self.ready = ctx.Semaphore(0)
+        self.free = (ctx.Semaphore(1), ctx.Semaphore(1))
+        self.process = ctx.Process(target=_pipeline_worker, name="world", daemon=True,
+                                   args=(self.shm.name, capacity, self.go, self.ready, self.free))
+        self.images = render_images()  # 画像の番号からこのプロセスの（ディスプレイ形式の）画像と合成方法へ
+        self.read = 0  # 読んだフレームの数
+        self.shown: int | None = None  # 今読んでいるバッファの番号
+        self.pending = False  # 命令を送って，まだ結果を読んでいないかどうか
+        self.over = False
+        try:
+            self.process.start()
+            self.reset(seed)
+        except BaseException:
+            self.close()
+            raise
+
+    def _send(self, cmd: int, inp: FrameInput = IDLE_INPUT, seed: int = 0) -> None:
+        self.buffers.put_input(cmd, inp, seed)
+        self.pending = True
+        self.go.release()
+
+    def sync(self) -> None:
+        """
+        送った命令の結果（次のフレーム）が書き終わるのを待ち，そのバッファを読む
+        読み終えたバッファはワーカーに返す
+        """
+        if not self.pending:
+            return
+        while not self.ready.acquire(timeout=__class__.poll):
+            if not self.process.is_alive():
+                raise RuntimeError(f"world worker exited with code {self.process.exitcode}")
+        if self.shown is not None:
+            self.free[self.shown].release()
+        self.shown = self.read % 2
+        self.read += 1
+        self.pending = False
+        h = self.buffers.headers[self.shown]
+        self.tmr, self.score, self.hp, self.rl = int(h["tmr"]), int(h["score"]), int(h["hp"]), int(h["rl"])
+        self.over = bool(h["over"])
+        self.live = dict(zip(ENTITY_CAPS, h["live"].tolist()))
+        self.gravitys = self.live["gravitys"]
+        self.digest = bytes(h["digest"]).hex() if h["hashed"] else None
+
+    def reset(self, seed: int | None = None) -> None:
+        """
+        ゲームを最初の状態に戻す（Worldのreset()と同じ）
+        引数 seed：乱数のシード（Noneならランダムに決める）
+        """
+        if seed is None:
+            seed = random.getrandbits(32)
+        self.seed = seed
+        self.sync()
+        self._send(_PIPE_RESET, seed=seed)
+        self.sync()
+
+    def step(self, inp: FrameInput) -> None:
+        """
+        入力をワーカーに渡してゲームを1フレーム進め始める（進め終わるのは待たない）
+        引数 inp：このフレームの入力
+        """
+        self.sync()
+        if not self.over:
+            self._send(_PIPE_STEP, inp)
+
+    def rank(self) -> str:
+        return Rank.get_rank(self.tmr)
+
+    def state_hash(self) -> str:
+        """
+        ワーカーのWorldの状態のハッシュ値を返す（送った入力を全て進め終わった後の値）
+        """
+        self.sync()
+        if self.digest is None:
+            self._send(_PIPE_HASH)
+            self.sync()
+        return self.digest
+
+    def live_counts(self) -> dict[str, int]:
+        return self.live
+
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        return {}  # 使い回しの状況はワーカーのWorldにしかない
+
+    def sprites(self) -> np.ndarray:
+        """
+        今読んでいるフレームの描くスプライト（_PIPE_SPRITEの配列．次のsync()まで有効）を返す
+        """
+        h = self.buffers.headers[self.shown]
+        return self.buffers.sprites[self.shown][:int(h["count"])]
+
+    def close(self) -> None:
+        """
+        ワーカーを終了させて共有メモリを解放する（最後に読んだHUDの値などは残る）
+        """
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            try:
+                self.sync()
+                self._send(_PIPE_QUIT)
+            except RuntimeError:
                 pass
-            item.get_item()
+            self.process.join(timeout=1)
+            if self.process.is_alive():
+                self.process.terminate()
+        self.process = None
+        self.buffers = None
+        self.shm.close()
+        self.shm.unlink()
+
+    @staticmethod
+    def unavailable(source: InputSource) -> str | None:
+        """
+        並列モードを使えない理由を返す（使えるならNone）
+        引数 source：プレイ中の入力
+        """
+        if (os.cpu_count() or 1) < 2:
+            return "only one CPU"
+        if source.needs_world:
+            return "the input reads the World"
+        return None
 
-    
-        # if len(gravitys)>0:
-        #     for emy in emys:
-        #         exps.add(Explosion(emy,50))  # 爆発エフェクト
-        #         emy.kill()
-        #     for bomb in bombs:
-        #         exps.add(Explosion(bomb, 50))  # 爆発エフェクト
-        #         bomb.kill()
-
-            
-        
 
-        bird.update(key_lst, screen)
-        emys.update()
-        emys.draw(screen)
-        bombs.update()
-        bombs.draw(screen)
-        minbombs.update()
-        minbombs.draw(screen)
-        exps.update()
-        exps.draw(screen)
-        score.update(screen)
-        count.update(screen, tmr)
-        rank.update(screen,tmr)
-        shots.update()
-        shots.draw(screen)
-        hp.update(screen)
-        items.update()
-        items.draw(screen)
-        aim.update(screen)
-        
+class Background:
+    """
+    横スクロールする背景に関するクラス
+    奥から順にレイヤーを重ね，レイヤーごとに違う速さで動かせる（多重スクロール）
+    """
+    def __init__(self, speed: float = 1, layers: list[BackgroundLayer] | None = None):
+        """
+        引数1 speed：1フレームあたりのスクロール量（layersを省略したときの月面の背景の速さ）
+        引数2 layers：奥から順に並べた背景レイヤー（Noneなら月面の背景1枚）
+        """
+        if layers is None:
+            layers = [BackgroundLayer("fig/bg_moon_getsumen.jpg", speed)]
+        self.layers = layers
+
+    @property
+    def speed(self) -> float:
+        """
+        一番速いレイヤーの1フレームあたりのスクロール量（0なら背景は動かない）
+        """
+        return max((abs(layer.speed) for layer in self.layers), default=0)
+
+    def stop(self) -> None:
+        """
+        全てのレイヤーのスクロールを止める
+        """
+        for layer in self.layers:
+            layer.speed = 0
+
+    def scroll(self, tmr: int) -> bool:
+        """
+        経過フレーム数から各レイヤーのスクロール量を決める
+        引数 tmr：経過フレーム数
+        戻り値：どれかのレイヤーのスクロール量が前回から変わったかどうか
+        """
+        moved = False
+        for layer in self.layers:
+            moved = layer.scroll(tmr) or moved
+        return moved
+
+    def draw(self, screen: pg.Surface, rect: pg.Rect | None = None) -> None:
+        """
+        背景を画面に転送する
+        引数1 screen：画面Surface
+        引数2 rect：この矩形の中だけを描き直す（Noneなら画面全体）
+        """
+        screen.set_clip(rect)
+        for layer in self.layers:
+            layer.draw(screen)
+        screen.set_clip(None)
+
+
+def lerp_pos(sprite: pg.sprite.Sprite, alpha: float) -> tuple[int, int]:
+    """
+    スプライトの1つ前のフレームの位置（prev）と今の位置の間を補間した左上の座標を返す
+    引数1 sprite：prevを持つスプライト
+    引数2 alpha：0なら1つ前のフレームの位置，1なら今の位置
+    """
+    (x0, y0), (x1, y1) = sprite.prev, sprite.rect.topleft
+    return round(x0 + (x1-x0)*alpha), round(y0 + (y1-y0)*alpha)
+
+
+class Renderer:
+    """
+    1フレーム分の描画と画面更新を担うクラス
+    dirty=Trueなら前フレームと今フレームで描いた矩形だけをディスプレイに送り，
+    Falseなら毎フレーム画面全体を送る．背景がスクロールすると画面の全てのピクセルが変わり
+    送る量が減らないので，dirtyのときは背景を止める
+    """
+    def __init__(self, screen: pg.Surface, background: Background, dirty: bool = False):
+        """
+        引数1 screen：画面Surface
+        引数2 background：背景レイヤー
+        引数3 dirty：変化した矩形だけを画面更新するかどうか（Trueなら背景のスクロールを止める）
+        """
+        self.screen = screen
+        self.background = background
+        self.dirty = dirty
+        self.screen_rect = screen.get_rect()
+        self.rects: list[pg.Rect] = []  # 今フレームで描いた矩形
+        self.prev_rects: list[pg.Rect] = []  # 前フレームで描いた矩形
+        self.full = True  # 画面全体を送る必要があるかどうか
+        self.pixels = 0  # 直前のフレームで送ったピクセル数
+        self.pixels_total = 0
+        self.frames = 0
+        if dirty:
+            background.stop()
+
+    def begin(self, tmr: int) -> None:
+        """
+        背景を描いてフレームを始める．
+        背景が動かなければ前フレームでスプライトを描いた所だけ背景で消す
+        引数 tmr：経過フレーム数
+        """
+        if self.background.scroll(tmr) or not self.dirty:
+            self.full = True
+        if self.full:
+            self.background.draw(self.screen)
+        else:
+            for rect in self.prev_rects:
+                self.background.draw(self.screen, rect)
+
+    def track(self, rects: "pg.Rect|list[pg.Rect]") -> None:
+        """
+        描画した矩形を今フレームの更新対象に加える
+        引数 rects：矩形または矩形のリスト
+        """
+        if isinstance(rects, pg.Rect):
+            self.rects.append(rects)
+        else:
+            self.rects.extend(rects)
+
+    def blit(self, img: pg.Surface, pos: "pg.Rect|tuple[int, int]") -> None:
+        """
+        Surfaceを画面に転送し，描いた矩形を記録する
+        引数1 img：転送するSurface
+        引数2 pos：転送先の位置
+        """
+        self.rects.append(self.screen.blit(img, pos))
+
+    def draw_group(self, group: pg.sprite.Group) -> None:
+        """
+        スプライトグループを描画し，描いた矩形を記録する
+        引数 group：描画するグループ
+        """
+        group.draw(self.screen)
+        self.rects.extend(group.spritedict.values())
+
+    def draw_moving(self, group: pg.sprite.AbstractGroup, alpha: float) -> None:
+        """
+        動くスプライト（prevに1つ前のフレームの位置を持つ）を補間した位置に描画し，描いた矩形を記録する
+        引数1 group：描画するグループ
+        引数2 alpha：1つ前のフレームの位置（0）から今の位置（1）までのどこに描くか
+        """
+        if alpha >= 1:
+            self.draw_group(group)
+            return
+        self.rects.extend(self.screen.blits([(s.image, lerp_pos(s, alpha)) for s in group]))
+
+    def draw_pool(self, pool: "ProjectilePool|EnemyPool|EffectPool", alpha: float = 1.0) -> None:
+        """
+        ProjectilePoolの爆弾やEnemyPoolの敵機，EffectPoolの爆発エフェクトを描画し，dirtyモードなら描いた矩形を記録する
+        引数1 pool：描画するProjectilePoolかEnemyPool
+        引数2 alpha：1つ前のフレームの位置（0）から今の位置（1）までのどこに描くか
+        """
+        rects = pool.draw(self.screen, self.dirty, alpha)
+        if self.dirty:
+            self.rects.extend(rects)
+
+    def draw_world(self, world: "World", alpha: float = 1.0) -> None:
+        """
+        Worldのスプライトと爆弾を描画する（HUDは含まない）
+        引数1 world：描画するWorld
+        引数2 alpha：1つ前のフレームから今のフレームまでのどこを描くか（1なら今のフレームそのもの）
+        """
+        if world.gravitys:  # 重力場の発動中は画面全体を暗くする
+            self.track(SCREEN_FX.dim(self.screen, Gravity.dim, len(world.gravitys)))
+        bird = world.bird
+        self.blit(bird.image, bird.rect if alpha >= 1 else lerp_pos(bird, alpha))
+        self.draw_pool(world.emys, alpha)
+        self.draw_pool(world.bombs, alpha)
+        self.draw_pool(world.minbombs, alpha)
+        self.draw_pool(world.exps, alpha)
+        self.draw_moving(world.items, alpha)
+
+    def draw_shared(self, world: PipelinedWorld, alpha: float = 1.0) -> None:
+        """
+        並列モードのWorldの，共有メモリから読んだスプライトをSurface.blitsでまとめて描画する（HUDは含まない）
+        引数1 world：描画するPipelinedWorld
+        引数2 alpha：1つ前のフレームから今のフレームまでのどこを描くか（1なら今のフレームそのもの）
+        """
+        if world.gravitys:  # 重力場の発動中は画面全体を暗くする
+            self.track(SCREEN_FX.dim(self.screen, Gravity.dim, world.gravitys))
+        rec = world.sprites()
+        x, y = rec["x"], rec["y"]
+        if alpha < 1:
+            px, py = rec["px"], rec["py"]
+            x = px + (x - px) * alpha
+            y = py + (y - py) * alpha
+        left = np.floor(x).astype(int).tolist()
+        top = np.floor(y).astype(int).tolist()
+        images = world.images
+        rects = self.screen.blits([(images[i][0], (l, t), None, images[i][1])
+                                   for i, l, t in zip(rec["image"].tolist(), left, top)], self.dirty)
+        if self.dirty:
+            self.rects.extend(rects)
+
+    def end(self) -> None:
+        """
+        今フレームで変化した部分をディスプレイに送る
+        """
+        if self.full:
+            pg.display.update()
+            self.pixels = self.screen_rect.width * self.screen_rect.height
+        else:
+            rects = [r.clip(self.screen_rect) for r in self.prev_rects + self.rects]
+            pg.display.update(rects)
+            self.pixels = sum(r.width * r.height for r in rects)
+        self.pixels_total += self.pixels
+        self.frames += 1
+        self.prev_rects = self.rects
+        self.rects = []
+        self.full = False
+
+
+class Scene:
+    """
+    画面の状態（タイトル・プレイ中・ゲームオーバー）の基底クラス
+    メインループは毎フレーム，イベントをhandle()に渡し，経った時間の分だけ（60Hzで）update()を呼んでから
+    draw()を呼ぶ．どの状態でもイベントを処理し続けるので，待っている間もウィンドウが固まらない
+    """
+    def __init__(self, game: "Game"):
+        """
+        引数 game：画面・World・HUDを持つGame
+        """
+        self.game = game
+
+    def enter(self) -> None:
+        """
+        この状態に切り替わったときに1回呼ばれる
+        """
+
+    def handle(self, event: pg.event.Event) -> None:
+        """
+        イベントを1つ処理する
+        引数 event：pygameのイベント
+        """
+
+    def update(self) -> "Scene|None":
+        """
+        ゲームの時間を1フレーム（Game.step_ms）進める
+        戻り値：次の状態（切り替えないならNone）
+        """
+        return None
+
+    def draw(self, alpha: float) -> None:
+        """
+        画面を描画する
+        引数 alpha：最後のupdate()から次のupdate()までのどこを描くか（0～1）
+        """
+
+
+class Title(Scene):
+    """
+    タイトル画面：クリックかスペース・エンターキーでゲームを始める
+    """
+    def enter(self) -> None:
+        self.tmr = 0
+        self.start = False
+        self.game.renderer.full = True
+
+    def handle(self, event: pg.event.Event) -> None:
+        if is_start_event(event):
+            self.start = True
+
+    def update(self) -> "Scene|None":
+        if self.start:
+            return self.game.restart()
+        self.tmr += 1
+        return None
+
+    def draw(self, alpha: float) -> None:
+        game = self.game
+        renderer = game.renderer
+        renderer.begin(self.tmr - 1 + alpha)
+        for size, text, y in ((80, "Shooting Game", HEIGHT//2-60), (40, "Click to start", HEIGHT//2+40)):
+            img = TEXT_CACHE.render(size, text, (255, 255, 255))
+            renderer.blit(img, img.get_rect(center=(WIDTH//2, y)))
+        renderer.end()
+        if game.first_frame_ms is None:
+            game.first_frame_ms = (time.perf_counter() - game.started) * 1000
+            ASSETS.drop_pending()  # 起動までに使わなかった画像は読まない
+
+
+class Playing(Scene):
+    """
+    プレイ中：入力をWorldに渡してゲームを進め，描画する
+    """
+    def enter(self) -> None:
+        self.game.source.reset()  # タイトル画面などでのクリックを持ち越さない
+        self.game.renderer.full = True
+
+    def update(self) -> "Scene|None":
+        game = self.game
+        world = game.world
+        world.sync()  # 並列モードでは前のフレームを進め終わるのを待つ
+        if world.over:
+            return GameOver(game)
+        inp = game.source.read(world)
+        if game.recorder is not None:
+            game.recorder.record(inp)
+        with PROFILER.scope("step"):
+            world.step(inp)
+        game.mouse = inp.mouse
+        if world.over:
+            return GameOver(game)
+        return None
+
+    def draw(self, alpha: float) -> None:
+        self.game.draw_playing(alpha)
+        with PROFILER.scope("display"):
+            self.game.renderer.end()
+
+
+class GameOver(Scene):
+    """
+    ゲームオーバー画面：最後の場面にゲームオーバーの絵を重ねて表示し続ける
+    少し経ったらクリックかスペース・エンターキーで次のゲームを始め，放っておくとタイトルに戻る
+    """
+    lock = 60  # 操作を受け付けないフレーム数（連打で次のゲームが始まらないように）
+    timeout = 60*7  # タイトルに戻るまでのフレーム数
+
+    def enter(self) -> None:
+        self.tmr = 0
+        self.restart = False
+        self.game.stop_recording()
+        renderer = self.game.renderer
+        self.game.draw_playing(1.0)  # 最後のフレームの上に重ねる
+        SCREEN_FX.gameover(renderer.screen, self.game.world.rank())
         pg.display.update()
-        tmr += 1
-        clock.tick(60)
-        
+        renderer.rects = []
+        renderer.full = True
+
+    def handle(self, event: pg.event.Event) -> None:
+        if self.tmr >= __class__.lock and is_start_event(event):
+            self.restart = True
+
+    def update(self) -> "Scene|None":
+        if self.restart:
+            return self.game.restart()
+        self.tmr += 1
+        if self.tmr >= __class__.timeout:
+            return Title(self.game)
+        return None
+
+
+class Game:
+    """
+    画面・Renderer・World・HUDを1つずつ持ち，状態（Scene）を切り替えながらメインループを回すクラス
+    次のゲームはWorld.reset()で始めるので，画像の読み込みやpygameの初期化をやり直さない．
+    WorldとHUDは最初のゲームを始めるときに作る（タイトル画面の表示を待たせないため）
+    ゲームの時間は画面の更新とは別に，経った時間を溜めて60Hzの固定ステップで進める．
+    画面は何Hzで更新してもよく，ステップの間は1つ前のフレームとの間を補間して描く
+    """
+    step_ms = 1000 / 60  # ゲームの1フレーム（update()1回）の時間
+    max_steps = 5  # 1回の描画までに進める最大のフレーム数（超えた分は捨てて，処理落ちとして数える）
+    def __init__(self, screen: pg.Surface, renderer: Renderer, seed: int | None = None,
+                 record: str | None = None, started: float | None = None,
+                 source: InputSource | None = None, pipeline: bool = False):
+        """
+        引数1 screen：画面Surface
+        引数2 renderer：描画を担うRenderer
+        引数3 seed：乱数のシード（Noneならゲームごとにランダム）
+        引数4 record：入力を記録するリプレイファイルのパス（2ゲーム目からは名前の後ろに-2, -3…を付ける）
+        引数5 started：起動を始めたperf_counter()の値（最初のフレームまでの時間を測る）
+        引数6 source：プレイ中の入力（Noneならキーボードとマウス）
+        引数7 pipeline：ゲームを別プロセスで進める並列モードにするかどうか（使えなければ1つのプロセスで動かす）
+        """
+        self.screen = screen
+        self.renderer = renderer
+        self.source = source if source is not None else KeyboardMouse()
+        self.seed = seed
+        self.record = record
+        self.recorder: ReplayRecorder | None = None
+        self.pipeline = pipeline
+        self.world: World | PipelinedWorld | None = None
+        self.rounds = 0  # 始めたゲームの数
+        self.restart_ms = 0.0  # 直前のゲームを始めるのにかかった時間
+        self.started = started if started is not None else time.perf_counter()
+        self.first_frame_ms: float | None = None  # 起動から最初のフレームを表示するまでの時間
+        self.mouse = (0, 0)  # 最後のフレームの照準の位置
+        self.steps = 0  # 進めたゲームのフレーム数
+        self.draws = 0  # 描画した回数
+        self.overloads = 0  # 処理が追いつかずにゲームの時間を捨てた回数
+        self.dropped = 0  # 捨てたゲームのフレーム数
+        self.logic_ns = 0  # update()にかかった合計時間
+        self.render_ns = 0  # draw()にかかった合計時間
+
+    def restart(self) -> Scene:
+        """
+        Worldを最初の状態に戻して次のゲームを始める
+        戻り値：プレイ中の状態
+        """
+        start = time.perf_counter()
+        self.stop_recording()
+        if self.world is None:
+            BOMB_ATLAS.build()
+            EFFECT_ATLAS.build()
+            self.world = self.new_world()
+            self.score = Score()
+            self.count = Time()
+            self.rank = Rank()
+            self.hp = HP(self.world.hp)
+            self.aim = Aim(pg.mouse.get_pos(), self.world.rl)
+        else:
+            self.world.reset(self.seed)
+        self.mouse = pg.mouse.get_pos()
+        self.rounds += 1
+        if self.record is not None:
+            root, ext = os.path.splitext(self.record)
+            path = self.record if self.rounds == 1 else f"{root}-{self.rounds}{ext}"
+            self.recorder = ReplayRecorder(path, self.world.seed)
+        self.restart_ms = (time.perf_counter() - start) * 1000
+        return Playing(self)
+
+    def new_world(self) -> World | PipelinedWorld:
+        """
+        最初のゲームのWorldを作る．並列モードを使えないとき（CPUが1つ，入力がWorldを見る，
+        ワーカーを起動できない）は1つのプロセスで動くWorldにする（同じシードと入力なら結果は同じ）
+        """
+        if self.pipeline:
+            reason = PipelinedWorld.unavailable(self.source)
+            if reason is None:
+                try:
+                    return PipelinedWorld(self.seed)
+                except (OSError, RuntimeError) as e:
+                    reason = str(e)
+            print(f"pipeline: {reason}, running in one process", file=sys.stderr)
+        return World(self.seed)
+
+    def draw_playing(self, alpha: float) -> None:
+        """
+        プレイ中の画面（World，HUD，プロファイラのグラフ）を描く（ディスプレイには送らない）
+        引数 alpha：1つ前のフレームから今のフレームまでのどこを描くか
+        """
+        world = self.world
+        renderer = self.renderer
+        screen = renderer.screen
+        with PROFILER.scope("draw"):
+            renderer.begin(world.tmr - 1 + alpha)
+            if isinstance(world, PipelinedWorld):
+                renderer.draw_shared(world, alpha)
+            else:
+                renderer.draw_world(world, alpha)
+        with PROFILER.scope("hud"):
+            self.score.value = world.score
+            renderer.track(self.score.update(screen))
+            renderer.track(self.count.update(screen, world.tmr))
+            renderer.track(self.rank.update(screen, world.tmr))
+            self.hp.value = world.hp
+            renderer.track(self.hp.update(screen))
+            self.aim.set(self.mouse, world.rl)
+            renderer.track(self.aim.update(screen))
+            overlay = PROFILER.draw_overlay(screen)
+            if overlay is not None:
+                renderer.track(overlay)
+
+    def timing(self) -> dict[str, float]:
+        """
+        ゲームの時間の進め方と，ゲームの処理・描画それぞれにかかった平均時間（ミリ秒）を返す
+        """
+        return {"steps": self.steps, "draws": self.draws, "overloads": self.overloads,
+                "dropped_steps": self.dropped,
+                "logic_ms_per_step": round(self.logic_ns / max(self.steps, 1) / 1e6, 3),
+                "render_ms_per_draw": round(self.render_ns / max(self.draws, 1) / 1e6, 3)}
+
+    def stop_recording(self) -> None:
+        """
+        記録中のリプレイがあれば閉じる
+        """
+        if self.recorder is not None:
+            self.recorder.close(self.world)
+            self.recorder = None
+
+    def run(self, scene: Scene, fps: int = 60) -> int:
+        """
+        ウィンドウが閉じられるまでメインループを回す
+        引数1 scene：最初の状態
+        引数2 fps：画面を更新する最大の頻度（0なら制限しない）．ゲームの進む速さはこれに依らない
+        戻り値：終了コード
+        """
+        clock = pg.time.Clock()
+        step_ns = int(__class__.step_ms * 1e6)
+        acc = 0  # まだ進めていないゲームの時間（ナノ秒）
+        # 使わないイベント（マウスの移動など）はキューに入れず，1フレームに1回まとめて受け取る
+        pg.event.set_blocked(None)
+        pg.event.set_allowed(INPUT_EVENTS)
+        scene.enter()
+        last = time.perf_counter_ns()
+        while True:
+            PROFILER.begin_frame()
+            with PROFILER.scope("input"):
+                for event in pg.event.get(INPUT_EVENTS):
+                    if event.type == pg.QUIT:
+                        self.stop_recording()
+                        return 0
+                    if event.type == pg.KEYDOWN and event.key == pg.K_F3:  # プロファイラの表示切り替え
+                        PROFILER.overlay = not PROFILER.overlay
+                        PROFILER.enabled = PROFILER.enabled or PROFILER.overlay
+                    self.source.handle(event)
+                    scene.handle(event)
+            now = time.perf_counter_ns()
+            acc += now - last
+            last = now
+            steps = 0
+            with PROFILER.scope("logic"):
+                while acc >= step_ns:
+                    if steps == __class__.max_steps:  # 追いつこうとしてさらに遅れるのを防ぐ
+                        self.overloads += 1
+                        self.dropped += acc // step_ns
+                        acc %= step_ns
+                        break
+                    next_scene = scene.update()
+                    if next_scene is not None:
+                        scene = next_scene
+                        scene.enter()
+                    acc -= step_ns
+                    steps += 1
+            self.steps += steps
+            now = time.perf_counter_ns()
+            self.logic_ns += now - last
+            with PROFILER.scope("render"):
+                scene.draw(acc / step_ns)
+            self.draws += 1
+            self.render_ns += time.perf_counter_ns() - now
+            PROFILER.end_frame(self.world.live_counts() if PROFILER.enabled and self.world else None)
+            clock.tick(fps)
+
+
+def main(dirty: bool = False, bg_speed: float = 1, stats: bool = False, seed: int | None = None,
+         profile: str | None = None, record: str | None = None, source: InputSource | None = None,
+         fps: int = 60, pipeline: bool = False):
+    """
+    ゲームを起動し，タイトル→プレイ中→ゲームオーバー→（次のゲーム）を繰り返す
+    F3キーでプロファイラとフレーム時間のグラフ表示を切り替える
+    引数1 dirty：変化した矩形だけを画面更新するかどうか（Trueなら背景は動かない）
+    引数2 bg_speed：背景のスクロール速度
+    引数3 stats：終了時に画像キャッシュと画面更新の統計を表示するかどうか
+    引数4 seed：乱数のシード（Noneならゲームごとにランダム）
+    引数5 profile：終了時にChromeトレース形式で書き出すファイル（指定するとプロファイラを有効にする）
+    引数6 record：ゲームごとの入力を記録するリプレイファイル
+    引数7 source：プレイ中の入力（Noneならキーボードとマウス）
+    引数8 fps：画面を更新する最大の頻度（0なら制限しない）
+    引数9 pipeline：ゲームを別プロセスで進め，その間に1つ前のフレームを描く並列モードにするかどうか
+    """
+    started = time.perf_counter()
+    # 画像のデコードとスプライトシートの用意をスレッドプールで始め，その間にウィンドウを作る
+    executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix="assets")
+    ASSETS.preload(startup_assets(), executor)
+    for sheet in SpriteSheet.sheets:
+        sheet.prefetch(executor)
+    executor.shutdown(wait=False)  # 始めた分が終わったらスレッドも終わる
+    pg.display.set_caption("シューティングゲーム")
+    screen = pg.display.set_mode((WIDTH,HEIGHT))
+    ASSETS.convert_loaded()
+    renderer = Renderer(screen, Background(bg_speed), dirty)
+    game = Game(screen, renderer, seed, record, started, source, pipeline)
+    if stats:
+        atexit.register(lambda: print_stats(renderer, game.world, game.first_frame_ms, game.timing()))
+    if profile is not None:
+        PROFILER.enabled = True
+        atexit.register(PROFILER.export_chrome_trace, profile)
+    try:
+        return game.run(Title(game), fps)
+    finally:
+        if isinstance(game.world, PipelinedWorld):
+            game.world.close()
+
+
+def print_stats(renderer: Renderer | None, world: World | PipelinedWorld | None,
+                first_frame_ms: float | None = None, timing: dict | None = None) -> None:
+    """
+    画像キャッシュ・スプライトの使い回し・画面更新の統計を表示する
+    引数1 renderer：メインループで使ったRenderer（画面なしならNone）
+    引数2 world：統計を取るWorld（ゲームを始めていなければNone）
+    引数3 first_frame_ms：起動から最初のフレームまでの時間
+    引数4 timing：Game.timing()の結果（ゲームの処理と描画の時間）
+    """
+    if first_frame_ms is not None:
+        print(f"startup: first frame {first_frame_ms:.1f} ms")
+    if timing is not None:
+        print("timing:", timing)
+    print("assets:", ASSETS.stats())
+    if world is not None:
+        for name, pool in world.pool_stats().items():
+            print(f"pool {name}:", pool)
+        print("live:", world.live_counts())
+    if PROFILER.enabled:
+        for name, value in PROFILER.summary().items():
+            print(f"profile {name}:", value)
+    if renderer is None:
+        return
+    mode = "dirty" if renderer.dirty else "full"
+    avg = renderer.pixels_total / max(renderer.frames, 1)
+    print(f"render({mode}): {renderer.frames} frames, {avg:.0f} pixels/frame")
 
 
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="シューティングゲーム")
+    parser.add_argument("--render", choices=["full", "dirty"], default="full",
+                        help="画面更新の方法（dirty：変化した矩形だけ送る）")
+    parser.add_argument("--bg-speed", type=float, default=None,
+                        help="背景のスクロール速度（ピクセル/フレーム．既定は1で，--render dirtyでは0）")
+    parser.add_argument("--stats", action="store_true", help="終了時に統計を表示する")
+    parser.add_argument("--fps", type=int, default=60,
+                        help="画面を更新する最大の頻度（0なら制限しない．ゲームの速さは変わらない）")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+    parser.add_argument("--profile", metavar="TRACE_JSON", default=None,
+                        help="処理ごとの時間を測り，終了時にChromeトレース形式で書き出す")
+    parser.add_argument("--record", metavar="REPLAY", default=None,
+                        help="ゲームごとの入力をリプレイファイルに記録する")
+    parser.add_argument("--replay", metavar="REPLAY", default=None,
+                        help="リプレイファイルを画面なしで最速で再生し，最後の状態が記録と同じか確かめる")
+    parser.add_argument("--watch", action="store_true", help="--replayのリプレイを画面に表示して再生する")
+    parser.add_argument("--input", metavar="{keyboard,gamepad,script:FILE}", default="keyboard",
+                        help="操作に使う入力（gamepad：pg.joystickのゲームパッド，script:FILE：FILEのpolicy(world)）")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="ゲームを別プロセスで進め，その間に1つ前のフレームを描く（CPUが1つなら使わない）")
+    parser.add_argument("--headless", type=int, metavar="TICKS", default=None,
+                        help="画面を出さずに最大TICKSフレームだけゲームを進めて結果を表示する")
+    args = parser.parse_args()
+    if args.render == "dirty" and args.bg_speed:
+        parser.error("--render dirty keeps the background still, so --bg-speed cannot be combined with it")
+    script = None
+    if args.input.startswith("script:"):
+        script = Scripted.from_file(args.input[len("script:"):])
+    elif args.input not in ("keyboard", "gamepad"):
+        parser.error(f"--input must be keyboard, gamepad or script:FILE (got {args.input})")
+    if args.replay is not None and not args.watch:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        replay = Replay.load(args.replay)
+        start = time.perf_counter()
+        world = replay.play()
+        elapsed = time.perf_counter() - start
+        match = world.state_hash() == replay.digest
+        print(f"seed={replay.seed} ticks={replay.ticks} score={world.score} hp={world.hp} "
+              f"over={world.over} hash={'ok' if match else 'MISMATCH'} ({replay.ticks/elapsed:.0f} ticks/s)")
+        if args.stats:
+            print_stats(None, world)
+        sys.exit(0 if match else 1)
+    if args.headless is not None:
+        os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+        PROFILER.enabled = args.profile is not None
+        start = time.perf_counter()
+        world = run_headless(args.seed, args.headless, script.policy if script is not None else None)
+        elapsed = time.perf_counter() - start
+        print(f"ticks={world.tmr} score={world.score} hp={world.hp} rank={world.rank()} "
+              f"over={world.over} ({world.tmr/elapsed:.0f} ticks/s)")
+        if args.stats:
+            print_stats(None, world)
+        if args.profile is not None:
+            PROFILER.export_chrome_trace(args.profile)
+        sys.exit()
     pg.init()
-    main()
+    source = Gamepad() if args.input == "gamepad" else script
+    if args.watch and args.replay is not None:  # リプレイの入力とシードでゲームを始める
+        replay = Replay.load(args.replay)
+        source, args.seed = ReplaySource(replay), replay.seed
+    main(args.render == "dirty", 1 if args.bg_speed is None else args.bg_speed, args.stats, args.seed, args.profile, args.record, source,
+         args.fps, args.pipeline)
     pg.quit()
     sys.exit()
\ No newline at end of file